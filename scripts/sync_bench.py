@@ -0,0 +1,679 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the sync pipeline on synthetic workspaces.
+
+Generates a Notion workspace, a Figma file and a Miro board of configurable
+size as replay fixtures (see sync_replay) and runs the real syncs against
+them offline, each in its own process. Also times the Notion renderer and
+the Figma indexer on their own, and the Notion renderer's if/elif baseline
+for comparison.
+
+Each run reports wall time, request count, peak RSS and files written, and
+is appended to .sync-bench/results.jsonl with the commit it ran on, so runs
+can be compared across commits.
+
+Usage:
+    python scripts/sync_bench.py                  # Run every scenario
+    python scripts/sync_bench.py notion figma     # Run some
+    python scripts/sync_bench.py --scale 0.1      # Smaller workspaces
+    python scripts/sync_bench.py --latency 0.02   # Simulate API latency
+    python scripts/sync_bench.py --compare HEAD~3 # Compare with a commit's run
+                                                  # (default: the latest run)
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Add scripts directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent))
+
+import sync_replay
+from sync_http import DEFAULT_RATE_LIMITS, configure_rate_limit
+
+BENCH_RESULTS_PATH = Path(__file__).parent.parent / ".sync-bench" / "results.jsonl"
+
+# Workspace sizes at --scale 1. Figma frames hold fanout**1 + ... +
+# fanout**depth nodes each.
+BENCH_SCENARIOS = {
+    "notion": {"pages": 50, "blocks": 200, "depth": 3},
+    "figma": {"pages": 10, "frames": 40, "depth": 4, "fanout": 4},
+    "miro": {"items": 20000, "frames": 200},
+    "notion_render": {"pages": 50, "blocks": 200, "depth": 3},
+    "notion_render_baseline": {"pages": 50, "blocks": 200, "depth": 3},
+    "figma_index": {"pages": 10, "frames": 40, "depth": 4, "fanout": 4},
+}
+
+# Parameters scaled by --scale; the rest (depths, fanouts) keep the shape
+SCALED_PARAMS = ("pages", "frames", "items")
+
+# Metrics compared between runs; lower is better for all of them
+BENCH_METRICS = ("wall_time", "requests", "peak_rss_mb", "files")
+
+BENCH_NOTION_PAGE_ID = "0" * 31 + "1"
+BENCH_NOTION_USER_ID = "0" * 31 + "u"
+BENCH_MIRO_BOARD_ID = "bench-board="
+BENCH_FIGMA_FILE_KEY = "BenchFileKey0000000000"
+
+NOTION_BLOCK_TYPES = (
+    "paragraph", "paragraph", "paragraph", "heading_2", "heading_3",
+    "bulleted_list_item", "numbered_list_item", "to_do", "code", "quote",
+    "callout", "divider",
+)
+NOTION_TOGGLE_EVERY = 20  # Every nth block opens a toggle chain `depth` deep
+NOTION_TOGGLE_WIDTH = 5  # Blocks per level of a toggle chain
+MIRO_ITEM_TYPES = ("sticky_note", "sticky_note", "shape", "text", "connector", "card", "image")
+FIGMA_LEAF_TYPES = ("TEXT", "RECTANGLE", "VECTOR", "INSTANCE")
+WORDS = (
+    "share", "item", "borrow", "lend", "neighbour", "request", "return",
+    "review", "trust", "community", "pickup", "deposit", "schedule", "note",
+)
+
+# Smallest valid PNG, served for every thumbnail download
+PNG_1PX = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c63000100000500010d0a2db40000000049454e44ae426082"
+)
+
+
+def scaled(params: dict, scale: float) -> dict:
+    """Scale a scenario's size parameters, keeping at least one of each."""
+    return {k: max(1, round(v * scale)) if k in SCALED_PARAMS else v for k, v in params.items()}
+
+
+def words(rng: random.Random, count: int) -> str:
+    """A run of filler words."""
+    return " ".join(rng.choice(WORDS) for _ in range(count))
+
+
+def notion_rich_text(rng: random.Random) -> list:
+    """A few rich text segments with a spread of annotations and links."""
+    segments = []
+    for _ in range(rng.randint(1, 4)):
+        text = words(rng, rng.randint(2, 12))
+        href = "https://example.com/" + text.split()[0] if rng.random() < 0.05 else None
+        segments.append({
+            "type": "text",
+            "text": {"content": text + " ", "link": {"url": href} if href else None},
+            "plain_text": text + " ",
+            "annotations": {
+                "bold": rng.random() < 0.2,
+                "italic": rng.random() < 0.1,
+                "strikethrough": rng.random() < 0.02,
+                "underline": False,
+                "code": rng.random() < 0.05,
+                "color": "default",
+            },
+            "href": href,
+        })
+    return segments
+
+
+def notion_block(rng: random.Random, block_id: str, block_type: str, has_children: bool = False) -> dict:
+    """A block object as the Notion API returns it."""
+    content = {}
+    if block_type == "child_page":
+        content = {"title": words(rng, 3).title()}
+    elif block_type != "divider":
+        content = {"rich_text": notion_rich_text(rng)}
+    if block_type == "code":
+        content["language"] = "python"
+    if block_type == "to_do":
+        content["checked"] = rng.random() < 0.5
+    if block_type == "callout":
+        content["icon"] = {"type": "emoji", "emoji": "💡"}
+    if "rich_text" in content:
+        content["color"] = "default"
+    user = {"object": "user", "id": BENCH_NOTION_USER_ID}
+    return {
+        "object": "block",
+        "id": block_id,
+        "parent": {"type": "page_id", "page_id": BENCH_NOTION_PAGE_ID},
+        "created_time": "2026-01-01T00:00:00.000Z",
+        "last_edited_time": "2026-01-01T00:00:00.000Z",
+        "created_by": user,
+        "last_edited_by": user,
+        "has_children": has_children,
+        "archived": False,
+        "in_trash": False,
+        "type": block_type,
+        block_type: content,
+    }
+
+
+def generate_notion_workspace(pages: int, blocks: int, depth: int, seed: int = 0) -> dict:
+    """
+    Generate a root page with `pages` child pages of `blocks` blocks each.
+
+    Every NOTION_TOGGLE_EVERY-th block is a toggle nesting `depth` levels.
+
+    Returns:
+        Dict with the root page object and children, a map of page or
+        block id -> child blocks
+    """
+    rng = random.Random(seed)
+    counter = iter(range(2, 10**9))
+    children = {}
+
+    def new_id():
+        return f"{next(counter):032x}"
+
+    def toggle_chain(level):
+        toggle = notion_block(rng, new_id(), "toggle", has_children=True)
+        nested = [notion_block(rng, new_id(), rng.choice(NOTION_BLOCK_TYPES)) for _ in range(NOTION_TOGGLE_WIDTH - 1)]
+        if level < depth:
+            nested.append(toggle_chain(level + 1))
+        children[toggle["id"]] = nested
+        return toggle
+
+    def page_blocks():
+        result = []
+        for i in range(blocks):
+            if depth and i % NOTION_TOGGLE_EVERY == NOTION_TOGGLE_EVERY - 1:
+                result.append(toggle_chain(1))
+            else:
+                result.append(notion_block(rng, new_id(), rng.choice(NOTION_BLOCK_TYPES)))
+        return result
+
+    root_blocks = [notion_block(rng, new_id(), "paragraph")]
+    for _ in range(pages):
+        child = notion_block(rng, new_id(), "child_page")
+        root_blocks.append(child)
+        children[child["id"]] = page_blocks()
+    children[BENCH_NOTION_PAGE_ID] = root_blocks
+
+    root = {
+        "object": "page",
+        "id": BENCH_NOTION_PAGE_ID,
+        "last_edited_time": "2026-01-01T00:00:00.000Z",
+        "properties": {"title": {"type": "title", "title": [{"plain_text": "Bench Workspace"}]}},
+    }
+    return {"root": root, "children": children}
+
+
+def generate_figma_file(pages: int, frames: int, depth: int, fanout: int, seed: int = 0) -> dict:
+    """Generate a Figma file response with `pages` × `frames` nested frames."""
+    rng = random.Random(seed)
+
+    def subtree(prefix, level):
+        nodes = []
+        for i in range(fanout):
+            node_id = f"{prefix}-{i}"
+            if level < depth:
+                node = {"id": node_id, "type": rng.choice(("GROUP", "FRAME")), "name": words(rng, 2).title(),
+                        "children": subtree(node_id, level + 1)}
+            else:
+                node_type = rng.choice(FIGMA_LEAF_TYPES)
+                node = {"id": node_id, "type": node_type, "name": words(rng, 2).title()}
+                if node_type == "TEXT":
+                    node["characters"] = words(rng, rng.randint(1, 8))
+            nodes.append(node)
+        return nodes
+
+    canvases = []
+    for p in range(pages):
+        frame_nodes = [
+            {"id": f"{p + 1}:{f}", "type": "FRAME", "name": f"Screen {f} / {words(rng, 2).title()}",
+             "children": subtree(f"{p + 1}:{f}", 1)}
+            for f in range(frames)
+        ]
+        canvases.append({"id": f"0:{p + 1}", "type": "CANVAS", "name": f"Page {p + 1}", "children": frame_nodes})
+
+    return {
+        "name": "Bench Design",
+        "version": "1000",
+        "lastModified": "2026-01-01T00:00:00Z",
+        "document": {"id": "0:0", "type": "DOCUMENT", "name": "Document", "children": canvases},
+    }
+
+
+def generate_miro_board(items: int, frames: int, seed: int = 0) -> dict:
+    """Generate a Miro board with `items` items and `frames` frames."""
+    rng = random.Random(seed)
+    return {
+        "board": {
+            "id": BENCH_MIRO_BOARD_ID,
+            "name": "Bench Board",
+            "description": "Synthetic board",
+            "createdAt": "2026-01-01T00:00:00Z",
+            "modifiedAt": "2026-01-02T00:00:00Z",
+        },
+        "items": [
+            {"id": str(3458764500000000000 + i), "type": rng.choice(MIRO_ITEM_TYPES),
+             "data": {"content": words(rng, rng.randint(1, 6))}}
+            for i in range(items)
+        ],
+        "frames": [
+            {"id": str(3458764600000000000 + i), "type": "frame", "data": {"title": f"Frame {i}"}}
+            for i in range(frames)
+        ],
+    }
+
+
+def record_json(store, url: str, payload, method: str = "GET", body=None):
+    """Record a JSON payload as the response to a request."""
+    store.record(method, url, body, 200, {"content-type": "application/json"}, json.dumps(payload).encode("utf-8"))
+
+
+def record_notion_fixtures(store, workspace: dict):
+    """Record a workspace the way the Notion API pages it, 100 blocks a call."""
+    from sync_notion import NOTION_API_BASE
+
+    record_json(store, f"{NOTION_API_BASE}/pages/{BENCH_NOTION_PAGE_ID}", workspace["root"])
+    for parent_id, blocks in workspace["children"].items():
+        base = f"{NOTION_API_BASE}/blocks/{parent_id}/children?page_size=100"
+        for page, start in enumerate(range(0, max(len(blocks), 1), 100)):
+            url = base + (f"&start_cursor=c{page}" if page else "")
+            more = start + 100 < len(blocks)
+            record_json(store, url, {
+                "object": "list",
+                "results": blocks[start:start + 100],
+                "has_more": more,
+                "next_cursor": f"c{page + 1}" if more else None,
+            })
+
+
+def record_figma_fixtures(store, file_data: dict):
+    """Record a Figma file, its catalog, thumbnails and their downloads."""
+    import sync_figma as sf
+
+    base = f"{sf.FIGMA_API_BASE}/files/{BENCH_FIGMA_FILE_KEY}"
+    record_json(store, f"{base}?depth=1", {k: v for k, v in file_data.items() if k != "document"})
+    record_json(store, base, file_data)
+
+    index = sf.build_node_index(file_data["document"], types=sf.FIGMA_INDEX_TYPES)
+    instances = [(node_id, node) for node_id, node in index.items() if node.type == "INSTANCE"][:500]
+    components = [
+        {"key": f"k{node_id}", "node_id": node_id, "name": f"Components/{node.name}",
+         "description": "Synthetic component", "containing_frame": {"pageName": "Page 1"}}
+        for node_id, node in instances
+    ]
+    record_json(store, f"{base}/components", {"meta": {"components": components}})
+    record_json(store, f"{base}/component_sets", {"meta": {"component_sets": []}})
+    record_json(store, f"{base}/styles", {"meta": {"styles": []}})
+
+    # Thumbnails are requested in frame order, in fixed-size batches
+    frame_ids = [frame["id"] for page in sf.pages_from_index(index) for frame in page["frames"]]
+    for start in range(0, len(frame_ids), sf.FIGMA_IMAGES_BATCH_SIZE):
+        batch = frame_ids[start:start + sf.FIGMA_IMAGES_BATCH_SIZE]
+        images = {node_id: f"https://figma-bench.invalid/{node_id.replace(':', '-')}.png" for node_id in batch}
+        record_json(
+            store,
+            f"{sf.FIGMA_API_BASE}/images/{BENCH_FIGMA_FILE_KEY}?ids={','.join(batch)}"
+            f"&format={sf.FIGMA_THUMBNAIL_FORMAT}&scale={sf.FIGMA_THUMBNAIL_SCALE}",
+            {"err": None, "images": images},
+        )
+        for url in images.values():
+            store.record("GET", url, None, 200, {"content-type": "image/png"}, PNG_1PX)
+
+
+def record_miro_fixtures(store, board: dict):
+    """Record a board the way the Miro API pages it."""
+    from sync_miro import MIRO_API_BASE, MIRO_PAGE_LIMIT
+
+    record_json(store, f"{MIRO_API_BASE}/boards/{BENCH_MIRO_BOARD_ID}", board["board"])
+    for collection in ("items", "frames"):
+        entries = board[collection]
+        base = f"{MIRO_API_BASE}/boards/{BENCH_MIRO_BOARD_ID}/{collection}?limit={MIRO_PAGE_LIMIT}"
+        for page, start in enumerate(range(0, max(len(entries), 1), MIRO_PAGE_LIMIT)):
+            url = base + (f"&cursor=c{page}" if page else "")
+            payload = {"data": entries[start:start + MIRO_PAGE_LIMIT], "total": len(entries)}
+            if start + MIRO_PAGE_LIMIT < len(entries):
+                payload["cursor"] = f"c{page + 1}"
+            record_json(store, url, payload)
+
+
+def generate_fixtures(name: str, params: dict, folder: Path, seed: int):
+    """Write the replay fixtures a sync scenario runs against."""
+    store = sync_replay.FixtureStore("record", folder)
+    if name == "notion":
+        record_notion_fixtures(store, generate_notion_workspace(seed=seed, **params))
+    elif name == "figma":
+        record_figma_fixtures(store, generate_figma_file(seed=seed, **params))
+    elif name == "miro":
+        record_miro_fixtures(store, generate_miro_board(seed=seed, **params))
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far, in MB."""
+    # Linux carries ru_maxrss over exec, so a child would report the
+    # generating parent's peak; the high-water mark in /proc starts afresh
+    status = Path("/proc/self/status")
+    if status.exists():
+        for line in status.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return round(int(line.split()[1]) / 1024, 1)
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_sync(name: str, fixtures: Path, output: Path, latency: float, keep_rate_limits: bool) -> dict:
+    """Run one sync against fixtures; called in a fresh process."""
+    os.environ.pop("FIGMA_TEAM_ID", None)
+    store = sync_replay.configure(replay_dir=fixtures, latency=latency, error_rate=0, page_size=0)
+    if not keep_rate_limits:
+        # Measure the pipeline, not the pacing
+        for source in DEFAULT_RATE_LIMITS:
+            configure_rate_limit(source, 1e6)
+
+    import sync_figma
+    import sync_miro
+    import sync_notion
+
+    # Keep the payload cache in the scratch folder, so every run starts cold
+    sync_figma.FIGMA_CACHE_ROOT = output.parent / sync_figma.FIGMA_CACHE_DIRNAME
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if name == "notion":
+            ok = sync_notion.sync_notion(output, force=True, page_id=BENCH_NOTION_PAGE_ID)
+        elif name == "miro":
+            ok = sync_miro.sync_miro(output, force=True, board_id=BENCH_MIRO_BOARD_ID)
+        else:
+            ok = sync_figma.sync_figma(output, force=True, file_key=BENCH_FIGMA_FILE_KEY, node_id="")
+    wall_time = time.perf_counter() - start
+
+    written = [p for p in output.rglob("*") if p.is_file()]
+    return {
+        "ok": bool(ok),
+        "wall_time": round(wall_time, 3),
+        "requests": sum(store.seen.values()),
+        "peak_rss_mb": peak_rss_mb(),
+        "files": len(written),
+        "bytes": sum(p.stat().st_size for p in written),
+    }
+
+
+def baseline_renderer():
+    """
+    Build the Notion renderer as it was before the dispatch table and the
+    single-pass rich text builder: one if/elif chain over the block types
+    it knew, each rich text run wrapped on its own and nothing escaped.
+
+    Returns:
+        A blocks_to_markdown(blocks, children) rendering prefetched blocks
+    """
+    from sync_notion import MARK_BOLD, MARK_CODE, MARK_EQUATION, MARK_ITALIC, MARK_STRIKETHROUGH, sanitize_filename
+
+    def rich_text_to_md(rich_text: tuple) -> str:
+        parts = []
+        for item in rich_text:
+            text = item.text
+            marks = item.marks
+            if marks & MARK_BOLD:
+                text = f"**{text}**"
+            if marks & MARK_ITALIC:
+                text = f"*{text}*"
+            if marks & MARK_STRIKETHROUGH:
+                text = f"~~{text}~~"
+            if marks & (MARK_CODE | MARK_EQUATION):
+                text = f"`{text}`"
+            if item.href:
+                text = f"[{text}]({item.href})"
+            parts.append(text)
+        return "".join(parts)
+
+    def blocks_to_markdown(blocks: list, children: dict) -> str:
+        md_lines = []
+        for block in blocks:
+            block_type = block.type
+            if block_type == "paragraph":
+                md_lines.append(rich_text_to_md(block.text))
+                md_lines.append("")
+            elif block_type.startswith("heading_"):
+                md_lines.append(f"{'#' * int(block_type[-1])} {rich_text_to_md(block.text)}")
+                md_lines.append("")
+            elif block_type == "bulleted_list_item":
+                md_lines.append(f"- {rich_text_to_md(block.text)}")
+            elif block_type == "numbered_list_item":
+                md_lines.append(f"1. {rich_text_to_md(block.text)}")
+            elif block_type == "to_do":
+                md_lines.append(f"- [{'x' if block.checked else ' '}] {rich_text_to_md(block.text)}")
+            elif block_type == "toggle":
+                md_lines.append(f"<details><summary>{rich_text_to_md(block.text)}</summary>")
+                md_lines.append("")
+                if block.has_children:
+                    md_lines.append(blocks_to_markdown(children.get(block.id, []), children))
+                md_lines.append("</details>")
+                md_lines.append("")
+            elif block_type == "code":
+                md_lines.append(f"```{block.language}")
+                md_lines.append(rich_text_to_md(block.text))
+                md_lines.append("```")
+                md_lines.append("")
+            elif block_type == "quote":
+                md_lines.append(f"> {rich_text_to_md(block.text)}")
+                md_lines.append("")
+            elif block_type == "divider":
+                md_lines.append("---")
+                md_lines.append("")
+            elif block_type == "callout":
+                md_lines.append(f"> {block.icon} {rich_text_to_md(block.text)}")
+                md_lines.append("")
+            elif block_type == "image":
+                md_lines.append(f"![{rich_text_to_md(block.text)}]({block.url})")
+                md_lines.append("")
+            elif block_type == "bookmark":
+                md_lines.append(f"[{rich_text_to_md(block.text) or block.url}]({block.url})")
+                md_lines.append("")
+            elif block_type == "child_page":
+                title = block.title or "Untitled"
+                md_lines.append(f"- [[{sanitize_filename(title)}|{title}]]")
+            elif block_type == "child_database":
+                md_lines.append(f"📊 **Database:** {block.title or 'Database'}")
+                md_lines.append("")
+            elif block_type == "table":
+                md_lines.append("_[Table content - see Notion]_")
+                md_lines.append("")
+        return "\n".join(md_lines)
+
+    return blocks_to_markdown
+
+
+def run_kernel(name: str, params: dict, seed: int) -> dict:
+    """Time a CPU-bound stage on its own; called in a fresh process."""
+    if name in ("notion_render", "notion_render_baseline"):
+        from sync_notion import blocks_to_markdown, parse_block
+
+        render = blocks_to_markdown if name == "notion_render" else baseline_renderer()
+
+        # Blocks are parsed at ingest, as the sync does; only rendering is timed
+        raw = generate_notion_workspace(seed=seed, **params)["children"]
+        children = {}
+        while raw:
+            block_id, blocks = raw.popitem()
+            children[block_id] = [parse_block(block) for block in blocks]
+        pages = [b.id for b in children[BENCH_NOTION_PAGE_ID] if b.type == "child_page"]
+        start = time.perf_counter()
+        size = sum(len(render(children[page_id], children)) for page_id in pages)
+    else:
+        from sync_figma import FIGMA_INDEX_TYPES, build_node_index, extract_pages_and_frames
+
+        document = generate_figma_file(seed=seed, **params)["document"]
+        start = time.perf_counter()
+        size = len(extract_pages_and_frames(document)) + len(build_node_index(document, types=FIGMA_INDEX_TYPES))
+
+    return {
+        "ok": size > 0,
+        "wall_time": round(time.perf_counter() - start, 3),
+        "requests": 0,
+        "peak_rss_mb": peak_rss_mb(),
+        "files": 0,
+        "bytes": 0,
+    }
+
+
+def run_scenario(name: str, scale: float, latency: float, seed: int, keep_rate_limits: bool) -> dict:
+    """Generate a scenario's workspace and run it in a child process."""
+    params = scaled(BENCH_SCENARIOS[name], scale)
+    with tempfile.TemporaryDirectory(prefix="sync-bench-") as tmp:
+        fixtures = Path(tmp) / "fixtures"
+        generate_fixtures(name, params, fixtures, seed)
+
+        command = [
+            sys.executable, __file__, "--child", name,
+            "--fixtures", str(fixtures), "--output", str(Path(tmp) / "output"),
+            "--scale", str(scale), "--latency", str(latency), "--seed", str(seed),
+        ]
+        if keep_rate_limits:
+            command.append("--keep-rate-limits")
+        completed = subprocess.run(command, capture_output=True, text=True)
+
+    if completed.returncode != 0:
+        return {"ok": False, "error": (completed.stderr.strip().splitlines() or ["unknown error"])[-1]}
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["params"] = params
+    return result
+
+
+def get_commit() -> dict:
+    """The commit the benchmark runs on, and whether scripts/ has local changes."""
+    root = Path(__file__).parent.parent
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=root, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(["git", "diff", "--quiet", "HEAD", "--", "scripts"], cwd=root).returncode != 0
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+
+def load_results() -> list:
+    """Load stored benchmark runs, oldest first."""
+    if not BENCH_RESULTS_PATH.exists():
+        return []
+    runs = []
+    for line in BENCH_RESULTS_PATH.read_text(encoding="utf-8").splitlines():
+        try:
+            runs.append(json.loads(line))
+        except ValueError:
+            continue
+    return runs
+
+
+def save_result(run: dict):
+    """Append a run to the results file."""
+    BENCH_RESULTS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(BENCH_RESULTS_PATH, "a", encoding="utf-8") as f:
+        f.write(json.dumps(run) + "\n")
+
+
+def find_baseline(runs: list, run: dict, ref: str | None) -> dict | None:
+    """
+    Find the stored run to compare against.
+
+    The latest stored run with the same settings, restricted to runs on
+    `ref` (any git revision) if given.
+    """
+    commit = None
+    if ref:
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "--short", ref], cwd=Path(__file__).parent.parent,
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = ref
+
+    for candidate in reversed(runs):
+        if candidate.get("settings") != run["settings"]:
+            continue
+        if commit and candidate.get("commit") != commit:
+            continue
+        return candidate
+    return None
+
+
+def print_results(run: dict, baseline: dict | None):
+    """Print a run's metrics, with the change from the baseline's."""
+    width = max(15, *(len(name) + 2 for name in run["results"]))
+    header = f"{'scenario':<{width}}" + "".join(f"{metric:>14}" for metric in BENCH_METRICS)
+    print(header)
+    print("-" * len(header))
+    for name, result in run["results"].items():
+        if not result.get("ok"):
+            print(f"{name:<{width}} ❌ {result.get('error', 'sync failed')}")
+            continue
+        line = f"{name:<{width}}"
+        before = ((baseline or {}).get("results") or {}).get(name) or {}
+        for metric in BENCH_METRICS:
+            value = result[metric]
+            cell = f"{value:g}"
+            if before.get(metric):
+                change = (value - before[metric]) / before[metric] * 100
+                cell += f" ({change:+.0f}%)"
+            line += f"{cell:>14}"
+        print(line)
+    if baseline:
+        print(f"\nCompared with {baseline.get('commit')}{'+' if baseline.get('dirty') else ''} "
+              f"({baseline.get('timestamp')})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sync pipeline on synthetic workspaces")
+    parser.add_argument("scenarios", nargs="*", help=f"Scenarios to run: {', '.join(BENCH_SCENARIOS)} (default: all)")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply workspace sizes by this")
+    parser.add_argument("--latency", type=float, default=0.0, help="Mean simulated seconds per API response")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the generated workspaces")
+    parser.add_argument("--keep-rate-limits", action="store_true", help="Pace requests as in real syncs")
+    parser.add_argument("--compare", metavar="REF", help="Compare with the latest run on this commit (default: latest run)")
+    parser.add_argument("--no-save", action="store_true", help="Don't store the results")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--fixtures", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--output", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        if args.child in ("notion", "figma", "miro"):
+            result = run_sync(args.child, args.fixtures, args.output, args.latency, args.keep_rate_limits)
+        else:
+            result = run_kernel(args.child, scaled(BENCH_SCENARIOS[args.child], args.scale), args.seed)
+        print(json.dumps(result))
+        return 0
+
+    names = args.scenarios or list(BENCH_SCENARIOS)
+    unknown = [name for name in names if name not in BENCH_SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+    run = {
+        **get_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "settings": {
+            "scale": args.scale,
+            "latency": args.latency,
+            "seed": args.seed,
+            "keep_rate_limits": args.keep_rate_limits,
+        },
+        "results": {},
+    }
+
+    print(f"\n⏱️  Sync benchmarks (scale {args.scale:g}, latency {args.latency:g}s)\n")
+    for name in names:
+        print(f"   Running {name}...")
+        run["results"][name] = run_scenario(name, args.scale, args.latency, args.seed, args.keep_rate_limits)
+    print()
+
+    baseline = find_baseline(load_results(), run, args.compare)
+    print_results(run, baseline)
+
+    if not args.no_save:
+        save_result(run)
+        print(f"\n   ✅ Saved: {BENCH_RESULTS_PATH}")
+
+    return 0 if all(r.get("ok") for r in run["results"].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
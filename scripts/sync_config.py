@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Sync target configuration.
+
+Loads the list of Notion roots, Miro boards and Figma files to mirror from
+sync_targets.json, each with its own output folder and freshness policy.
+"""
+import json
+from pathlib import Path
+
+from sync_search import SEARCH_INDEX_NAME
+from sync_sources import SOURCES
+
+DEFAULT_CONFIG_PATH = Path(__file__).parent / "sync_targets.json"
+DEFAULT_VAULT_FOLDER = Path.home() / "Library/Mobile Documents/iCloud~md~obsidian/Documents/Main/02-Projects/Sharity"
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_CACHE_DAYS = 7
+
+# --watch polling bounds (seconds): intervals shrink towards the minimum
+# while a target keeps changing and back off towards the maximum when idle
+DEFAULT_WATCH_MIN_INTERVAL = 60
+DEFAULT_WATCH_MAX_INTERVAL = 900
+
+# Run history: where it lives, and how far above its recent median a run
+# must be to be flagged as a regression
+DEFAULT_HISTORY_PATH = Path(__file__).parent.parent / ".sync-history.db"
+DEFAULT_REGRESSION_THRESHOLD = 0.5
+
+# Used when there is no config file: one target per registered source, with
+# ids left to each module's defaults.
+DEFAULT_TARGETS = [
+    {"name": source.label, "source": source.name, "folder": source.folder}
+    for source in SOURCES.values()
+]
+
+
+def load_config(path: Path | None = None) -> dict:
+    """
+    Load and validate the sync configuration.
+
+    Args:
+        path: Config file (defaults to scripts/sync_targets.json)
+
+    Returns:
+        Dict with vault_folder, max_workers, rate_limits, watch, history,
+        search and targets. Each target has name, source, id (None for the module
+        default), folder (absolute) and cache_days, plus any
+        source-specific options.
+
+    Raises:
+        ValueError: If the config file is malformed
+    """
+    path = path or DEFAULT_CONFIG_PATH
+    raw = {}
+    if path.exists():
+        try:
+            raw = json.loads(path.read_text(encoding="utf-8"))
+        except ValueError as e:
+            raise ValueError(f"{path.name}: {e}") from e
+
+    vault_folder = Path(raw.get("vault_folder") or DEFAULT_VAULT_FOLDER).expanduser()
+    max_workers = int(raw.get("max_workers", DEFAULT_MAX_WORKERS))
+    if max_workers < 1:
+        raise ValueError("max_workers must be at least 1")
+
+    rate_limits = {}
+    for source, rate in (raw.get("rate_limits") or {}).items():
+        if source not in SOURCES:
+            raise ValueError(f"rate_limits: unknown source '{source}'")
+        rate_limits[source] = float(rate)
+
+    watch_raw = raw.get("watch") or {}
+    watch = {
+        "min_interval": float(watch_raw.get("min_interval", DEFAULT_WATCH_MIN_INTERVAL)),
+        "max_interval": float(watch_raw.get("max_interval", DEFAULT_WATCH_MAX_INTERVAL)),
+    }
+    if not 0 < watch["min_interval"] <= watch["max_interval"]:
+        raise ValueError("watch: need 0 < min_interval <= max_interval")
+
+    history_raw = raw.get("history") or {}
+    history = {
+        # Relative paths are taken from the repository root
+        "path": DEFAULT_HISTORY_PATH.parent / Path(history_raw.get("path") or DEFAULT_HISTORY_PATH).expanduser(),
+        "regression_threshold": float(history_raw.get("regression_threshold", DEFAULT_REGRESSION_THRESHOLD)),
+    }
+    if history["regression_threshold"] <= 0:
+        raise ValueError("history: regression_threshold must be positive")
+
+    # The --search index sits next to the run history unless configured,
+    # never in the vault, which iCloud syncs
+    search_raw = raw.get("search") or {}
+    search = {
+        "path": (
+            DEFAULT_HISTORY_PATH.parent / Path(search_raw["path"]).expanduser()
+            if search_raw.get("path")
+            else history["path"].parent / SEARCH_INDEX_NAME
+        ),
+    }
+    if search["path"].resolve().is_relative_to(vault_folder.resolve()):
+        raise ValueError("search: path must be outside the vault")
+
+    targets = []
+    names = set()
+    for i, entry in enumerate(raw.get("targets") or DEFAULT_TARGETS):
+        source = entry.get("source")
+        if source not in SOURCES:
+            raise ValueError(f"targets[{i}]: source must be one of {', '.join(SOURCES)}")
+        folder = entry.get("folder")
+        if not folder:
+            raise ValueError(f"targets[{i}]: folder is required")
+
+        name = entry.get("name") or f"{source}:{entry.get('id') or 'default'}"
+        if name in names:
+            raise ValueError(f"targets[{i}]: duplicate name '{name}'")
+        names.add(name)
+
+        target = dict(entry)
+        target.update({
+            "name": name,
+            "source": source,
+            "id": entry.get("id"),
+            "folder": vault_folder / Path(folder).expanduser(),
+            "cache_days": int(entry.get("cache_days", DEFAULT_CACHE_DAYS)),
+        })
+        targets.append(target)
+
+    return {
+        "vault_folder": vault_folder,
+        "max_workers": max_workers,
+        "rate_limits": rate_limits,
+        "watch": watch,
+        "history": history,
+        "search": search,
+        "targets": targets,
+    }
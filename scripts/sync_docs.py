@@ -11,27 +11,47 @@ Usage:
     python scripts/sync_docs.py --miro          # Sync Miro only
     python scripts/sync_docs.py --figma         # Sync Figma only
     python scripts/sync_docs.py --status        # Show cache status
+    python scripts/sync_docs.py --history       # Show run history and regressions
+    python scripts/sync_docs.py --search "onboarding flow"  # Search the synced notes
+    python scripts/sync_docs.py --where status=Done    # Synced pages by property
+    python scripts/sync_docs.py --export-snapshot vault.snap   # Pack the synced output into one file
+    python scripts/sync_docs.py --import-snapshot vault.snap   # Unpack what changed into the vault
     python scripts/sync_docs.py --all --force   # Force update all
+    python scripts/sync_docs.py --all --force --plan  # What that would fetch and cost
+    python scripts/sync_docs.py --all --config my_targets.json
+    python scripts/sync_docs.py --all --watch   # Keep running, sync on change
+    python scripts/sync_docs.py --all --force --record fixtures/  # Capture API responses
+    python scripts/sync_docs.py --all --force --replay fixtures/  # Sync offline from them
+    python scripts/sync_docs.py --all --force --profile           # Report where time goes
+
+Targets (Notion roots, Miro boards, Figma files), their output folders and
+freshness policies are read from scripts/sync_targets.json. All targets run
+on one event loop and share its HTTP client. Sources are registered in
+sync_sources.py and imported only when a run selects them.
 """
 import argparse
+import asyncio
 import os
+import sqlite3
 import sys
+import time
+from collections import Counter, deque
 from datetime import datetime
 from pathlib import Path
 
 # Add scripts directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent))
 
-from sync_notion import sync_notion
-from sync_miro import sync_miro
-from sync_figma import sync_figma
+from sync_config import DEFAULT_CACHE_DAYS, load_config
+import sync_history
+import sync_plan
+import sync_properties
+import sync_search
+import sync_snapshot
+import sync_trace
+from sync_sources import SOURCES, change_probe, load_source, planner, sync_function
 
-# Configuration
-OBSIDIAN_VAULT = Path.home() / "Library/Mobile Documents/iCloud~md~obsidian/Documents/Main"
-SHARITY_FOLDER = OBSIDIAN_VAULT / "02-Projects/Sharity"
-
-# Cache freshness (days)
-CACHE_DAYS = 7
+DEFAULT_TRACE_PATH = Path(__file__).parent.parent / ".sync-trace.json"
 
 
 def load_env():
@@ -82,108 +102,461 @@ def get_cache_info(folder: Path) -> dict:
     }
 
 
-def is_cache_fresh(synced_at: datetime | None) -> bool:
-    """Check if cache is fresh (less than CACHE_DAYS old)."""
+def is_cache_fresh(synced_at: datetime | None, cache_days: int = DEFAULT_CACHE_DAYS) -> bool:
+    """Check if cache is fresh (less than cache_days old)."""
     if synced_at is None:
         return False
     age = datetime.now() - synced_at.replace(tzinfo=None)
-    return age.days < CACHE_DAYS
+    return age.days < cache_days
 
 
-def show_status():
-    """Show cache status for all sources."""
+def show_status(config: dict):
+    """Show cache status for all targets, with how their last run went."""
     print("\n📚 Sharity Documentation Cache Status\n")
-    print(f"Obsidian folder: {SHARITY_FOLDER}\n")
+    print(f"Obsidian folder: {config['vault_folder']}\n")
     print("-" * 60)
 
-    sources = [
-        ("Notion", SHARITY_FOLDER / "Notion"),
-        ("Miro", SHARITY_FOLDER / "Architecture"),
-        ("Figma", SHARITY_FOLDER / "Design"),
-    ]
-
-    for name, folder in sources:
-        info = get_cache_info(folder)
+    last_runs = sync_history.last_target_runs(config["history"]["path"])
+    outages = sync_history.last_outages(config["history"]["path"])
+    for target in config["targets"]:
+        info = get_cache_info(target["folder"])
         status = "❌ Not synced"
 
         if info["exists"] and info["files"] > 0:
             if info["synced_at"]:
                 age = (datetime.now() - info["synced_at"].replace(tzinfo=None)).days
-                if age < CACHE_DAYS:
+                if age < target["cache_days"]:
                     status = f"✅ Fresh ({age} days ago)"
                 else:
                     status = f"⚠️  Stale ({age} days ago)"
             else:
                 status = "⚠️  Unknown age"
 
-        print(f"{name:<10} {info['files']:>3} files   {status}")
+        print(f"{target['name']:<10} {info['files']:>3} files   {status}")
+
+        last = last_runs.get(target["name"])
+        if last:
+            print(
+                f"{'':<10} last run {last['started_at']}: {last['status']}, {last['duration']:.1f}s, "
+                f"{last['requests']} requests, {last['pages_changed']} changed, {last['errors']} errors"
+            )
+        outage = outages.get(target["source"])
+        if outage:
+            print(
+                f"{'':<10} 🔌 {target['source'].title()} unavailable since {outage['opened_at']} "
+                f"({outage['failures']} failures, {outage['reason']}); last good notes kept"
+            )
 
     print("-" * 60)
-    print(f"\nCache freshness: {CACHE_DAYS} days")
+    print("\nCache freshness is set per target in sync_targets.json")
     print("Use --force to update regardless of cache age")
 
 
+def target_kwargs(target: dict) -> dict:
+    """Arguments a target passes its source's sync and planner: its id and options."""
+    source = SOURCES[target["source"]]
+    kwargs = {}
+    if target["id"]:
+        kwargs[source.id_param] = target["id"]
+    for option in source.options:
+        if option in target:
+            kwargs[option] = target[option]
+    return kwargs
+
+
+async def sync_target(target: dict, force: bool) -> dict:
+    """
+    Sync one configured target, unless its cache is still fresh.
+
+    Returns:
+        The target's result for the run history: name, source, status
+        (synced, cached or failed), duration, request totals, pages changed
+        and files written
+    """
+    source = target["source"]
+    folder = target["folder"]
+    cache = get_cache_info(folder)
+    result = {
+        "target": target["name"],
+        "source": source,
+        "status": "cached",
+        "duration": 0.0,
+        "pages_changed": 0,
+        "files_written": 0,
+        **sync_trace.new_totals(),
+    }
+
+    if not force and is_cache_fresh(cache.get("synced_at"), target["cache_days"]):
+        age = (datetime.now() - cache["synced_at"].replace(tzinfo=None)).days
+        print(f"\n{SOURCES[source].icon} {target['name']}: using cached version (synced {age} days ago)")
+        return result
+
+    print(f"\n{SOURCES[source].icon} Syncing {target['name']}...")
+
+    kwargs = {"force": force, **target_kwargs(target)}
+    before = await asyncio.to_thread(sync_history.snapshot_folder, folder)
+    started = time.perf_counter()
+    try:
+        with sync_trace.target(target["name"], source):
+            ok = await sync_function(source)(folder, **kwargs)
+    except Exception as e:
+        # One broken target must not take the others down with it
+        print(f"   ❌ {target['name']} failed: {e}")
+        ok = False
+
+    result["status"] = "synced" if ok else "failed"
+    result["duration"] = time.perf_counter() - started
+    result.update(sync_trace.take_totals(target["name"]))
+    result["pages_changed"], result["files_written"] = await asyncio.to_thread(
+        sync_history.diff_folder, folder, before,
+    )
+    if ok:
+        # Notes a source dropped without going through remove_note()
+        await asyncio.to_thread(sync_search.prune, folder)
+    return result
+
+
+async def run_targets(targets: list, force: bool, max_workers: int) -> list:
+    """
+    Run targets on the event loop, at most max_workers at once.
+
+    Slots are handed out round-robin by source, and each source with work
+    left gets an equal share of them before any source gets more, so a
+    source with many targets cannot starve the others. Request pacing
+    within a source is up to its shared rate limiter.
+
+    Returns:
+        Per-target results (see sync_target), in completion order
+    """
+    pending = {}
+    for target in targets:
+        pending.setdefault(target["source"], deque()).append(target)
+
+    running = {}
+    active = Counter()
+    results = []
+
+    def submit(source):
+        target = pending[source].popleft()
+        if not pending[source]:
+            del pending[source]
+        running[asyncio.create_task(sync_target(target, force))] = target
+        active[source] += 1
+
+    while pending or running:
+        busy_sources = set(pending) | {t["source"] for t in running.values()}
+        share = max(1, max_workers // len(busy_sources))
+
+        # Fair pass first, then hand any idle slots to whoever is left
+        for limit in (share, max_workers):
+            progress = True
+            while progress and pending and len(running) < max_workers:
+                progress = False
+                for source in list(pending):
+                    if len(running) >= max_workers:
+                        break
+                    if active[source] < limit:
+                        submit(source)
+                        progress = True
+
+        done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            target = running.pop(task)
+            active[target["source"]] -= 1
+            results.append(task.result())
+
+    return results
+
+
+def plan_target(target: dict, force: bool) -> dict:
+    """
+    Work out what syncing a target would fetch, without syncing it.
+
+    Returns:
+        The source planner's plan (see sync_plan) with the target and
+        source names, whether a fresh cache would skip the target, and the
+        request totals the planning itself used
+    """
+    source = target["source"]
+    plan = {"target": target["name"], "source": source, "cached": False, "items": [], "requests": 0, "skip": False, "note": ""}
+    cache = get_cache_info(target["folder"])
+
+    if not force and is_cache_fresh(cache.get("synced_at"), target["cache_days"]):
+        age = (datetime.now() - cache["synced_at"].replace(tzinfo=None)).days
+        plan.update(cached=True, skip=True, note=f"Cache is fresh (synced {age} days ago); would be skipped")
+    else:
+        try:
+            with sync_trace.target(target["name"], source):
+                kwargs = target_kwargs(target)
+                if SOURCES[source].planner_takes_force:
+                    kwargs["force"] = force
+                plan.update(planner(source)(target["folder"], **kwargs))
+        except Exception as e:
+            plan["note"] = f"Planning failed: {e}"
+
+    plan["probe"] = sync_trace.take_totals(target["name"])
+    return plan
+
+
+def succeeded(results: list) -> bool:
+    """Whether no target in a run failed."""
+    return all(result["status"] != "failed" for result in results)
+
+
+def record_history(history: dict, started_at: datetime, duration: float, mode: str, force: bool, results: list):
+    """Append a run and any outages in it to the history, and warn about regressions."""
+    from sync_http import take_outages
+
+    try:
+        run_id = sync_history.record_run(history["path"], started_at, duration, mode, force, results, take_outages())
+        regressions = sync_history.latest_regressions(history["path"], run_id, history["regression_threshold"])
+    except sqlite3.Error as e:
+        print(f"   ⚠️  Could not update run history: {e}")
+        return
+    for target, description in regressions:
+        print(f"⚠️  {target} regressed: {description}")
+
+
+def probe_target(target: dict) -> str | None:
+    """Get a target's change marker, or None if the probe failed."""
+    source = SOURCES[target["source"]]
+    probe = change_probe(source.name)
+    kwargs = {"output_folder": target["folder"]} if source.probe_takes_folder else {}
+    try:
+        if not source.probe_takes_id or not target["id"]:
+            return probe(**kwargs)
+        return probe(target["id"], **kwargs)
+    except Exception as e:
+        print(f"   ⚠️  {target['name']}: change probe failed ({e})")
+        return None
+
+
+async def watch(targets: list, max_workers: int, min_interval: float, max_interval: float, history: dict):
+    """
+    Keep syncing targets as they change, until interrupted.
+
+    Each target is polled with its source's cheapest change probe. The
+    poll interval drops to min_interval after a change and backs off by
+    half again on every quiet poll, up to max_interval. Only targets whose
+    marker moved are synced; markers live in memory between polls and
+    the event loop's client stays warm. Every sync is recorded in the run
+    history.
+    """
+    markers = {}
+    intervals = {target["name"]: min_interval for target in targets}
+    next_poll = {target["name"]: 0.0 for target in targets}
+
+    # Bring everything up to date once, then record where each target is
+    started_at, started = datetime.now(), time.perf_counter()
+    results = await run_targets(targets, force=False, max_workers=max_workers)
+    record_history(history, started_at, time.perf_counter() - started, "watch", False, results)
+    initial = await asyncio.gather(*(asyncio.to_thread(probe_target, t) for t in targets))
+    for target, marker in zip(targets, initial):
+        markers[target["name"]] = marker
+        next_poll[target["name"]] = time.monotonic() + min_interval
+
+    print(f"\n👀 Watching {len(targets)} target(s) (Ctrl+C to stop)")
+
+    while True:
+        now = time.monotonic()
+        due = [t for t in targets if next_poll[t["name"]] <= now]
+        if not due:
+            await asyncio.sleep(max(0.0, min(next_poll.values()) - now))
+            continue
+
+        # Probes are small blocking calls; run the due ones side by side
+        probed = await asyncio.gather(*(asyncio.to_thread(probe_target, t) for t in due))
+
+        changed = []
+        for target, marker in zip(due, probed):
+            name = target["name"]
+            if marker is not None and marker != markers.get(name):
+                changed.append(target)
+                markers[name] = marker
+                intervals[name] = min_interval
+            else:
+                intervals[name] = min(max_interval, intervals[name] * 1.5)
+            next_poll[name] = time.monotonic() + intervals[name]
+
+        if changed:
+            stamp = datetime.now().isoformat(timespec="seconds")
+            print(f"\n🔄 {stamp}: {', '.join(t['name'] for t in changed)} changed")
+            started_at, started = datetime.now(), time.perf_counter()
+            results = await run_targets(changed, force=True, max_workers=max_workers)
+            record_history(history, started_at, time.perf_counter() - started, "watch", True, results)
+            if not succeeded(results):
+                print("⚠️  Sync completed with some errors")
+
+
 def main():
     parser = argparse.ArgumentParser(description="Sync Sharity documentation to Obsidian")
     parser.add_argument("--all", "-a", action="store_true", help="Sync all sources")
-    parser.add_argument("--notion", "-n", action="store_true", help="Sync Notion")
-    parser.add_argument("--miro", "-m", action="store_true", help="Sync Miro")
-    parser.add_argument("--figma", "-f", action="store_true", help="Sync Figma")
+    for source in SOURCES.values():
+        parser.add_argument(f"--{source.name}", source.flag, action="store_true", help=f"Sync {source.label}")
     parser.add_argument("--force", action="store_true", help="Force update (ignore cache)")
     parser.add_argument("--status", "-s", action="store_true", help="Show cache status")
+    parser.add_argument(
+        "--history", type=int, nargs="?", const=sync_history.HISTORY_WINDOW, metavar="RUNS",
+        help="Show run history percentiles and regressions for the last RUNS runs",
+    )
+    parser.add_argument("--search", metavar="QUERY", help="Search the synced notes (FTS5 query syntax)")
+    parser.add_argument(
+        "--where", action="append", metavar="KEY=VALUE",
+        help="List synced pages of the selected sources (all by default) by property; "
+        "repeat to combine, KEY!=VALUE excludes, KEY alone means set",
+    )
+    parser.add_argument(
+        "--export-snapshot", type=Path, metavar="FILE",
+        help="Write the selected sources' synced output (all by default) to a single-file snapshot",
+    )
+    parser.add_argument(
+        "--import-snapshot", type=Path, metavar="FILE",
+        help="Unpack the selected sources (all by default) from a snapshot, writing only changed files",
+    )
+    parser.add_argument("--config", "-c", type=Path, help="Targets config file (default: scripts/sync_targets.json)")
+    parser.add_argument("--workers", "-w", type=int, help="Max targets synced at once (overrides config)")
+    parser.add_argument("--watch", action="store_true", help="Keep running and sync targets as they change")
+    parser.add_argument(
+        "--plan", action="store_true",
+        help="Show what a sync would fetch and estimate its requests, bytes and duration, without syncing",
+    )
+    parser.add_argument("--record", type=Path, metavar="DIR", help="Save API responses as replay fixtures")
+    parser.add_argument("--replay", type=Path, metavar="DIR", help="Serve API responses from fixtures, offline")
+    parser.add_argument(
+        "--profile", type=Path, nargs="?", const=DEFAULT_TRACE_PATH, metavar="TRACE",
+        help="Trace requests and stages, print a breakdown and save a JSON trace (default: .sync-trace.json)",
+    )
     args = parser.parse_args()
 
+    # Reject incompatible modes before loading anything
+    if args.watch and args.profile:
+        parser.error("--profile reports on a single run and can't be combined with --watch")
+    if args.plan and (args.watch or args.profile):
+        parser.error("--plan only probes; it can't be combined with --watch or --profile")
+
+    try:
+        config = load_config(args.config)
+    except ValueError as e:
+        print(f"❌ Invalid sync config: {e}")
+        return 1
+
     if args.status:
-        show_status()
+        show_status(config)
         return 0
 
-    if not any([args.all, args.notion, args.miro, args.figma]):
+    if args.history is not None:
+        sync_history.show_history(config["history"]["path"], config["history"]["regression_threshold"], args.history)
+        return 0
+
+    if args.search:
+        try:
+            sync_search.show_search(config["vault_folder"], config["search"]["path"], args.search)
+        except sqlite3.Error as e:
+            print(f"❌ Search failed: {e}")
+            return 1
+        return 0
+
+    selected = {name for name in SOURCES if args.all or getattr(args, name)}
+
+    if args.where:
+        sources = selected or set(SOURCES)
+        sync_properties.show_where([t for t in config["targets"] if t["source"] in sources], args.where)
+        return 0
+
+    if args.export_snapshot or args.import_snapshot:
+        sources = selected or set(SOURCES)
+        targets = [t for t in config["targets"] if t["source"] in sources]
+        try:
+            if args.export_snapshot:
+                sync_snapshot.show_snapshot_export(args.export_snapshot, config["vault_folder"], targets)
+            if args.import_snapshot:
+                sync_snapshot.show_snapshot_import(
+                    args.import_snapshot, config["vault_folder"], targets, sources, config["search"]["path"],
+                )
+        except (OSError, ValueError, sqlite3.Error) as e:
+            print(f"❌ Snapshot failed: {e}")
+            return 1
+        return 0
+
+    if not selected:
         parser.print_help()
         return 1
 
     # Load environment variables
     load_env()
 
+    # The HTTP stack, and each selected source, load only once a sync runs
+    import sync_replay
+    from sync_http import configure_rate_limit, get_rate_limiter, run_with_client
+
+    try:
+        store = sync_replay.configure(args.record, args.replay)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    if store and store.mode == "record":
+        print(f"⏺️  Recording API responses to {store.folder}")
+    elif store:
+        print(f"⏯️  Replaying API responses from {store.folder}")
+
+    targets = [t for t in config["targets"] if t["source"] in selected]
+    for source in {t["source"] for t in targets}:
+        load_source(source)
+
+    for source, rate in config["rate_limits"].items():
+        configure_rate_limit(source, rate)
+
+    max_workers = args.workers or config["max_workers"]
+
+    # Request totals feed the run history; full spans only when profiling
+    sync_trace.enable(keep_spans=bool(args.profile))
+
+    if args.plan:
+        plans = [plan_target(target, args.force) for target in targets]
+        sync_plan.show_plan(
+            plans,
+            sync_history.target_estimates(config["history"]["path"]),
+            {source: get_rate_limiter(source).rate for source in selected},
+            args.force,
+        )
+        return 0
+
     # Ensure base folder exists
-    SHARITY_FOLDER.mkdir(parents=True, exist_ok=True)
-
-    success = True
-
-    if args.all or args.notion:
-        print("\n📝 Syncing Notion...")
-        notion_folder = SHARITY_FOLDER / "Notion"
-        cache = get_cache_info(notion_folder)
-
-        if args.force or not is_cache_fresh(cache.get("synced_at")):
-            if not sync_notion(notion_folder, force=args.force):
-                success = False
-        else:
-            print(f"   Using cached version (synced {(datetime.now() - cache['synced_at'].replace(tzinfo=None)).days} days ago)")
-            print("   Use --force to update")
-
-    if args.all or args.miro:
-        print("\n🎨 Syncing Miro...")
-        miro_folder = SHARITY_FOLDER / "Architecture"
-        cache = get_cache_info(miro_folder)
-
-        if args.force or not is_cache_fresh(cache.get("synced_at")):
-            if not sync_miro(miro_folder, force=args.force):
-                success = False
-        else:
-            print(f"   Using cached version (synced {(datetime.now() - cache['synced_at'].replace(tzinfo=None)).days} days ago)")
-            print("   Use --force to update")
-
-    if args.all or args.figma:
-        print("\n🎨 Syncing Figma...")
-        figma_folder = SHARITY_FOLDER / "Design"
-        cache = get_cache_info(figma_folder)
-
-        if args.force or not is_cache_fresh(cache.get("synced_at")):
-            if not sync_figma(figma_folder, force=args.force):
-                success = False
-        else:
-            print(f"   Using cached version (synced {(datetime.now() - cache['synced_at'].replace(tzinfo=None)).days} days ago)")
-            print("   Use --force to update")
+    config["vault_folder"].mkdir(parents=True, exist_ok=True)
+
+    # Notes are indexed for --search as the sources write them
+    try:
+        sync_search.open_index(config["vault_folder"], config["search"]["path"])
+    except sqlite3.Error as e:
+        print(f"⚠️  Search index unavailable, not updating it: {e}")
+
+    if args.watch:
+        try:
+            run_with_client(watch(
+                targets, max_workers,
+                config["watch"]["min_interval"], config["watch"]["max_interval"],
+                config["history"],
+            ))
+        except KeyboardInterrupt:
+            print("\n👋 Stopped watching")
+        finally:
+            sync_search.close_index()
+        return 0
+
+    started_at, started = datetime.now(), time.perf_counter()
+    try:
+        results = run_with_client(run_targets(targets, args.force, max_workers))
+    finally:
+        sync_search.close_index()
+    record_history(config["history"], started_at, time.perf_counter() - started, "run", args.force, results)
+    success = succeeded(results)
+
+    if args.profile:
+        spans = sync_trace.get_spans()
+        summary = sync_trace.summarize(spans)
+        sync_trace.print_report(summary)
+        sync_trace.write_trace(args.profile, spans, summary)
+        print(f"\n   ✅ Saved trace: {args.profile}")
 
     print("\n" + "=" * 60)
     if success:
@@ -4,22 +4,80 @@ Figma to Obsidian sync module.
 
 Fetches file information from Figma API and saves as Markdown.
 Since Figma content is visual, we save metadata, frames, and links.
+Network I/O runs on asyncio; sync_figma wraps sync_figma_async.
 """
+import asyncio
+import gzip
+import hashlib
+import json
+import math
 import os
+import re
+import shutil
 from datetime import datetime
 from pathlib import Path
+from typing import NamedTuple
 
 try:
     import requests
 except ImportError:
     requests = None
 
+from sync_config import DEFAULT_HISTORY_PATH
+from sync_http import CircuitOpenError, circuit_open, get_async_client, get_semaphore, get_session, httpx, run_with_client, send, send_async
+from sync_plan import synced_notes
+from sync_search import remove_note, write_note, write_placeholder
+from sync_trace import span
+
 # Figma configuration
 FIGMA_FILE_KEY = "S74LV4AyyLLK7L2G5Y211m"  # Sharity design file
 FIGMA_NODE_ID = "2004-4099"  # Specific frame
 FIGMA_API_BASE = "https://api.figma.com/v1"
 FIGMA_FILE_URL = f"https://figma.com/design/{FIGMA_FILE_KEY}/Sharity"
 
+# Node-scoped sync: a target with node_ids in the config (e.g. ["1-2",
+# "3-4"]) fetches only those nodes through the nodes endpoint instead of
+# the whole file.
+FIGMA_NODES_MAX_IDS_CHARS = 1500  # Keep batched nodes URLs well under limits
+
+# Frame thumbnails, rendered through the images endpoint into assets/
+FIGMA_EXPORT_THUMBNAILS = True
+FIGMA_THUMBNAIL_FORMAT = "png"  # png or svg
+FIGMA_THUMBNAIL_SCALE = 0.5
+FIGMA_THUMBNAIL_WIDTH = 320  # Embed width in notes
+FIGMA_IMAGES_BATCH_SIZE = 50  # Ids per images call; renders are expensive
+FIGMA_DOWNLOAD_WORKERS = 8
+FIGMA_ASSETS_DIRNAME = "assets"
+FIGMA_THUMBNAILS_FILENAME = "thumbnails.json"
+
+# Design-system catalog. With a team id (here or FIGMA_TEAM_ID in .env) the
+# paginated team library endpoints are used instead of the file's own.
+FIGMA_TEAM_ID = ""
+FIGMA_CATALOG_KINDS = ("components", "component_sets", "styles")
+FIGMA_LIBRARY_PAGE_SIZE = 500
+FIGMA_COMPONENT_NOTES = False  # Also write one note per component
+FIGMA_COMPONENTS_DIRNAME = "Components"
+FIGMA_NODE_NOTE_TYPES = {"FRAME", "SECTION", "GROUP", "COMPONENT", "COMPONENT_SET", "INSTANCE", "TEXT"}
+
+# Raw API payloads are cached (gzipped, keyed by file version) so re-renders
+# can run offline. The cache sits next to the run history, one folder per
+# output folder, so it stays out of the vault iCloud syncs.
+FIGMA_CACHE_DIRNAME = ".figma-cache"  # Older versions kept it in the output folder
+FIGMA_CACHE_ROOT = DEFAULT_HISTORY_PATH.parent / FIGMA_CACHE_DIRNAME
+FIGMA_STATE_FILENAME = "state.json"
+FIGMA_CACHE_KEEP_VERSIONS = 3  # Current plus a couple of previous, for diffs
+
+# Node types kept in the node index that notes and the changelog render from.
+# Vectors, shapes and text are left out; they dwarf everything else in count.
+FIGMA_INDEX_TYPES = {"CANVAS", "SECTION", "FRAME", "GROUP", "COMPONENT", "COMPONENT_SET", "INSTANCE"}
+FIGMA_STRUCTURAL_TYPES = {"CANVAS", "SECTION", "FRAME", "COMPONENT", "COMPONENT_SET"}
+FIGMA_TYPE_LABELS = {"CANVAS": "page", "COMPONENT_SET": "component set"}
+FIGMA_PAGES_DIRNAME = "Pages"
+FIGMA_NODES_DIRNAME = "Nodes"  # Node-scoped syncs write their notes here
+FIGMA_PAGE_NOTE_MAX_DEPTH = 4  # Outline depth below the page in page notes
+FIGMA_CHANGELOG_FILENAME = "changelog.json"
+FIGMA_CHANGELOG_MAX_ENTRIES = 50
+
 
 def get_figma_token() -> str | None:
     """Get Figma API token from environment."""
@@ -45,7 +103,7 @@ def figma_request(endpoint: str) -> dict | None:
     url = f"{FIGMA_API_BASE}/{endpoint}"
 
     try:
-        response = requests.get(url, headers=headers, timeout=30)
+        response = send("figma", "GET", url, headers=headers)
 
         if response.status_code == 200:
             return response.json()
@@ -53,64 +111,1323 @@ def figma_request(endpoint: str) -> dict | None:
             print(f"   ❌ Figma API error: {response.status_code}")
             print(f"      {response.text[:200]}")
             return None
+    except CircuitOpenError:
+        # Reported once, when the circuit opened
+        return None
     except requests.RequestException as e:
         print(f"   ❌ Request error: {e}")
         return None
 
 
-def get_file() -> dict | None:
+async def figma_request_async(endpoint: str) -> dict | None:
+    """Make a request to Figma API on the shared async client."""
+    if httpx is None:
+        # No async client available; run the blocking helper off-loop
+        return await asyncio.to_thread(figma_request, endpoint)
+
+    token = get_figma_token()
+    if not token:
+        print("   ❌ FIGMA_ACCESS_TOKEN not set in environment")
+        print("   Create .env file with FIGMA_ACCESS_TOKEN=figd_xxx...")
+        return None
+
+    headers = {
+        "X-Figma-Token": token,
+    }
+
+    url = f"{FIGMA_API_BASE}/{endpoint}"
+
+    try:
+        response = await send_async("figma", "GET", url, headers=headers)
+    except CircuitOpenError:
+        # Reported once, when the circuit opened
+        return None
+    except httpx.HTTPError as e:
+        print(f"   ❌ Request error: {e}")
+        return None
+
+    if response.status_code == 200:
+        return response.json()
+    print(f"   ❌ Figma API error: {response.status_code}")
+    print(f"      {response.text[:200]}")
+    return None
+
+
+def get_file_url(file_key: str = FIGMA_FILE_KEY) -> str:
+    """Get the Figma URL of a file."""
+    if file_key == FIGMA_FILE_KEY:
+        return FIGMA_FILE_URL
+    return f"https://figma.com/design/{file_key}"
+
+
+def get_node_url(node_id: str, file_key: str = FIGMA_FILE_KEY) -> str:
+    """Get the Figma URL of a node, accepting API (1:2) or URL (1-2) ids."""
+    return f"{get_file_url(file_key)}?node-id={node_id.replace(':', '-')}"
+
+
+def get_file(file_key: str = FIGMA_FILE_KEY) -> dict | None:
     """Fetch file information."""
-    return figma_request(f"files/{FIGMA_FILE_KEY}")
+    return figma_request(f"files/{file_key}")
 
 
-def get_file_components() -> dict | None:
-    """Fetch components from the file."""
-    return figma_request(f"files/{FIGMA_FILE_KEY}/components")
+def get_file_meta(file_key: str = FIGMA_FILE_KEY) -> dict | None:
+    """Fetch file name, version and lastModified without the node tree."""
+    return figma_request(f"files/{file_key}?depth=1")
 
 
-def extract_pages_and_frames(document: dict) -> list:
-    """Extract pages and their top-level frames from document tree."""
-    pages = []
+async def get_file_async(file_key: str = FIGMA_FILE_KEY) -> dict | None:
+    """Fetch file information."""
+    return await figma_request_async(f"files/{file_key}")
+
+
+async def get_file_meta_async(file_key: str = FIGMA_FILE_KEY) -> dict | None:
+    """Fetch file name, version and lastModified without the node tree."""
+    return await figma_request_async(f"files/{file_key}?depth=1")
+
+
+def get_change_marker(file_key: str = FIGMA_FILE_KEY) -> str | None:
+    """Get the file's version, a cheap check for changes."""
+    meta = get_file_meta(file_key)
+    if meta is None:
+        return None
+    return meta.get("version", "")
+
+
+def get_scoped_node_ids(configured: list[str] | None = None) -> list[str]:
+    """
+    Get a target's node ids for a node-scoped sync, in API (1:2) form.
+
+    Only the target's own node_ids scope it; a target without any syncs
+    the whole file.
+    """
+    # Accept ids copied from URLs (1-2) as well as API ids (1:2)
+    return list(dict.fromkeys(i.replace("-", ":") for i in configured or []))
+
+
+def batch_node_ids(node_ids: list[str], max_chars: int = FIGMA_NODES_MAX_IDS_CHARS) -> list[list[str]]:
+    """Split node ids into as few comma-joined batches as fit the URL budget."""
+    batches = []
+    batch = []
+    length = 0
+    for node_id in node_ids:
+        if batch and length + len(node_id) + 1 > max_chars:
+            batches.append(batch)
+            batch = []
+            length = 0
+        batch.append(node_id)
+        length += len(node_id) + 1
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+async def get_file_nodes_async(node_ids: list[str], file_key: str = FIGMA_FILE_KEY) -> dict | None:
+    """
+    Fetch subtrees for specific nodes, batched into as few calls as possible.
+
+    Returns a merged response with the file name, version and lastModified,
+    and a nodes map of node id -> {document, components}.
+    """
+    results = await asyncio.gather(*(
+        figma_request_async(f"files/{file_key}/nodes?ids={','.join(batch)}")
+        for batch in batch_node_ids(node_ids)
+    ))
+    if not results or not all(results):
+        return None
+
+    merged = results[0]
+    merged["nodes"] = dict(merged.get("nodes") or {})
+    for result in results[1:]:
+        merged["nodes"].update(result.get("nodes") or {})
+    return merged
+
+
+async def get_images_async(node_ids: list[str], file_key: str = FIGMA_FILE_KEY) -> dict:
+    """
+    Get render URLs for nodes from the images endpoint, in batches.
+
+    Returns a map of node id -> image URL; nodes Figma could not render
+    are left out.
+    """
+    batches = [
+        node_ids[start:start + FIGMA_IMAGES_BATCH_SIZE]
+        for start in range(0, len(node_ids), FIGMA_IMAGES_BATCH_SIZE)
+    ]
+    results = await asyncio.gather(*(
+        figma_request_async(
+            f"images/{file_key}?ids={','.join(batch)}"
+            f"&format={FIGMA_THUMBNAIL_FORMAT}&scale={FIGMA_THUMBNAIL_SCALE}"
+        )
+        for batch in batches
+    ))
+
+    images = {}
+    for result in results:
+        if not result:
+            continue
+        if result.get("err"):
+            print(f"   ⚠️  Figma image export error: {result['err']}")
+        images.update({k: v for k, v in (result.get("images") or {}).items() if v})
+    return images
+
+
+async def download_file_async(url: str, path: Path) -> bool:
+    """Stream a file to disk, replacing the target only once complete."""
+    async with get_semaphore("figma_downloads", FIGMA_DOWNLOAD_WORKERS):
+        if httpx is None:
+            return await asyncio.to_thread(download_file, url, path)
+
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        try:
+            async with get_async_client().stream("GET", url, timeout=60) as response:
+                if response.status_code != 200:
+                    print(f"   ⚠️  Download failed ({response.status_code}): {path.name}")
+                    return False
+                with open(tmp_path, "wb") as f:
+                    async for chunk in response.aiter_bytes(64 * 1024):
+                        f.write(chunk)
+            tmp_path.replace(path)
+            return True
+        except (httpx.HTTPError, OSError) as e:
+            print(f"   ⚠️  Download failed: {path.name} ({e})")
+            tmp_path.unlink(missing_ok=True)
+            return False
+
+
+def download_file(url: str, path: Path) -> bool:
+    """Stream a file to disk, replacing the target only once complete."""
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    try:
+        with get_session("figma").get(url, stream=True, timeout=60) as response:
+            if response.status_code != 200:
+                print(f"   ⚠️  Download failed ({response.status_code}): {path.name}")
+                return False
+            with open(tmp_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    f.write(chunk)
+        tmp_path.replace(path)
+        return True
+    except (requests.RequestException, OSError) as e:
+        print(f"   ⚠️  Download failed: {path.name} ({e})")
+        tmp_path.unlink(missing_ok=True)
+        return False
+
+
+def get_team_id() -> str:
+    """Get the Figma team id whose library should be cataloged, if any."""
+    return os.environ.get("FIGMA_TEAM_ID", FIGMA_TEAM_ID)
+
+
+async def iter_library_pages_async(kind: str, file_key: str = FIGMA_FILE_KEY):
+    """
+    Yield pages of library entries (components, component_sets or styles).
+
+    File libraries come back in one response; team libraries are followed
+    through their pagination cursors one page at a time. A failed request
+    yields None and ends the listing, which is then incomplete.
+    """
+    team_id = get_team_id()
+    if not team_id:
+        result = await figma_request_async(f"files/{file_key}/{kind}")
+        yield (result.get("meta", {}).get(kind) or []) if result else None
+        return
+
+    cursor = None
+    while True:
+        endpoint = f"teams/{team_id}/{kind}?page_size={FIGMA_LIBRARY_PAGE_SIZE}"
+        if cursor:
+            endpoint += f"&after={cursor}"
+
+        result = await figma_request_async(endpoint)
+        if not result:
+            yield None
+            return
+
+        meta = result.get("meta", {})
+        entries = meta.get(kind) or []
+        yield entries
+
+        cursor = (meta.get("cursor") or {}).get("after")
+        if not entries or not cursor:
+            return
+
+
+def compact_library_entry(entry: dict, file_key: str = FIGMA_FILE_KEY) -> dict:
+    """Keep only the fields the catalog renders from a library entry."""
+    frame = entry.get("containing_frame") or {}
+    description = (entry.get("description") or "").strip().split("\n")[0]
+    compact = {
+        "name": entry.get("name", "Unnamed"),
+        "node_id": entry.get("node_id", ""),
+        "key": entry.get("key", ""),
+        "file_key": entry.get("file_key", file_key),
+        "description": description[:200],
+        "page": frame.get("pageName", ""),
+        "frame": frame.get("name", ""),
+        "style_type": entry.get("style_type", ""),
+    }
+    return {k: v for k, v in compact.items() if v}
+
+
+async def fetch_catalog_async(file_key: str = FIGMA_FILE_KEY) -> dict:
+    """
+    Fetch components, component sets and styles concurrently.
+
+    Each page is projected to compact entries as it arrives, so large team
+    libraries are never held as raw responses.
+
+    Returns:
+        Map of kind -> compact entries, or None for a kind whose listing
+        failed (see catalog_complete)
+    """
+
+    async def fetch_kind(kind):
+        entries = []
+        async for page in iter_library_pages_async(kind, file_key):
+            if page is None:
+                return None
+            entries.extend(compact_library_entry(entry, file_key) for entry in page)
+        return entries
+
+    results = await asyncio.gather(*(fetch_kind(kind) for kind in FIGMA_CATALOG_KINDS))
+    return dict(zip(FIGMA_CATALOG_KINDS, results))
+
+
+def catalog_complete(catalog: dict) -> bool:
+    """Whether every kind of a catalog was fetched; only then is it cached or written."""
+    return all(catalog.get(kind) is not None for kind in FIGMA_CATALOG_KINDS)
+
+
+def get_cache_dir(output_folder: Path) -> Path:
+    """
+    Get the raw payload cache folder for an output folder.
+
+    A cache left in the output folder by older versions is moved over.
+    """
+    resolved = output_folder.resolve()
+    digest = hashlib.sha1(str(resolved).encode("utf-8")).hexdigest()[:12]
+    cache_dir = FIGMA_CACHE_ROOT / f"{sanitize_filename(resolved.name)}-{digest}"
+    legacy_dir = output_folder / FIGMA_CACHE_DIRNAME
+    if legacy_dir.is_dir():
+        if cache_dir.exists():
+            shutil.rmtree(legacy_dir, ignore_errors=True)
+        else:
+            cache_dir.parent.mkdir(parents=True, exist_ok=True)
+            shutil.move(str(legacy_dir), str(cache_dir))
+    return cache_dir
+
+
+def load_sync_state(output_folder: Path) -> dict:
+    """Load the state (version, lastModified) recorded by the last sync."""
+    state_file = get_cache_dir(output_folder) / FIGMA_STATE_FILENAME
+    if not state_file.exists():
+        return {}
+    try:
+        return json.loads(state_file.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def save_sync_state(output_folder: Path, state: dict):
+    """Record the state of the current sync."""
+    cache_dir = get_cache_dir(output_folder)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    state_file = cache_dir / FIGMA_STATE_FILENAME
+    state_file.write_text(json.dumps(state, indent=2), encoding="utf-8")
+
 
-    def traverse(node, path=""):
+def nodes_payload_kind(node_ids: list[str]) -> str:
+    """Get a stable cache kind for a set of scoped node ids."""
+    digest = hashlib.sha1(",".join(sorted(node_ids)).encode("utf-8")).hexdigest()
+    return f"nodes-{digest[:12]}"
+
+
+def cached_payload_path(output_folder: Path, version: str, kind: str, file_key: str = FIGMA_FILE_KEY) -> Path:
+    """Get the cache path for a raw payload of the given kind and version."""
+    return get_cache_dir(output_folder) / f"{file_key}-{version}-{kind}.json.gz"
+
+
+def load_cached_payload(output_folder: Path, version: str, kind: str, file_key: str = FIGMA_FILE_KEY) -> dict | None:
+    """Load a cached raw payload, or None if it is not cached."""
+    if not version:
+        return None
+    path = cached_payload_path(output_folder, version, kind, file_key)
+    if not path.exists():
+        return None
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_cached_payload(
+    output_folder: Path,
+    version: str,
+    kind: str,
+    payload: dict,
+    file_key: str = FIGMA_FILE_KEY,
+):
+    """Store a raw payload compressed on disk, keyed by file version."""
+    if not version:
+        return
+    path = cached_payload_path(output_folder, version, kind, file_key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write to a temp file first so an interrupted sync never leaves a
+    # truncated archive behind for the next offline re-render.
+    tmp_path = path.with_suffix(".tmp")
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        json.dump(payload, f, separators=(",", ":"))
+    tmp_path.replace(path)
+
+
+def prune_cached_payloads(
+    output_folder: Path,
+    keep: int = FIGMA_CACHE_KEEP_VERSIONS,
+    file_key: str = FIGMA_FILE_KEY,
+):
+    """Delete cached payloads of all but the most recently written versions."""
+    cache_dir = get_cache_dir(output_folder)
+    if not cache_dir.exists():
+        return
+
+    # Versions and kinds (nodes-<digest>) may both contain "-"; kinds are
+    # known, so the version is whatever sits between the key and the kind
+    pattern = re.compile(rf"{re.escape(file_key)}-(.+)-(?:file|catalog|nodes-[0-9a-f]{{12}})\.json\.gz")
+    latest_write = {}
+    by_version = {}
+    for path in cache_dir.glob(f"{file_key}-*.json.gz"):
+        match = pattern.fullmatch(path.name)
+        if not match:
+            continue
+        version = match.group(1)
+        by_version.setdefault(version, []).append(path)
+        latest_write[version] = max(latest_write.get(version, 0), path.stat().st_mtime)
+
+    newest_first = sorted(latest_write, key=latest_write.get, reverse=True)
+    for version in newest_first[keep:]:
+        for path in by_version[version]:
+            path.unlink(missing_ok=True)
+
+
+class IndexedNode(NamedTuple):
+    """A node in the flat index built by build_node_index."""
+
+    type: str
+    name: str
+    parent_id: str | None  # Nearest indexed ancestor
+    page_id: str | None
+    depth: int  # Pages are at depth 0
+
+
+def build_node_index(document: dict, types: set | None = None, max_depth: int | None = None) -> dict:
+    """
+    Index a document's nodes by id in a single iterative pass.
+
+    Args:
+        document: Figma document node
+        types: Node types to keep (all types if None). A kept node's
+            parent_id is its nearest kept ancestor.
+        max_depth: Don't descend below this depth (pages are depth 0)
+
+    Returns:
+        Map of node id -> IndexedNode, in document order
+    """
+    index = {}
+    stack = [(child, None, None, 0) for child in reversed(document.get("children", []))]
+
+    while stack:
+        node, parent_id, page_id, depth = stack.pop()
         node_type = node.get("type", "")
-        name = node.get("name", "")
+        node_id = node.get("id", "")
 
         if node_type == "CANVAS":
-            # This is a page
-            frames = []
-            for child in node.get("children", []):
-                if child.get("type") == "FRAME":
-                    frames.append({
-                        "id": child.get("id", ""),
-                        "name": child.get("name", ""),
-                    })
-            pages.append({
-                "name": name,
-                "frames": frames,
-            })
+            page_id = node_id
+        if types is None or node_type in types:
+            index[node_id] = IndexedNode(node_type, node.get("name", ""), parent_id, page_id, depth)
+            parent_id = node_id
+
+        if max_depth is not None and depth >= max_depth:
+            continue
+        children = node.get("children")
+        if children:
+            stack.extend((child, parent_id, page_id, depth + 1) for child in reversed(children))
+
+    return index
+
+
+def filter_node_index(index: dict, types: set) -> dict:
+    """
+    Select the entries of a node index with one of the given types.
+
+    A selected entry's parent_id becomes its nearest selected ancestor, so
+    wrapping a frame in a group (or ungrouping it) doesn't move it.
+    """
+    selected = {}
+    nearest = {}  # Node id -> nearest selected node at or above it
+    for node_id, node in index.items():
+        parent_id = nearest.get(node.parent_id)
+        if node.type in types:
+            selected[node_id] = node if parent_id == node.parent_id else node._replace(parent_id=parent_id)
+            nearest[node_id] = node_id
         else:
-            for child in node.get("children", []):
-                traverse(child, f"{path}/{name}")
+            nearest[node_id] = parent_id
+    return selected
+
+
+def diff_structure(old: dict, new: dict) -> dict:
+    """
+    Compare two node indexes from build_node_index.
 
-    # Document has pages as children
-    for child in document.get("children", []):
-        traverse(child)
+    Returns lists of added, removed, renamed and moved nodes. Set and dict
+    lookups keep this linear in the number of nodes. A node moved if its
+    parent_id changed; pass indexes from filter_node_index to compare
+    structural parents only.
+    """
+    old_ids = old.keys()
+    new_ids = new.keys()
+
+    added = [(node_id, new[node_id]) for node_id in new_ids - old_ids]
+    removed = [(node_id, old[node_id]) for node_id in old_ids - new_ids]
+    renamed = []
+    moved = []
+    for node_id in old_ids & new_ids:
+        old_node = old[node_id]
+        new_node = new[node_id]
+        if old_node.name != new_node.name:
+            renamed.append((node_id, old_node, new_node))
+        if old_node.parent_id != new_node.parent_id:
+            moved.append((node_id, old_node, new_node))
+
+    def order(entry):
+        return entry[1].type, entry[1].name
+
+    return {
+        "added": sorted(added, key=order),
+        "removed": sorted(removed, key=order),
+        "renamed": sorted(renamed, key=order),
+        "moved": sorted(moved, key=order),
+    }
+
+
+def changelog_entry(
+    diff: dict,
+    old: dict,
+    new: dict,
+    from_version: str,
+    to_version: str,
+    last_modified: str,
+    file_key: str = FIGMA_FILE_KEY,
+) -> dict:
+    """Turn a structural diff into a JSON-serialisable changelog entry."""
+
+    def kind(node):
+        return FIGMA_TYPE_LABELS.get(node.type, node.type.lower())
+
+    def label(index, node_id):
+        node = index.get(node_id)
+        if not node:
+            return "_(root)_"
+        return f"{kind(node)} **{node.name}**"
+
+    def link(node_id):
+        return get_node_url(node_id, file_key)
+
+    lines = {"added": [], "removed": [], "renamed": [], "moved": []}
+    for node_id, node in diff["added"]:
+        lines["added"].append(f"[{kind(node)} **{node.name}**]({link(node_id)}) in {label(new, node.parent_id)}")
+    for node_id, node in diff["removed"]:
+        lines["removed"].append(f"{kind(node)} **{node.name}** from {label(old, node.parent_id)}")
+    for node_id, old_node, new_node in diff["renamed"]:
+        lines["renamed"].append(f"[{kind(old_node)} **{old_node.name}** → **{new_node.name}**]({link(node_id)})")
+    for node_id, old_node, new_node in diff["moved"]:
+        lines["moved"].append(
+            f"[{kind(new_node)} **{new_node.name}**]({link(node_id)}): "
+            f"{label(old, old_node.parent_id)} → {label(new, new_node.parent_id)}"
+        )
+
+    return {
+        "from_version": from_version,
+        "to_version": to_version,
+        "last_modified": last_modified,
+        "changes": lines,
+    }
 
+
+def load_changelog(output_folder: Path) -> list:
+    """Load the changelog entries recorded by previous syncs."""
+    changelog_file = get_cache_dir(output_folder) / FIGMA_CHANGELOG_FILENAME
+    if not changelog_file.exists():
+        return []
+    try:
+        return json.loads(changelog_file.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return []
+
+
+def save_changelog(output_folder: Path, entries: list, file_name: str, file_key: str = FIGMA_FILE_KEY) -> Path:
+    """Store changelog entries and render them as Changelog.md."""
+    file_url = get_file_url(file_key)
+    entries = entries[:FIGMA_CHANGELOG_MAX_ENTRIES]
+    cache_dir = get_cache_dir(output_folder)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    changelog_file = cache_dir / FIGMA_CHANGELOG_FILENAME
+    changelog_file.write_text(json.dumps(entries, indent=2), encoding="utf-8")
+
+    now = datetime.now().isoformat(timespec="seconds")
+    entries_md = ""
+    for entry in entries:
+        modified = entry.get("last_modified", "")
+        entries_md += f"## Version {entry['to_version']}"
+        entries_md += f" ({modified[:10]})\n\n" if modified else "\n\n"
+        entries_md += f"_Changes since version {entry['from_version']}_\n\n"
+        changes = entry.get("changes", {})
+        if not any(changes.values()):
+            entries_md += "_No structural changes_\n\n"
+            continue
+        for kind in ("added", "removed", "renamed", "moved"):
+            if changes.get(kind):
+                entries_md += f"### {kind.capitalize()}\n\n"
+                for line in changes[kind]:
+                    entries_md += f"- {line}\n"
+                entries_md += "\n"
+
+    md_content = f"""---
+source: figma
+source_url: {file_url}
+source_id: "{file_key}"
+title: "{file_name} Changelog"
+synced_at: {now}
+tags:
+  - sharity
+  - figma
+  - design
+  - changelog
+---
+
+# {file_name} Changelog
+
+Structural changes (pages, sections, frames, components) between synced versions.
+
+{entries_md}
+---
+_Synced: {now}_
+_Source: [Figma]({file_url})_
+"""
+
+    file_path = output_folder / "Changelog.md"
+    write_note(file_path, md_content)
+    return file_path
+
+
+def node_digest(node: dict) -> str:
+    """Hash a node's subtree, to tell whether it changed between versions."""
+    return hashlib.sha1(json.dumps(node, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def thumbnail_path(output_folder: Path, node_id: str) -> Path:
+    """Get the asset path for a node's thumbnail."""
+    filename = f"{node_id.replace(':', '-')}.{FIGMA_THUMBNAIL_FORMAT}"
+    return output_folder / FIGMA_ASSETS_DIRNAME / filename
+
+
+def frame_digests(document: dict, frame_ids: list[str]) -> dict:
+    """Digest the subtrees of top-level frames, for export_thumbnails_async."""
+    wanted = set(frame_ids)
+    digests = {}
+    # Top-level frames hang off pages, directly or through sections
+    stack = [child for page in document.get("children", []) for child in page.get("children", [])]
+    while stack:
+        node = stack.pop()
+        if node.get("id") in wanted:
+            digests[node["id"]] = node_digest(node)
+        elif node.get("type") == "SECTION":
+            stack.extend(node.get("children", []))
+    return digests
+
+
+def load_thumbnail_manifest(output_folder: Path) -> dict:
+    """Load the exported thumbnails' manifest: frame id -> version and digest."""
+    manifest_file = get_cache_dir(output_folder) / FIGMA_THUMBNAILS_FILENAME
+    if not manifest_file.exists():
+        return {}
+    try:
+        return json.loads(manifest_file.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+async def export_thumbnails_async(
+    output_folder: Path,
+    digests: dict,
+    frame_ids: list[str],
+    version: str,
+    file_key: str = FIGMA_FILE_KEY,
+) -> dict:
+    """
+    Export thumbnails for frames, skipping ones already exported.
+
+    A thumbnail is keyed by node id and a digest of the frame's subtree
+    (see frame_digests), so it is only exported again when the frame
+    changed, whatever else changed in the file. The manifest records the
+    version it was rendered from, and is only rewritten when it changes.
+
+    Returns a map of frame id -> thumbnail path for frames that have one.
+    """
+    manifest_file = get_cache_dir(output_folder) / FIGMA_THUMBNAILS_FILENAME
+    manifest = load_thumbnail_manifest(output_folder)
+    loaded = dict(manifest)
+
+    wanted = set(frame_ids)
+    stale = []
+    for frame_id in frame_ids:
+        digest = digests.get(frame_id)
+        if (
+            digest is not None
+            and manifest.get(frame_id, {}).get("digest") == digest
+            and thumbnail_path(output_folder, frame_id).exists()
+        ):
+            continue
+        stale.append(frame_id)
+
+    if stale:
+        print(f"   Exporting {len(stale)} thumbnail(s)...")
+        urls = await get_images_async(stale, file_key)
+        (output_folder / FIGMA_ASSETS_DIRNAME).mkdir(parents=True, exist_ok=True)
+
+        fetched = [frame_id for frame_id in stale if frame_id in urls]
+        results = await asyncio.gather(*(
+            download_file_async(urls[frame_id], thumbnail_path(output_folder, frame_id))
+            for frame_id in fetched
+        ))
+
+        exported = 0
+        for frame_id, ok in zip(fetched, results):
+            if ok:
+                manifest[frame_id] = {"version": version, "digest": digests.get(frame_id)}
+                exported += 1
+        print(f"   ✅ Exported {exported} thumbnail(s)")
+    else:
+        print("   Thumbnails up to date")
+
+    # Drop thumbnails of frames that no longer exist
+    for frame_id in list(manifest):
+        if frame_id not in wanted:
+            thumbnail_path(output_folder, frame_id).unlink(missing_ok=True)
+            del manifest[frame_id]
+
+    if manifest != loaded:
+        manifest_file.parent.mkdir(parents=True, exist_ok=True)
+        manifest_file.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+    return {
+        frame_id: thumbnail_path(output_folder, frame_id)
+        for frame_id in frame_ids
+        if frame_id in manifest and thumbnail_path(output_folder, frame_id).exists()
+    }
+
+
+def pages_from_index(index: dict) -> list:
+    """
+    Group the top-level frames of a node index under their pages.
+
+    Frames directly on a page, or inside sections on it, are top-level.
+    """
+    pages = []
+    by_id = {}  # Page or section id -> the page its frames belong to
+    for node_id, node in index.items():
+        if node.type == "CANVAS":
+            page = {"id": node_id, "name": node.name, "frames": []}
+            pages.append(page)
+            by_id[node_id] = page
+        elif node.type == "SECTION" and node.parent_id in by_id:
+            by_id[node_id] = by_id[node.parent_id]
+        elif node.type == "FRAME" and node.parent_id in by_id:
+            by_id[node.parent_id]["frames"].append({"id": node_id, "name": node.name})
     return pages
 
 
-def sync_figma(output_folder: Path, force: bool = False) -> bool:
+def extract_pages_and_frames(document: dict) -> list:
+    """Extract pages and their top-level frames from document tree."""
+    return pages_from_index(build_node_index(document))
+
+
+def save_page_notes(output_folder: Path, index: dict, pages: list, now: str, file_key: str = FIGMA_FILE_KEY) -> dict:
+    """
+    Write one note per page outlining its sections, frames, groups and
+    component instances, rendered from the node index.
+
+    Returns a map of page id -> note path.
+    """
+    pages_folder = output_folder / FIGMA_PAGES_DIRNAME
+    pages_folder.mkdir(parents=True, exist_ok=True)
+
+    outlines = {page["id"]: [] for page in pages}
+    for node_id, node in index.items():
+        if node.type == "CANVAS" or node.page_id not in outlines:
+            continue
+        if node.depth > FIGMA_PAGE_NOTE_MAX_DEPTH:
+            continue
+        indent = "  " * (node.depth - 1)
+        url = get_node_url(node_id, file_key)
+        kind = FIGMA_TYPE_LABELS.get(node.type, node.type.lower())
+        outlines[node.page_id].append(f"{indent}- [{node.name}]({url}) _{kind}_")
+
+    paths = {}
+    keep = set()
+    for page in pages:
+        url = get_node_url(page["id"], file_key)
+        outline = "\n".join(outlines[page["id"]]) or "_Empty page_"
+        md_content = f"""---
+source: figma
+source_url: {url}
+source_id: "{page['id']}"
+title: "{page['name']}"
+synced_at: {now}
+tags:
+  - sharity
+  - figma
+  - design
+---
+
+# {page['name']}
+
+- **[Open in Figma]({url})**
+
+## Outline
+
+{outline}
+
+---
+_Synced: {now}_
+_Source: [Figma]({url})_
+"""
+        file_path = pages_folder / (sanitize_filename(page["name"]) + ".md")
+        write_note(file_path, md_content)
+        paths[page["id"]] = file_path
+        keep.add(file_path.name)
+
+    for file_path in pages_folder.glob("*.md"):
+        if file_path.name not in keep:
+            remove_note(file_path)
+
+    return paths
+
+
+def sanitize_filename(name: str) -> str:
+    """Sanitize a string for use as filename."""
+    name = re.sub(r'[<>:"/\\|?*]', "", name)
+    name = name.strip()
+    return name[:100]
+
+
+def node_subtree_to_markdown(node: dict, components: dict, file_key: str = FIGMA_FILE_KEY) -> str:
+    """
+    Render a node's subtree as a nested Markdown outline.
+
+    Lists child frames, groups and component instances with links, and
+    inlines the characters of text layers.
+    """
+    md_lines = []
+    stack = [(child, 0) for child in reversed(node.get("children", []))]
+
+    while stack:
+        child, depth = stack.pop()
+        child_type = child.get("type", "")
+        if child_type not in FIGMA_NODE_NOTE_TYPES:
+            # Vectors, rectangles etc. are not worth a line, but may
+            # still contain text layers or instances further down
+            stack.extend((c, depth) for c in reversed(child.get("children", [])))
+            continue
+
+        indent = "  " * depth
+        name = child.get("name", "")
+        if child_type == "TEXT":
+            text = " ".join(child.get("characters", "").split())
+            if text:
+                md_lines.append(f"{indent}- 🔤 {text}")
+            continue
+
+        url = get_node_url(child.get("id", ""), file_key)
+        if child_type == "INSTANCE":
+            component = components.get(child.get("componentId", ""), {})
+            component_name = component.get("name", "")
+            suffix = f" _({component_name})_" if component_name and component_name != name else ""
+            md_lines.append(f"{indent}- 🧩 [{name}]({url}){suffix}")
+            # Instance internals mirror the component; skip them
+            continue
+
+        md_lines.append(f"{indent}- **[{name}]({url})** _{child_type.lower()}_")
+        stack.extend((c, depth + 1) for c in reversed(child.get("children", [])))
+
+    return "\n".join(md_lines)
+
+
+def node_note_names(nodes: list[dict]) -> dict:
+    """
+    Get a note filename for each scoped node.
+
+    Nodes whose names would share a file (also when only case differs)
+    get their id appended, so none of them overwrites another.
+
+    Returns:
+        Map of node id -> filename
+    """
+    stems = {node["id"]: sanitize_filename(node.get("name", "") or node["id"]) for node in nodes}
+    counts = {}
+    for stem in stems.values():
+        counts[stem.casefold()] = counts.get(stem.casefold(), 0) + 1
+    names = {}
+    for node_id, stem in stems.items():
+        if counts[stem.casefold()] > 1:
+            stem = sanitize_filename(f"{stem} ({node_id.replace(':', '-')})")
+        names[node_id] = stem + ".md"
+    return names
+
+
+def save_node_note(
+    node: dict,
+    components: dict,
+    output_folder: Path,
+    now: str,
+    file_key: str = FIGMA_FILE_KEY,
+    filename: str | None = None,
+) -> Path:
+    """Save a scoped node's subtree as its own note, under the Nodes folder."""
+    node_id = node.get("id", "")
+    name = node.get("name", "") or node_id
+    url = get_node_url(node_id, file_key)
+    outline = node_subtree_to_markdown(node, components, file_key) or "_Empty_"
+
+    md_content = f"""---
+source: figma
+source_url: {url}
+source_id: "{node_id}"
+title: "{name}"
+synced_at: {now}
+tags:
+  - sharity
+  - figma
+  - design
+---
+
+# {name}
+
+- **[Open in Figma]({url})**
+- Type: {node.get("type", "").lower()}
+
+## Contents
+
+{outline}
+
+---
+_Synced: {now}_
+_Source: [Figma]({url})_
+"""
+
+    file_path = output_folder / FIGMA_NODES_DIRNAME / (filename or sanitize_filename(name) + ".md")
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    write_note(file_path, md_content)
+    return file_path
+
+
+def library_entry_url(entry: dict) -> str:
+    """Get the Figma URL of a library entry, which may live in another file."""
+    return get_node_url(entry.get("node_id", ""), entry.get("file_key", FIGMA_FILE_KEY))
+
+
+def group_catalog_entries(entries: list, key) -> dict:
+    """Group entries by key, sorted by group then name."""
+    groups = {}
+    for entry in sorted(entries, key=lambda e: e.get("name", "").lower()):
+        groups.setdefault(key(entry), []).append(entry)
+    return dict(sorted(groups.items(), key=lambda g: g[0].lower()))
+
+
+def save_catalog(output_folder: Path, catalog: dict, file_name: str, now: str, file_key: str = FIGMA_FILE_KEY) -> Path:
+    """
+    Write the design-system catalog note.
+
+    Components and component sets are grouped by the first segment of
+    their slash-separated name, styles by style type, with a contents list
+    at the top.
+    """
+    file_url = get_file_url(file_key)
+    sections = []
+    contents = []
+
+    def top_level(entry):
+        return entry.get("name", "").split("/")[0].strip() or "Other"
+
+    def style_type(entry):
+        return entry.get("style_type", "OTHER").capitalize()
+
+    for kind, title, key in (
+        ("components", "Components", top_level),
+        ("component_sets", "Component Sets", top_level),
+        ("styles", "Styles", style_type),
+    ):
+        entries = catalog.get(kind) or []
+        contents.append(f"- [[#{title}]] ({len(entries)})")
+        section = f"## {title}\n\n"
+        if not entries:
+            section += "_None_\n"
+        for group, group_entries in group_catalog_entries(entries, key).items():
+            section += f"### {group}\n\n"
+            for entry in group_entries:
+                line = f"- [{entry.get('name', 'Unnamed')}]({library_entry_url(entry)})"
+                if entry.get("description"):
+                    line += f" — {entry['description']}"
+                section += line + "\n"
+            section += "\n"
+        sections.append(section)
+
+    contents_md = "\n".join(contents)
+    sections_md = "\n".join(sections)
+
+    md_content = f"""---
+source: figma
+source_url: {file_url}
+source_id: "{file_key}"
+title: "{file_name} Components"
+synced_at: {now}
+tags:
+  - sharity
+  - figma
+  - design
+  - design-system
+---
+
+# {file_name} Components
+
+{contents_md}
+
+{sections_md}
+---
+_Synced: {now}_
+_Source: [Figma]({file_url})_
+"""
+
+    file_path = output_folder / "Components.md"
+    write_note(file_path, md_content)
+    return file_path
+
+
+def save_component_notes(output_folder: Path, components: list) -> int:
+    """
+    Write one note per component, touching only notes whose content changed.
+
+    Notes for components that no longer exist are removed. Returns the
+    number of notes written.
+    """
+    components_folder = output_folder / FIGMA_COMPONENTS_DIRNAME
+    components_folder.mkdir(parents=True, exist_ok=True)
+
+    written = 0
+    keep = set()
+    for entry in components:
+        name = entry.get("name", "Unnamed")
+        url = library_entry_url(entry)
+        location = " / ".join(p for p in (entry.get("page"), entry.get("frame")) if p)
+        # No synced_at here: unchanged components must render identically
+        md_content = f"""---
+source: figma
+source_url: {url}
+source_id: "{entry.get('node_id', '')}"
+title: "{name}"
+tags:
+  - sharity
+  - figma
+  - component
+---
+
+# {name}
+
+{entry.get("description") or "_No description_"}
+
+- **[Open in Figma]({url})**
+- Location: {location or "Unknown"}
+- Key: `{entry.get("key", "")}`
+"""
+        file_path = components_folder / (sanitize_filename(name.replace("/", " - ")) + ".md")
+        keep.add(file_path.name)
+        if file_path.exists() and file_path.read_text(encoding="utf-8") == md_content:
+            continue
+        write_note(file_path, md_content)
+        written += 1
+
+    for file_path in components_folder.glob("*.md"):
+        if file_path.name not in keep:
+            remove_note(file_path)
+
+    return written
+
+
+async def sync_figma_nodes_async(
+    output_folder: Path,
+    node_ids: list[str],
+    version: str,
+    file_key: str = FIGMA_FILE_KEY,
+) -> dict | None:
+    """
+    Sync only the given nodes, one note per node plus an index.
+
+    Returns the file details of the synced version, or None on failure.
+    """
+    kind = nodes_payload_kind(node_ids)
+    with span("cache"):
+        nodes_data = load_cached_payload(output_folder, version, kind, file_key)
+    if nodes_data:
+        print(f"   Using cached nodes (version {version})")
+    else:
+        print(f"   Fetching {len(node_ids)} node(s)...")
+        nodes_data = await get_file_nodes_async(node_ids, file_key)
+        if not nodes_data:
+            return None
+        version = nodes_data.get("version", version)
+        with span("cache"):
+            save_cached_payload(output_folder, version, kind, nodes_data, file_key)
+
+    file_name = nodes_data.get("name", "Sharity Design")
+    last_modified = nodes_data.get("lastModified", "")
+    now = datetime.now().isoformat(timespec="seconds")
+    file_url = get_file_url(file_key)
+    output_folder.mkdir(parents=True, exist_ok=True)
+
+    entries = {}
+    for node_id in node_ids:
+        entry = (nodes_data.get("nodes") or {}).get(node_id)
+        if not entry or not entry.get("document"):
+            print(f"   ⚠️  Node {node_id} not found")
+            continue
+        entries[node_id] = entry
+    filenames = node_note_names([{**entry["document"], "id": node_id} for node_id, entry in entries.items()])
+
+    nodes_md = ""
+    notes = []
+    for node_id, entry in entries.items():
+        node = entry["document"]
+        with span("write"):
+            note_path = save_node_note(
+                node, entry.get("components") or {}, output_folder, now, file_key, filenames[node_id]
+            )
+        note = note_path.relative_to(output_folder)
+        nodes_md += f"- [[{note.with_suffix('').as_posix()}|{node.get('name', node_id)}]]\n"
+        notes.append(note.as_posix())
+        print(f"   ✅ Saved: {note.as_posix()}")
+
+    md_content = f"""---
+source: figma
+source_url: {file_url}
+source_id: "{file_key}"
+title: "{file_name}"
+synced_at: {now}
+tags:
+  - sharity
+  - figma
+  - design
+---
+
+# {file_name}
+
+## Quick Links
+
+- **[Open in Figma]({file_url})** - View and edit the design
+- Last modified: {last_modified[:10] if last_modified else "Unknown"}
+- Version: {version}
+
+## Synced Nodes
+
+{nodes_md or "_No nodes found_"}
+
+---
+_Synced: {now}_
+_Source: [Figma]({file_url})_
+"""
+
+    file_path = output_folder / "index.md"
+    with span("write"):
+        write_note(file_path, md_content)
+    print(f"   ✅ Saved: {file_path.name}")
+
+    return {"version": version, "last_modified": last_modified, "synced_at": now, "notes": notes}
+
+
+def remove_file_outputs(output_folder: Path, keep: set) -> int:
+    """
+    Remove what a whole-file sync wrote: page notes, thumbnails, the
+    catalog, component notes and the changelog.
+
+    Args:
+        keep: Note paths, relative to the folder, to leave alone
+
+    Returns:
+        Number of notes removed
+    """
+    removed = 0
+    for name in ("Components.md", "Changelog.md"):
+        path = output_folder / name
+        if name not in keep and path.exists():
+            remove_note(path)
+            removed += 1
+    for dirname in (FIGMA_PAGES_DIRNAME, FIGMA_COMPONENTS_DIRNAME):
+        folder = output_folder / dirname
+        if folder.is_dir():
+            for path in folder.rglob("*.md"):
+                remove_note(path)
+                removed += 1
+            shutil.rmtree(folder, ignore_errors=True)
+    shutil.rmtree(output_folder / FIGMA_ASSETS_DIRNAME, ignore_errors=True)
+    (get_cache_dir(output_folder) / FIGMA_THUMBNAILS_FILENAME).unlink(missing_ok=True)
+    return removed
+
+
+def remove_node_notes(output_folder: Path, names: list, keep: set) -> int:
+    """Remove the node notes a node-scoped sync wrote (paths from its state), except those in keep."""
+    removed = 0
+    for name in names:
+        path = output_folder / name
+        if name not in keep and path.exists():
+            remove_note(path)
+            removed += 1
+    nodes_folder = output_folder / FIGMA_NODES_DIRNAME
+    if nodes_folder.is_dir() and not any(nodes_folder.iterdir()):
+        nodes_folder.rmdir()
+    return removed
+
+
+def plan_sync(
+    output_folder: Path,
+    force: bool = False,
+    file_key: str = FIGMA_FILE_KEY,
+    node_id: str = FIGMA_NODE_ID,
+    node_ids: list[str] | None = None,
+) -> dict:
+    """
+    Plan a sync from the file's version alone (see sync_plan).
+
+    The sync state and payload cache tell whether the sync would stop
+    after its version check, and which payloads it would fetch; the
+    thumbnails manifest bounds the thumbnails it would re-export. When
+    the probe fails, the last synced version stands in for the current.
+    """
+    if not get_figma_token():
+        return {"items": [], "requests": 0, "skip": True, "note": "FIGMA_ACCESS_TOKEN not set; would write a placeholder"}
+    if requests is None:
+        return {"items": [], "requests": 0, "skip": True, "note": "requests library not installed"}
+
+    note = synced_notes(output_folder, "figma").get(file_key)
+    meta = get_file_meta(file_key)
+    node_ids = get_scoped_node_ids(node_ids)
+    state = load_sync_state(output_folder)
+    if meta is None:
+        # Count what a sync of the last synced version would fetch
+        version = state.get("version", "")
+        items = [(note["title"] if note else file_key, "unknown")]
+        items += [(f"Node {i}", "unknown") for i in node_ids]
+        requests_needed, _ = planned_requests(output_folder, version, node_ids, file_key)
+        known = f"assuming version {version} is current" if version else "nothing synced yet"
+        return {
+            "items": items,
+            "requests": requests_needed,
+            "skip": False,
+            "note": f"Version probe failed; changes unknown, {known}",
+        }
+
+    version = meta.get("version", "")
+    if not note:
+        changed = "new"
+    else:
+        changed = "unchanged" if state.get("version") == version else "edited"
+    items = [(meta.get("name", file_key), changed)]
+
+    if (
+        not force
+        and version
+        and state.get("version") == version
+        and state.get("node_ids", []) == node_ids
+        and (output_folder / "index.md").exists()
+    ):
+        return {"items": items, "requests": 1, "skip": True, "note": f"Up to date (version {version}); would skip"}
+
+    items += [(f"Node {i}", changed) for i in node_ids]
+    requests_needed, note = planned_requests(output_folder, version, node_ids, file_key)
+    return {"items": items, "requests": requests_needed, "skip": False, "note": note}
+
+
+def planned_requests(output_folder: Path, version: str, node_ids: list[str], file_key: str) -> tuple[int, str]:
+    """
+    Count the requests a sync of a version would send, from what is cached.
+
+    Returns:
+        (requests, note), the note bounding the thumbnails to re-export
+    """
+    # The version check comes first in every sync
+    requests_needed = 1
+    if node_ids:
+        if not cached_payload_path(output_folder, version, nodes_payload_kind(node_ids), file_key).exists():
+            requests_needed += len(batch_node_ids(node_ids))
+        return requests_needed, ""
+
+    if not cached_payload_path(output_folder, version, "file", file_key).exists():
+        requests_needed += 1
+    if get_team_id() or not cached_payload_path(output_folder, version, "catalog", file_key).exists():
+        requests_needed += len(FIGMA_CATALOG_KINDS)
+
+    note = ""
+    if FIGMA_EXPORT_THUMBNAILS:
+        # Frames whose subtree is unchanged keep their thumbnail, so this
+        # is the most that would be re-exported
+        stale = sum(1 for entry in load_thumbnail_manifest(output_folder).values() if entry.get("version") != version)
+        if stale:
+            requests_needed += math.ceil(stale / FIGMA_IMAGES_BATCH_SIZE) + stale
+            note = f"Up to {stale} thumbnail(s) to re-export"
+    return requests_needed, note
+
+
+def sync_figma(
+    output_folder: Path,
+    force: bool = False,
+    file_key: str = FIGMA_FILE_KEY,
+    node_id: str = FIGMA_NODE_ID,
+    node_ids: list[str] | None = None,
+) -> bool:
     """
     Sync Figma file to Obsidian.
 
+    Runs sync_figma_async on its own event loop; see it for arguments.
+
+    Returns:
+        True if successful, False otherwise
+    """
+    return run_with_client(sync_figma_async(output_folder, force, file_key, node_id, node_ids))
+
+
+async def sync_figma_async(
+    output_folder: Path,
+    force: bool = False,
+    file_key: str = FIGMA_FILE_KEY,
+    node_id: str = FIGMA_NODE_ID,
+    node_ids: list[str] | None = None,
+) -> bool:
+    """
+    Sync Figma file to Obsidian.
+
+    The document, the design-system catalog and the thumbnails are fetched
+    concurrently on the running event loop.
+
     Args:
         output_folder: Path to output folder in Obsidian
         force: Force update even if cache is fresh
+        file_key: Figma file to sync
+        node_id: Primary frame to link from the index
+        node_ids: Nodes for a node-scoped sync; None or empty syncs the
+            whole file
 
     Returns:
         True if successful, False otherwise
     """
+    file_url = get_file_url(file_key)
     token = get_figma_token()
     if not token:
         print("   ⚠️  FIGMA_ACCESS_TOKEN not set")
@@ -121,69 +1438,220 @@ def sync_figma(output_folder: Path, force: bool = False) -> bool:
 
         # Create placeholder file
         output_folder.mkdir(parents=True, exist_ok=True)
-        create_figma_placeholder(output_folder)
+        create_figma_placeholder(output_folder, file_key, node_id)
         return True
 
-    if requests is None:
+    if requests is None and httpx is None:
         print("   ❌ requests library not installed")
         print("   Run: pip install requests")
-        create_figma_placeholder(output_folder)
+        create_figma_placeholder(output_folder, file_key, node_id)
         return True
 
-    print("   Fetching file info...")
+    print("   Checking file version...")
+
+    meta = await get_file_meta_async(file_key)
+    node_ids = get_scoped_node_ids(node_ids)
+    state = load_sync_state(output_folder)
+    offline = not meta
+    if offline:
+        # Without a version to check against, the last synced version can
+        # still be re-rendered on --force if its payload is cached
+        version = state.get("version", "")
+        kind = nodes_payload_kind(node_ids) if node_ids else "file"
+        if force and cached_payload_path(output_folder, version, kind, file_key).exists():
+            print(f"   ⚠️  Could not check the file version; re-rendering cached version {version} offline")
+        elif circuit_open("figma"):
+            print("   ⚠️  Figma is unavailable, keeping the last synced file")
+            return False
+        else:
+            print("   ⚠️  Could not fetch file, creating placeholder")
+            output_folder.mkdir(parents=True, exist_ok=True)
+            # A failed fetch that kept the last synced content still failed
+            return create_figma_placeholder(output_folder, file_key, node_id)
+    else:
+        version = meta.get("version", "")
+    if (
+        not force
+        and version
+        and state.get("version") == version
+        and state.get("node_ids", []) == node_ids
+        and (output_folder / "index.md").exists()
+    ):
+        print(f"   ✅ Up to date (version {version}), skipping")
+        return True
 
-    file_data = get_file()
-    if not file_data:
-        print("   ⚠️  Could not fetch file, creating placeholder")
-        output_folder.mkdir(parents=True, exist_ok=True)
-        create_figma_placeholder(output_folder)
+    if node_ids:
+        synced = await sync_figma_nodes_async(output_folder, node_ids, version, file_key)
+        if not synced:
+            print("   ⚠️  Could not fetch nodes")
+            return False
+        save_sync_state(output_folder, {**synced, "node_ids": node_ids})
+        # Drop what the last sync wrote that this one didn't: a whole-file
+        # sync's pages and catalog, or the notes of nodes no longer synced
+        keep = {"index.md", *synced["notes"]}
+        removed = remove_node_notes(output_folder, state.get("notes", []), keep)
+        if state.get("version") and not state.get("node_ids"):
+            removed += remove_file_outputs(output_folder, keep)
+        if removed:
+            print(f"   🗑️  Removed {removed} note(s) from the last sync")
+        prune_cached_payloads(output_folder, file_key=file_key)
+        print(f"   📁 Synced to: {output_folder}")
         return True
 
+    # Get the design-system catalog alongside the document. Team libraries
+    # aren't tied to this file's version, so only the file library is
+    # served from the cache.
+    with span("cache"):
+        catalog = None if get_team_id() else load_cached_payload(output_folder, version, "catalog", file_key)
+    catalog_task = None
+    if catalog is None and offline:
+        # Keep the last written catalog rather than fail the re-render
+        catalog = dict.fromkeys(FIGMA_CATALOG_KINDS)
+    elif catalog is None:
+        print("   Fetching components, component sets and styles...")
+        catalog_task = asyncio.create_task(fetch_catalog_async(file_key))
+
+    with span("cache"):
+        file_data = load_cached_payload(output_folder, version, "file", file_key)
+    if file_data:
+        print(f"   Using cached document (version {version})")
+    else:
+        print("   Fetching file info...")
+        file_data = await get_file_async(file_key)
+        if not file_data:
+            if catalog_task:
+                catalog_task.cancel()
+            if circuit_open("figma"):
+                print("   ⚠️  Figma is unavailable, keeping the last synced file")
+                return False
+            print("   ⚠️  Could not fetch file, creating placeholder")
+            output_folder.mkdir(parents=True, exist_ok=True)
+            # A failed fetch that kept the last synced content still failed
+            return create_figma_placeholder(output_folder, file_key, node_id)
+        # The full fetch may have raced a new save; key by what we got
+        version = file_data.get("version", version)
+        with span("cache"):
+            save_cached_payload(output_folder, version, "file", file_data, file_key)
+
     # Get file details
     file_name = file_data.get("name", "Sharity Design")
     last_modified = file_data.get("lastModified", "")
-    version = file_data.get("version", "")
     document = file_data.get("document", {})
 
+    # Index the document once; the changelog and notes render from it
+    with span("index"):
+        node_index = build_node_index(document, types=FIGMA_INDEX_TYPES)
+
+    # Diff against the previously synced version, if we still have it
+    previous_version = state.get("version")
+    if previous_version and previous_version != version:
+        with span("cache"):
+            previous_data = load_cached_payload(output_folder, previous_version, "file", file_key)
+        if previous_data:
+            print(f"   Diffing version {previous_version} → {version}...")
+            with span("changelog"):
+                old_index = build_node_index(previous_data.get("document", {}), types=FIGMA_INDEX_TYPES)
+                new_index = node_index
+                diff = diff_structure(
+                    filter_node_index(old_index, FIGMA_STRUCTURAL_TYPES),
+                    filter_node_index(new_index, FIGMA_STRUCTURAL_TYPES),
+                )
+                entry = changelog_entry(diff, old_index, new_index, previous_version, version, last_modified, file_key)
+                output_folder.mkdir(parents=True, exist_ok=True)
+                entries = [entry] + load_changelog(output_folder)
+                changelog_path = save_changelog(output_folder, entries, file_name, file_key)
+            print(f"   ✅ Saved: {changelog_path.name}")
+            del previous_data, old_index
+
     # Extract pages and frames
-    pages = extract_pages_and_frames(document)
+    pages = pages_from_index(node_index)
+    frame_ids = [frame["id"] for page in pages for frame in page["frames"]]
+    digests = frame_digests(document, frame_ids) if FIGMA_EXPORT_THUMBNAILS else {}
+
+    # Everything below renders from the index; drop the raw document (the
+    # bulk of the sync's memory) before downloading thumbnails
+    del file_data, document
+
+    thumbnails = {}
+    if FIGMA_EXPORT_THUMBNAILS:
+        with span("thumbnails"):
+            thumbnails = await export_thumbnails_async(output_folder, digests, frame_ids, version, file_key)
+
+    now = datetime.now().isoformat(timespec="seconds")
+    output_folder.mkdir(parents=True, exist_ok=True)
+    with span("write"):
+        page_notes = save_page_notes(output_folder, node_index, pages, now, file_key)
+    print(f"   ✅ Saved {len(page_notes)} page note(s)")
 
     # Build pages content
     pages_md = ""
     if pages:
         pages_md = "\n## Pages & Frames\n\n"
         for page in pages:
-            pages_md += f"### {page['name']}\n\n"
+            note = page_notes[page["id"]].relative_to(output_folder).with_suffix("").as_posix()
+            pages_md += f"### [[{note}|{page['name']}]]\n\n"
             if page['frames']:
                 for frame in page['frames']:
                     # Create direct link to frame
-                    frame_url = f"{FIGMA_FILE_URL}?node-id={frame['id'].replace(':', '-')}"
+                    frame_url = get_node_url(frame["id"], file_key)
                     pages_md += f"- [{frame['name']}]({frame_url})\n"
+                    if frame["id"] in thumbnails:
+                        asset = thumbnails[frame["id"]].relative_to(output_folder).as_posix()
+                        pages_md += f"  ![[{asset}|{FIGMA_THUMBNAIL_WIDTH}]]\n"
             else:
                 pages_md += "_No frames_\n"
             pages_md += "\n"
 
-    # Get components info
-    components_data = get_file_components()
+    if catalog_task:
+        catalog = await catalog_task
+        if circuit_open("figma"):
+            print("   ⚠️  Figma is unavailable, keeping the last synced catalog and index")
+            return False
+        if not catalog_complete(catalog):
+            # A partial catalog is neither cached nor written; the next
+            # sync of this version fetches it again
+            print("   ⚠️  Could not fetch the whole catalog, keeping the last synced one")
+        elif not get_team_id():
+            with span("cache"):
+                save_cached_payload(output_folder, version, "catalog", catalog, file_key)
+
+    complete = catalog_complete(catalog)
+    catalog_path = output_folder / "Components.md"
     components_md = ""
-    if components_data and components_data.get("meta", {}).get("components"):
-        components = components_data["meta"]["components"]
-        if components:
-            components_md = "\n## Components\n\n"
-            for comp_id, comp in list(components.items())[:20]:  # Limit to 20
-                comp_name = comp.get("name", "Unnamed")
-                components_md += f"- {comp_name}\n"
-            if len(components) > 20:
-                components_md += f"- _...and {len(components) - 20} more_\n"
+    if complete and any(catalog.values()):
+        components_md = "\n## Design System\n\n"
+        components_md += "- [[Components|Component catalog]]\n"
+        components_md += f"- Components: {len(catalog.get('components') or [])}\n"
+        components_md += f"- Component sets: {len(catalog.get('component_sets') or [])}\n"
+        components_md += f"- Styles: {len(catalog.get('styles') or [])}\n"
+    elif not complete and catalog_path.exists():
+        components_md = "\n## Design System\n\n"
+        components_md += "- [[Components|Component catalog]] (from the last complete sync)\n"
 
     # Create markdown content
-    now = datetime.now().isoformat(timespec="seconds")
-    output_folder.mkdir(parents=True, exist_ok=True)
+    if complete and any(catalog.values()):
+        with span("write"):
+            catalog_path = save_catalog(output_folder, catalog, file_name, now, file_key)
+        print(f"   ✅ Saved: {catalog_path.name}")
+        if FIGMA_COMPONENT_NOTES:
+            with span("write"):
+                written = save_component_notes(output_folder, catalog.get("components") or [])
+            print(f"   ✅ Updated {written} component note(s)")
+    elif complete and catalog_path.exists():
+        # The library is empty now: drop what the last sync wrote for it
+        remove_note(catalog_path)
+        if (output_folder / FIGMA_COMPONENTS_DIRNAME).exists():
+            save_component_notes(output_folder, [])
+        print(f"   🗑️  Removed {catalog_path.name}: the library is empty")
+
+    main_frame_md = ""
+    if node_id:
+        main_frame_md = f"- **[Main frame]({get_node_url(node_id, file_key)})** - Primary design frame\n"
 
     md_content = f"""---
 source: figma
-source_url: {FIGMA_FILE_URL}
-source_id: "{FIGMA_FILE_KEY}"
+source_url: {file_url}
+source_id: "{file_key}"
 title: "{file_name}"
 synced_at: {now}
 tags:
@@ -196,9 +1664,8 @@ tags:
 
 ## Quick Links
 
-- **[Open in Figma]({FIGMA_FILE_URL})** - View and edit the design
-- **[Main frame]({FIGMA_FILE_URL}?node-id={FIGMA_NODE_ID})** - Primary design frame
-- Last modified: {last_modified[:10] if last_modified else "Unknown"}
+- **[Open in Figma]({file_url})** - View and edit the design
+{main_frame_md}- Last modified: {last_modified[:10] if last_modified else "Unknown"}
 - Version: {version}
 
 {pages_md}
@@ -222,27 +1689,56 @@ The design includes:
 
 ---
 _Synced: {now}_
-_Source: [Figma]({FIGMA_FILE_URL})_
+_Source: [Figma]({file_url})_
 """
 
     file_path = output_folder / "index.md"
-    file_path.write_text(md_content, encoding="utf-8")
+    with span("write"):
+        write_note(file_path, md_content)
     print(f"   ✅ Saved: {file_path.name}")
+
+    if state.get("node_ids"):
+        # The last sync was node-scoped; its node notes aren't rewritten
+        keep = {"index.md", "Components.md", "Changelog.md"}
+        removed = remove_node_notes(output_folder, state.get("notes", []), keep)
+        if removed:
+            print(f"   🗑️  Removed {removed} node note(s) from the last sync")
+
+    save_sync_state(output_folder, {
+        "version": version,
+        "last_modified": last_modified,
+        "synced_at": now,
+    })
+    prune_cached_payloads(output_folder, file_key=file_key)
     print(f"   📁 Synced to: {output_folder}")
 
     return True
 
 
-def create_figma_placeholder(output_folder: Path):
-    """Create a placeholder file when API is not available."""
+def create_figma_placeholder(
+    output_folder: Path,
+    file_key: str = FIGMA_FILE_KEY,
+    node_id: str = FIGMA_NODE_ID,
+) -> bool:
+    """
+    Create a placeholder file when API is not available, unless a synced one exists.
+
+    Returns:
+        True if the placeholder was written, False if synced content was kept
+    """
     now = datetime.now().isoformat(timespec="seconds")
+    file_url = get_file_url(file_key)
+    main_frame_md = ""
+    if node_id:
+        main_frame_md = f"- **[Main frame]({get_node_url(node_id, file_key)})** - Primary design frame\n"
 
     md_content = f"""---
 source: figma
-source_url: {FIGMA_FILE_URL}
-source_id: "{FIGMA_FILE_KEY}"
+source_url: {file_url}
+source_id: "{file_key}"
 title: "Sharity Design"
 synced_at: {now}
+placeholder: true
 tags:
   - sharity
   - figma
@@ -253,9 +1749,8 @@ tags:
 
 ## Quick Links
 
-- **[Open in Figma]({FIGMA_FILE_URL})** - View the design
-- **[Main frame]({FIGMA_FILE_URL}?node-id={FIGMA_NODE_ID})** - Primary design frame
-
+- **[Open in Figma]({file_url})** - View the design
+{main_frame_md}
 ## About
 
 This Figma file contains:
@@ -279,12 +1774,15 @@ To enable full sync with file metadata:
 
 ---
 _Synced: {now}_
-_Source: [Figma]({FIGMA_FILE_URL})_
+_Source: [Figma]({file_url})_
 """
 
     file_path = output_folder / "index.md"
-    file_path.write_text(md_content, encoding="utf-8")
-    print(f"   ✅ Created placeholder: {file_path.name}")
+    if write_placeholder(file_path, md_content):
+        print(f"   ✅ Created placeholder: {file_path.name}")
+        return True
+    print(f"   ⚠️  Keeping the last synced {file_path.name} instead of a placeholder")
+    return False
 
 
 if __name__ == "__main__":
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Run history for the sync.
+
+Every sync_docs.py run appends a record to a small local SQLite database:
+one row per run, and one per target with its duration, requests, bytes,
+retries, errors, pages changed and files written, plus any source outages
+(circuit breakers that opened). The history view shows
+percentiles per target and flags runs that regress against the median of
+the runs before them.
+"""
+import hashlib
+import math
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+HISTORY_WINDOW = 20  # Earlier runs a run is compared against
+HISTORY_MIN_RUNS = 5  # Runs needed before flagging regressions
+HISTORY_MAX_RUNS = 2000  # Older runs are dropped
+HISTORY_METRICS = ("duration", "requests")  # Checked for regressions
+
+# Lines that change on every write without the page changing
+VOLATILE_PREFIXES = ("synced_at:", "_Synced:")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started_at TEXT NOT NULL,
+    duration REAL NOT NULL,
+    mode TEXT NOT NULL,
+    forced INTEGER NOT NULL,
+    success INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS target_runs (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    target TEXT NOT NULL,
+    source TEXT NOT NULL,
+    status TEXT NOT NULL,
+    duration REAL NOT NULL,
+    requests INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    retries INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    pages_changed INTEGER NOT NULL,
+    files_written INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS target_runs_by_target ON target_runs(target, run_id);
+CREATE TABLE IF NOT EXISTS outages (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    source TEXT NOT NULL,
+    opened_at TEXT NOT NULL,
+    failures INTEGER NOT NULL,
+    reason TEXT NOT NULL
+);
+"""
+
+TARGET_COLUMNS = (
+    "target", "source", "status", "duration", "requests", "bytes",
+    "retries", "errors", "pages_changed", "files_written",
+)
+
+
+def connect(path: Path) -> sqlite3.Connection:
+    """Open the history database, creating it if needed."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def page_digest(path: Path) -> str:
+    """Digest of a file, ignoring the sync timestamps in notes."""
+    data = path.read_bytes()
+    if path.suffix == ".md":
+        lines = data.decode("utf-8", "replace").splitlines()
+        data = "\n".join(line for line in lines if not line.startswith(VOLATILE_PREFIXES)).encode("utf-8")
+    return hashlib.sha1(data).hexdigest()
+
+
+def folder_mtimes(folder: Path) -> dict:
+    """Map each note and asset in a target's folder to its mtime; caches are skipped."""
+    if not folder.exists():
+        return {}
+    return {
+        path: path.stat().st_mtime_ns
+        for path in folder.rglob("*")
+        if path.is_file() and not any(part.startswith(".") for part in path.relative_to(folder).parts)
+    }
+
+
+def snapshot_folder(folder: Path) -> dict:
+    """
+    Record the state of a target's notes before syncing it.
+
+    Returns:
+        Map of path -> (mtime_ns, digest); only notes get a digest
+    """
+    return {
+        path: (mtime, page_digest(path) if path.suffix == ".md" else None)
+        for path, mtime in folder_mtimes(folder).items()
+    }
+
+
+def diff_folder(folder: Path, before: dict) -> tuple[int, int]:
+    """
+    Compare a target's notes with a snapshot taken before syncing it.
+
+    Returns:
+        (pages_changed, files_written): notes whose content changed, was
+        added or removed, and files rewritten at all
+    """
+    after = folder_mtimes(folder)
+    written = [path for path, mtime in after.items() if path not in before or before[path][0] != mtime]
+
+    changed = sum(1 for path in before if path.suffix == ".md" and path not in after)
+    for path in written:
+        if path.suffix == ".md" and (path not in before or before[path][1] != page_digest(path)):
+            changed += 1
+    return changed, len(written)
+
+
+def record_run(
+    path: Path,
+    started_at: datetime,
+    duration: float,
+    mode: str,
+    forced: bool,
+    results: list,
+    outages: list = (),
+) -> int:
+    """
+    Append a run and its per-target results to the history.
+
+    Args:
+        path: History database
+        started_at: When the run started
+        duration: Wall time of the whole run, in seconds
+        mode: "run" or "watch"
+        forced: Whether cache freshness was ignored
+        results: Per-target results from sync_docs.sync_target
+        outages: Circuit breakers that opened, from sync_http.take_outages
+
+    Returns:
+        The id of the recorded run
+    """
+    conn = connect(path)
+    try:
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO runs (started_at, duration, mode, forced, success) VALUES (?, ?, ?, ?, ?)",
+                (
+                    started_at.isoformat(timespec="seconds"),
+                    duration,
+                    mode,
+                    int(forced),
+                    int(all(result["status"] != "failed" for result in results)),
+                ),
+            )
+            run_id = cursor.lastrowid
+            conn.executemany(
+                f"INSERT INTO target_runs (run_id, {', '.join(TARGET_COLUMNS)}) "
+                f"VALUES (?, {', '.join('?' for _ in TARGET_COLUMNS)})",
+                [(run_id, *(result[column] for column in TARGET_COLUMNS)) for result in results],
+            )
+            conn.executemany(
+                "INSERT INTO outages (run_id, source, opened_at, failures, reason) VALUES (?, ?, ?, ?, ?)",
+                [(run_id, o["source"], o["opened_at"], o["failures"], o["reason"]) for o in outages],
+            )
+            conn.execute("DELETE FROM runs WHERE id <= ?", (run_id - HISTORY_MAX_RUNS,))
+        return run_id
+    finally:
+        conn.close()
+
+
+def load_target_runs(path: Path, limit: int | None = None) -> list:
+    """
+    Load per-target results with their run's start time, oldest first.
+
+    Args:
+        limit: Only the most recent runs, if given
+    """
+    if not path.exists():
+        return []
+    conn = connect(path)
+    try:
+        query = (
+            "SELECT runs.id AS run_id, runs.started_at, runs.mode, runs.forced, target_runs.* "
+            "FROM target_runs JOIN runs ON runs.id = target_runs.run_id"
+        )
+        params = ()
+        if limit:
+            query += " WHERE runs.id > (SELECT MAX(id) FROM runs) - ?"
+            params = (limit,)
+        rows = conn.execute(query + " ORDER BY runs.id", params).fetchall()
+        return [dict(row) for row in rows]
+    finally:
+        conn.close()
+
+
+def percentile(values: list, p: float) -> float:
+    """Nearest-rank percentile of a list of numbers."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def find_regressions(rows: list, threshold: float) -> dict:
+    """
+    Flag target runs that regress against the runs before them.
+
+    A synced target run regresses on a metric when it exceeds the median of
+    its previous HISTORY_WINDOW synced runs by more than `threshold` (0.5 =
+    50%), once there are at least HISTORY_MIN_RUNS of them. Cached and
+    failed runs are neither flagged nor compared against.
+
+    Returns:
+        Map of (run_id, target) -> list of (metric, value, median)
+    """
+    regressions = {}
+    previous = {}
+    for row in rows:
+        if row["status"] != "synced":
+            continue
+        earlier = previous.setdefault(row["target"], [])
+        window = earlier[-HISTORY_WINDOW:]
+        if len(window) >= HISTORY_MIN_RUNS:
+            for metric in HISTORY_METRICS:
+                median = percentile([r[metric] for r in window], 50)
+                if median and row[metric] > median * (1 + threshold):
+                    regressions.setdefault((row["run_id"], row["target"]), []).append((metric, row[metric], median))
+        earlier.append(row)
+    return regressions
+
+
+def format_regression(metric: str, value: float, median: float) -> str:
+    """Describe a regressed metric against its median."""
+    change = (value - median) / median * 100
+    if metric == "duration":
+        return f"{metric} {value:.1f}s vs median {median:.1f}s (+{change:.0f}%)"
+    return f"{metric} {value:g} vs median {median:g} (+{change:.0f}%)"
+
+
+def latest_regressions(path: Path, run_id: int, threshold: float) -> list:
+    """
+    Regressions in one run, usually the one just recorded.
+
+    Returns:
+        List of (target, description) pairs
+    """
+    rows = load_target_runs(path, limit=HISTORY_MAX_RUNS)
+    found = find_regressions(rows, threshold)
+    return [
+        (target, format_regression(*regression))
+        for (found_run, target), regressions in found.items()
+        if found_run == run_id
+        for regression in regressions
+    ]
+
+
+def last_target_runs(path: Path) -> dict:
+    """Get each target's most recent result, by target name."""
+    return {row["target"]: row for row in load_target_runs(path, limit=HISTORY_WINDOW * 5)}
+
+
+def target_estimates(path: Path) -> dict:
+    """
+    Typical cost of syncing each target: medians over its last
+    HISTORY_WINDOW synced runs.
+
+    Returns:
+        Map of target -> dict with runs, duration, requests and bytes
+    """
+    synced = {}
+    for row in load_target_runs(path, limit=HISTORY_MAX_RUNS):
+        if row["status"] == "synced":
+            synced.setdefault(row["target"], []).append(row)
+    return {
+        target: {
+            "runs": len(rows[-HISTORY_WINDOW:]),
+            **{metric: percentile([r[metric] for r in rows[-HISTORY_WINDOW:]], 50) for metric in ("duration", "requests", "bytes")},
+        }
+        for target, rows in synced.items()
+    }
+
+
+def last_outages(path: Path) -> dict:
+    """
+    Get the outages recorded in each source's most recent run.
+
+    Returns:
+        Map of source -> dict with opened_at, failures and reason
+    """
+    if not path.exists():
+        return {}
+    conn = connect(path)
+    try:
+        rows = conn.execute(
+            "SELECT * FROM outages WHERE run_id = "
+            "(SELECT MAX(run_id) FROM target_runs WHERE target_runs.source = outages.source)"
+        ).fetchall()
+        return {row["source"]: dict(row) for row in rows}
+    finally:
+        conn.close()
+
+
+def show_history(path: Path, threshold: float, runs: int = HISTORY_WINDOW):
+    """Print percentiles per target and the latest runs, flagging regressions."""
+    print("\n📈 Sync run history\n")
+    rows = load_target_runs(path)
+    if not rows:
+        print(f"No runs recorded yet in {path}")
+        return
+
+    regressions = find_regressions(rows, threshold)
+
+    print(f"{'target':<12}{'runs':>6}{'p50':>9}{'p90':>9}{'p95':>9}{'max':>9}{'req p50':>9}{'req p95':>9}")
+    print("-" * 72)
+    by_target = {}
+    for row in rows:
+        if row["status"] == "synced":
+            by_target.setdefault(row["target"], []).append(row)
+    for target, target_rows in sorted(by_target.items()):
+        durations = [r["duration"] for r in target_rows]
+        requests = [r["requests"] for r in target_rows]
+        print(
+            f"{target:<12}{len(target_rows):>6}"
+            f"{percentile(durations, 50):>8.1f}s{percentile(durations, 90):>8.1f}s"
+            f"{percentile(durations, 95):>8.1f}s{max(durations):>8.1f}s"
+            f"{percentile(requests, 50):>9g}{percentile(requests, 95):>9g}"
+        )
+
+    recent_ids = sorted({row["run_id"] for row in rows})[-runs:] if runs > 0 else []
+    print(f"\nLast {len(recent_ids)} run(s) (regression threshold +{threshold * 100:.0f}% over the median):\n")
+    for row in rows:
+        if row["run_id"] not in recent_ids:
+            continue
+        flags = regressions.get((row["run_id"], row["target"]), [])
+        icon = {"synced": "⚠️ " if flags else "✅", "cached": "💤", "failed": "❌"}[row["status"]]
+        print(
+            f"{icon} {row['started_at']}  {row['target']:<12}{row['status']:<8}"
+            f"{row['duration']:>7.1f}s{row['requests']:>6} req{row['bytes'] / 1e6:>7.2f} MB"
+            f"{row['pages_changed']:>5} changed{row['files_written']:>5} written"
+            f"{row['errors']:>4} err"
+        )
+        for flag in flags:
+            print(f"      regression: {format_regression(*flag)}")
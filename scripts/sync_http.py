@@ -0,0 +1,613 @@
+#!/usr/bin/env python3
+"""
+Shared HTTP plumbing for the sync modules.
+
+Holds per-source rate limiters so that concurrent syncs of several
+targets from the same source share one request budget, and per-source
+sessions so connections stay warm between requests. The async engine
+shares the same rate limiters, plus one async client and per-source
+concurrency limits per event loop.
+
+Each source also has a circuit breaker: after CIRCUIT_FAILURES failed
+requests in a row, further requests fail fast with CircuitOpenError until
+CIRCUIT_COOLDOWN has passed, so an outage or an expired token costs a few
+requests rather than a timeout per page.
+
+Request timeouts adapt to the latencies seen per endpoint, and on the
+async engine idempotent requests slower than usual are hedged: a duplicate
+is sent and whichever answers first wins.
+
+When recording or replaying API fixtures (see sync_replay), sessions and
+async clients are built on the record/replay transports instead.
+"""
+import asyncio
+import math
+import threading
+import time
+import weakref
+from collections import deque
+from datetime import datetime
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except ImportError:
+    requests = None
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+import sync_replay
+import sync_trace
+
+SESSION_POOL_SIZE = 16  # Keep-alive connections per host and source
+REQUEST_TIMEOUT = 30  # Seconds; the ceiling for adaptive timeouts
+RATE_LIMIT_RETRIES = 3  # Retries of a 429 response before giving up
+
+# Adaptive timeouts: once an endpoint has LATENCY_MIN_SAMPLES latencies,
+# requests to it time out after TIMEOUT_MULTIPLIER × its p99, within
+# [MIN_TIMEOUT, REQUEST_TIMEOUT]. A timed-out request counts as a sample
+# of its timeout, so the timeout widens while an endpoint slows down. A GET
+# that times out early is re-sent once with the full REQUEST_TIMEOUT, if
+# the source's hedge budget (below) allows a duplicate.
+LATENCY_WINDOW = 200  # Recent latencies kept per endpoint
+LATENCY_MIN_SAMPLES = 20
+TIMEOUT_MULTIPLIER = 4
+MIN_TIMEOUT = 5.0  # Seconds
+
+# Circuit breakers: transport errors, 5xx and auth failures count against
+# a source; any other response, 429s included, resets it. After the cooldown one trial
+# request is let through, and the circuit closes again if it succeeds.
+CIRCUIT_FAILURES = 5
+CIRCUIT_COOLDOWN = 300  # Seconds
+CIRCUIT_FAILURE_STATUSES = (401, 403)
+
+# Hedging: an idempotent request still unanswered after its endpoint's
+# HEDGE_PERCENTILE latency gets a duplicate, if the source's rate limiter
+# has a token to spare right now and hedges stay within HEDGE_BUDGET of
+# its requests.
+HEDGE_METHODS = ("GET",)
+HEDGE_PERCENTILE = 95
+HEDGE_BUDGET = 0.05
+HEDGE_BURST = 5  # Hedges that may be saved up
+
+# In-flight requests allowed per source on the async engine. The rate
+# limiters still pace them; this bounds open sockets and memory.
+ASYNC_CONCURRENCY = {
+    "notion": 8,
+    "miro": 16,
+    "figma": 8,
+}
+
+# Sustained requests per second allowed per source. Notion documents an
+# average of 3 requests/second per integration; Miro and Figma budgets are
+# more generous but shared with the app's other tooling.
+DEFAULT_RATE_LIMITS = {
+    "notion": 3.0,
+    "miro": 10.0,
+    "figma": 5.0,
+}
+
+
+class RateLimiter:
+    """Thread-safe token bucket allowing `rate` requests per second."""
+
+    def __init__(self, rate: float, burst: int | None = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Take a token, returning how long to wait before using it.
+
+        Tokens may be borrowed ahead, so callers on threads and on the
+        event loop can share one bucket without holding the lock to wait.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+    def try_reserve(self) -> bool:
+        """Take a token only if one is available right now."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """Wait, without blocking the event loop, until a request may be sent."""
+        wait = self.reserve()
+        if wait:
+            await asyncio.sleep(wait)
+
+
+_rate_limiters: dict[str, RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def configure_rate_limit(source: str, rate: float):
+    """Set the requests per second allowed for a source."""
+    with _rate_limiters_lock:
+        _rate_limiters[source] = RateLimiter(rate)
+
+
+def get_rate_limiter(source: str) -> RateLimiter:
+    """Get the shared rate limiter for a source."""
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(source)
+        if limiter is None:
+            limiter = RateLimiter(DEFAULT_RATE_LIMITS.get(source, 5.0))
+            _rate_limiters[source] = limiter
+        return limiter
+
+
+class EndpointLatency:
+    """Recent latencies of one endpoint, in seconds."""
+
+    def __init__(self):
+        self.samples = deque(maxlen=LATENCY_WINDOW)
+        self.lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def percentile(self, p: float) -> float | None:
+        """Nearest-rank percentile, or None until there are enough samples."""
+        with self.lock:
+            if len(self.samples) < LATENCY_MIN_SAMPLES:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[max(1, math.ceil(p / 100 * len(ordered))) - 1]
+
+    def timeout(self) -> float:
+        """Timeout for the next request to this endpoint."""
+        p99 = self.percentile(99)
+        if p99 is None:
+            return REQUEST_TIMEOUT
+        return min(REQUEST_TIMEOUT, max(MIN_TIMEOUT, p99 * TIMEOUT_MULTIPLIER))
+
+
+class HedgeBudget:
+    """Per-source allowance of hedges, earned as a share of requests sent."""
+
+    def __init__(self):
+        self.credit = 0.0
+        self.lock = threading.Lock()
+
+    def earn(self):
+        with self.lock:
+            self.credit = min(HEDGE_BURST, self.credit + HEDGE_BUDGET)
+
+    def spend(self) -> bool:
+        with self.lock:
+            if self.credit < 1:
+                return False
+            self.credit -= 1
+            return True
+
+    def refund(self):
+        """Give back a hedge that was spent but not sent."""
+        with self.lock:
+            self.credit = min(HEDGE_BURST, self.credit + 1)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request to a source whose circuit is open."""
+
+
+class CircuitBreaker:
+    """Thread-safe count of a source's consecutive failed requests."""
+
+    def __init__(self, source: str):
+        self.source = source
+        self.failures = 0
+        self.opened = None  # monotonic time the circuit opened
+        self.outage = None  # reported by take_outages
+        self.trial = False
+        self.lock = threading.Lock()
+
+    def check(self) -> bool:
+        """
+        Raise CircuitOpenError if requests to the source should not be sent.
+
+        Once the cooldown has passed, a single trial request is allowed.
+
+        Returns:
+            True if the request is the trial; the caller must then call
+            end_trial once it's done, whatever its outcome
+        """
+        with self.lock:
+            if self.opened is None:
+                return False
+            if self.trial or time.monotonic() - self.opened < CIRCUIT_COOLDOWN:
+                raise CircuitOpenError(f"{self.source} circuit open after {self.failures} failures")
+            self.trial = True
+            return True
+
+    def end_trial(self):
+        """Allow another trial if this one ended without a recorded outcome (e.g. it was cancelled)."""
+        with self.lock:
+            self.trial = False
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened = None
+            self.trial = False
+
+    def failure(self, reason: str):
+        with self.lock:
+            self.failures += 1
+            if self.trial or (self.opened is None and self.failures >= CIRCUIT_FAILURES):
+                self.trial = False
+                self.opened = time.monotonic()
+                self.outage = {
+                    "source": self.source,
+                    "opened_at": datetime.now().isoformat(timespec="seconds"),
+                    "failures": self.failures,
+                    "reason": reason,
+                }
+                print(
+                    f"   ⚠️  {self.source.title()} failed {self.failures} times in a row ({reason}); "
+                    f"skipping its requests for {CIRCUIT_COOLDOWN}s"
+                )
+
+    def is_open(self) -> bool:
+        with self.lock:
+            return self.opened is not None
+
+    def record(self, status: int | None, error: str | None = None):
+        """Count a request's outcome: its final status, or the error that stopped it."""
+        if error is not None:
+            self.failure(error)
+        elif status >= 500 or status in CIRCUIT_FAILURE_STATUSES:
+            self.failure(f"HTTP {status}")
+        else:
+            self.success()
+
+
+_circuit_breakers: dict[str, CircuitBreaker] = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(source: str) -> CircuitBreaker:
+    """Get the shared circuit breaker for a source."""
+    with _circuit_breakers_lock:
+        breaker = _circuit_breakers.get(source)
+        if breaker is None:
+            breaker = CircuitBreaker(source)
+            _circuit_breakers[source] = breaker
+        return breaker
+
+
+def circuit_open(source: str) -> bool:
+    """Whether a source's requests are currently failing fast."""
+    return get_circuit_breaker(source).is_open()
+
+
+def take_outages() -> list:
+    """
+    Get and clear the outages seen since the last call.
+
+    Returns:
+        List of dicts with source, opened_at, failures and reason
+    """
+    outages = []
+    with _circuit_breakers_lock:
+        breakers = list(_circuit_breakers.values())
+    for breaker in breakers:
+        with breaker.lock:
+            if breaker.outage:
+                outages.append(breaker.outage)
+                breaker.outage = None
+    return outages
+
+
+_latencies: dict[tuple, EndpointLatency] = {}
+_hedge_budgets: dict[str, HedgeBudget] = {}
+_latencies_lock = threading.Lock()
+
+
+def get_latency(source: str, url: str) -> EndpointLatency:
+    """Get the latency tracker for the endpoint a URL belongs to."""
+    key = (source, sync_trace.endpoint_template(url))
+    with _latencies_lock:
+        latency = _latencies.get(key)
+        if latency is None:
+            latency = EndpointLatency()
+            _latencies[key] = latency
+        return latency
+
+
+def get_hedge_budget(source: str) -> HedgeBudget:
+    """Get the hedge allowance for a source."""
+    with _latencies_lock:
+        budget = _hedge_budgets.get(source)
+        if budget is None:
+            budget = HedgeBudget()
+            _hedge_budgets[source] = budget
+        return budget
+
+
+_sessions: dict = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(source: str):
+    """Get the shared keep-alive session for a source."""
+    with _sessions_lock:
+        session = _sessions.get(source)
+        if session is None:
+            session = requests.Session()
+            pool = {"pool_connections": 4, "pool_maxsize": SESSION_POOL_SIZE}
+            adapter = sync_replay.get_adapter(**pool) or HTTPAdapter(**pool)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[source] = session
+        return session
+
+
+# Per event loop: the shared async client and per-source semaphores
+_loop_state = weakref.WeakKeyDictionary()
+
+
+def _get_loop_state() -> dict:
+    loop = asyncio.get_running_loop()
+    state = _loop_state.get(loop)
+    if state is None:
+        state = {"client": None, "semaphores": {}}
+        _loop_state[loop] = state
+    return state
+
+
+def get_async_client():
+    """Get the shared async HTTP client for the running event loop."""
+    state = _get_loop_state()
+    if state["client"] is None:
+        state["client"] = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=SESSION_POOL_SIZE),
+            timeout=REQUEST_TIMEOUT,
+            transport=sync_replay.get_async_transport(),
+        )
+    return state["client"]
+
+
+async def close_async_client():
+    """Close the running event loop's async client, if one was opened."""
+    state = _get_loop_state()
+    if state["client"] is not None:
+        await state["client"].aclose()
+        state["client"] = None
+
+
+def get_semaphore(name: str, limit: int | None = None) -> asyncio.Semaphore:
+    """Get the semaphore bounding concurrent requests for a source or pool."""
+    semaphores = _get_loop_state()["semaphores"]
+    semaphore = semaphores.get(name)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(limit or ASYNC_CONCURRENCY.get(name, 8))
+        semaphores[name] = semaphore
+    return semaphore
+
+
+def retry_delay(response, attempt: int) -> float:
+    """Seconds to wait before retrying a 429, per Retry-After if given."""
+    try:
+        return max(0.0, float(response.headers.get("Retry-After", "")))
+    except ValueError:
+        return float(2 ** attempt)
+
+
+def resend_after_timeout(source: str, method: str, timeout: float, resent: bool) -> bool:
+    """
+    Whether a request that timed out should be sent again with the full
+    REQUEST_TIMEOUT: only idempotent requests cut short by an adaptive
+    timeout, once each, and only out of the source's hedge budget.
+    """
+    if method not in HEDGE_METHODS or timeout >= REQUEST_TIMEOUT or resent:
+        return False
+    return get_hedge_budget(source).spend()
+
+
+def send(source: str, method: str, url: str, **kwargs):
+    """
+    Send a request on a source's session, paced by its rate limiter.
+
+    429 responses are retried up to RATE_LIMIT_RETRIES times, waiting as
+    long as the server asks to. Unless the caller sets one, the timeout
+    adapts to the endpoint's latencies.
+
+    Returns:
+        The final response, whatever its status
+
+    Raises:
+        CircuitOpenError: If the source's circuit is open
+        requests.RequestException: If the request could not be sent
+    """
+    breaker = get_circuit_breaker(source)
+    trial = breaker.check()
+    try:
+        latency = get_latency(source, url)
+        timeout = kwargs.pop("timeout", None) or latency.timeout()
+        get_hedge_budget(source).earn()
+        started = time.perf_counter() if sync_trace.active() else None
+        waited = 0.0
+        attempt = 0  # 429s retried so far
+        resent = False  # Whether a timed-out request was already re-sent
+        while True:
+            queued = time.perf_counter()
+            get_rate_limiter(source).acquire()
+            sent = time.perf_counter()
+            waited += sent - queued
+            try:
+                response = get_session(source).request(method, url, timeout=timeout, **kwargs)
+            except requests.Timeout as e:
+                latency.add(timeout)
+                if resend_after_timeout(source, method, timeout, resent):
+                    resent = True
+                    timeout = REQUEST_TIMEOUT
+                    continue
+                breaker.record(None, type(e).__name__)
+                if started is not None:
+                    sync_trace.record_request(source, method, url, started, waited, None, 0, attempt, str(e))
+                raise
+            except requests.RequestException as e:
+                breaker.record(None, type(e).__name__)
+                if started is not None:
+                    sync_trace.record_request(source, method, url, started, waited, None, 0, attempt, str(e))
+                raise
+            latency.add(time.perf_counter() - sent)
+            if response.status_code != 429 or attempt == RATE_LIMIT_RETRIES:
+                breaker.record(response.status_code)
+                if started is not None:
+                    sync_trace.record_request(
+                        source, method, url, started, waited, response.status_code, len(response.content), attempt,
+                    )
+                return response
+            delay = retry_delay(response, attempt)
+            waited += delay
+            attempt += 1
+            time.sleep(delay)
+    finally:
+        if trial:
+            breaker.end_trial()
+
+
+async def hedged_request(source: str, method: str, url: str, delay: float | None, **kwargs):
+    """
+    Send a request and, if no answer came within `delay` seconds, a duplicate.
+
+    The duplicate needs a spare concurrency slot and rate limiter token
+    right away, and a share of the source's hedge budget; otherwise the
+    first request is simply awaited. The first successful response wins
+    and the other request is cancelled.
+
+    Raises:
+        httpx.HTTPError: If every request sent failed
+    """
+    client = get_async_client()
+    first = asyncio.ensure_future(client.request(method, url, **kwargs))
+    pending = {first}
+    try:
+        if delay is not None:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+        semaphore = get_semaphore(source)
+        budget = get_hedge_budget(source)
+        hedge = delay is not None and pending and not semaphore.locked() and budget.spend()
+        if hedge and not get_rate_limiter(source).try_reserve():
+            # Only hedges actually sent count against the budget
+            budget.refund()
+            hedge = False
+        if not hedge:
+            pending = set()
+            return await first
+
+        await semaphore.acquire()
+        second = asyncio.ensure_future(client.request(method, url, **kwargs))
+        second.add_done_callback(lambda _: semaphore.release())
+        pending.add(second)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def send_async(source: str, method: str, url: str, **kwargs):
+    """
+    Send a request on the shared async client, paced and bounded per source.
+
+    Behaves like send, and also hedges idempotent requests that run past
+    their endpoint's usual latency (see hedged_request). The source's
+    concurrency slot is given up while waiting out a 429.
+
+    Raises:
+        CircuitOpenError: If the source's circuit is open
+        httpx.HTTPError: If the request could not be sent
+    """
+    breaker = get_circuit_breaker(source)
+    trial = breaker.check()
+    try:
+        latency = get_latency(source, url)
+        timeout = kwargs.pop("timeout", None) or latency.timeout()
+        get_hedge_budget(source).earn()
+        started = time.perf_counter() if sync_trace.active() else None
+        waited = 0.0
+        attempt = 0  # 429s retried so far
+        resent = False  # Whether a timed-out request was already re-sent
+        while True:
+            queued = time.perf_counter()
+            async with get_semaphore(source):
+                await get_rate_limiter(source).acquire_async()
+                sent = time.perf_counter()
+                waited += sent - queued
+                hedge_delay = latency.percentile(HEDGE_PERCENTILE) if method in HEDGE_METHODS else None
+                try:
+                    response = await hedged_request(source, method, url, hedge_delay, timeout=timeout, **kwargs)
+                except httpx.TimeoutException as e:
+                    latency.add(timeout)
+                    if resend_after_timeout(source, method, timeout, resent):
+                        resent = True
+                        timeout = REQUEST_TIMEOUT
+                        continue
+                    breaker.record(None, type(e).__name__)
+                    if started is not None:
+                        sync_trace.record_request(source, method, url, started, waited, None, 0, attempt, str(e))
+                    raise
+                except httpx.HTTPError as e:
+                    breaker.record(None, type(e).__name__)
+                    if started is not None:
+                        sync_trace.record_request(source, method, url, started, waited, None, 0, attempt, str(e))
+                    raise
+            latency.add(time.perf_counter() - sent)
+            if response.status_code != 429 or attempt == RATE_LIMIT_RETRIES:
+                breaker.record(response.status_code)
+                if started is not None:
+                    sync_trace.record_request(
+                        source, method, url, started, waited, response.status_code, len(response.content), attempt,
+                    )
+                return response
+            delay = retry_delay(response, attempt)
+            waited += delay
+            attempt += 1
+            await asyncio.sleep(delay)
+    finally:
+        if trial:
+            breaker.end_trial()
+
+
+def run_with_client(coro):
+    """Run a coroutine on a new event loop, closing its async client after."""
+
+    async def runner():
+        try:
+            return await coro
+        finally:
+            await close_async_client()
+
+    return asyncio.run(runner())
@@ -4,7 +4,10 @@ Miro to Obsidian sync module.
 
 Fetches board information from Miro API and saves as Markdown.
 Since Miro content is visual, we save metadata and links.
+Network I/O runs on asyncio; sync_miro wraps sync_miro_async.
 """
+import asyncio
+import math
 import os
 from datetime import datetime
 from pathlib import Path
@@ -14,10 +17,16 @@ try:
 except ImportError:
     requests = None
 
+from sync_http import CircuitOpenError, circuit_open, httpx, run_with_client, send, send_async
+from sync_plan import item_state, parse_timestamp, synced_notes
+from sync_search import write_note, write_placeholder
+from sync_trace import span
+
 # Miro configuration
 MIRO_BOARD_ID = "uXjVGPKWI70="  # Sharity board
 MIRO_API_BASE = "https://api.miro.com/v2"
 MIRO_BOARD_URL = f"https://miro.com/app/board/{MIRO_BOARD_ID}/"
+MIRO_PAGE_LIMIT = 50  # Largest page size the items endpoints accept
 
 
 def get_miro_token() -> str | None:
@@ -45,7 +54,7 @@ def miro_request(endpoint: str) -> dict | None:
     url = f"{MIRO_API_BASE}/{endpoint}"
 
     try:
-        response = requests.get(url, headers=headers, timeout=30)
+        response = send("miro", "GET", url, headers=headers)
 
         if response.status_code == 200:
             return response.json()
@@ -53,43 +62,211 @@ def miro_request(endpoint: str) -> dict | None:
             print(f"   ❌ Miro API error: {response.status_code}")
             print(f"      {response.text[:200]}")
             return None
+    except CircuitOpenError:
+        # Reported once, when the circuit opened
+        return None
     except requests.RequestException as e:
         print(f"   ❌ Request error: {e}")
         return None
 
 
-def get_board() -> dict | None:
+async def miro_request_async(endpoint: str) -> dict | None:
+    """Make a request to Miro API on the shared async client."""
+    if httpx is None:
+        # No async client available; run the blocking helper off-loop
+        return await asyncio.to_thread(miro_request, endpoint)
+
+    token = get_miro_token()
+    if not token:
+        print("   ❌ MIRO_ACCESS_TOKEN not set in environment")
+        print("   Create .env file with MIRO_ACCESS_TOKEN=xxx...")
+        return None
+
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Accept": "application/json",
+    }
+
+    url = f"{MIRO_API_BASE}/{endpoint}"
+
+    try:
+        response = await send_async("miro", "GET", url, headers=headers)
+    except CircuitOpenError:
+        # Reported once, when the circuit opened
+        return None
+    except httpx.HTTPError as e:
+        print(f"   ❌ Request error: {e}")
+        return None
+
+    if response.status_code == 200:
+        return response.json()
+    print(f"   ❌ Miro API error: {response.status_code}")
+    print(f"      {response.text[:200]}")
+    return None
+
+
+def get_board_url(board_id: str = MIRO_BOARD_ID) -> str:
+    """Get the Miro URL of a board."""
+    return f"https://miro.com/app/board/{board_id}/"
+
+
+def get_board(board_id: str = MIRO_BOARD_ID) -> dict | None:
+    """Fetch board information."""
+    return miro_request(f"boards/{board_id}")
+
+
+def get_change_marker(board_id: str = MIRO_BOARD_ID) -> str | None:
+    """Get the board's modifiedAt, a cheap check for changes."""
+    board = get_board(board_id)
+    if board is None:
+        return None
+    return board.get("modifiedAt", "")
+
+
+def get_board_items(board_id: str = MIRO_BOARD_ID) -> list:
+    """Fetch all items from the board (blocking; see get_board_items_async)."""
+    return run_with_client(get_board_items_async(board_id))
+
+
+def get_board_frames(board_id: str = MIRO_BOARD_ID) -> list:
+    """Fetch all frames from the board (blocking; see get_board_frames_async)."""
+    return run_with_client(get_board_frames_async(board_id))
+
+
+async def get_board_async(board_id: str = MIRO_BOARD_ID) -> dict | None:
     """Fetch board information."""
-    return miro_request(f"boards/{MIRO_BOARD_ID}")
+    return await miro_request_async(f"boards/{board_id}")
+
+
+async def iter_board_collection_async(board_id: str, collection: str):
+    """Yield pages of a board collection (items, frames), following cursors."""
+    cursor = None
+    while True:
+        endpoint = f"boards/{board_id}/{collection}?limit={MIRO_PAGE_LIMIT}"
+        if cursor:
+            endpoint += f"&cursor={cursor}"
+
+        result = await miro_request_async(endpoint)
+        if not result:
+            return
+
+        data = result.get("data", [])
+        yield data
+
+        cursor = result.get("cursor")
+        if not data or not cursor:
+            return
+
+
+async def get_board_items_async(board_id: str = MIRO_BOARD_ID) -> list:
+    """Fetch all items from the board."""
+    items = []
+    async for page in iter_board_collection_async(board_id, "items"):
+        items.extend(page)
+    return items
+
+
+async def get_board_frames_async(board_id: str = MIRO_BOARD_ID) -> list:
+    """Fetch all frames from the board."""
+    frames = []
+    async for page in iter_board_collection_async(board_id, "frames"):
+        frames.extend(page)
+    return frames
+
+
+def collection_total(board_id: str, collection: str) -> int | None:
+    """Count a board collection from the total of a one-item page."""
+    result = miro_request(f"boards/{board_id}/{collection}?limit=1")
+    if not result or not isinstance(result.get("total"), int):
+        return None
+    return result["total"]
+
+
+def noted_counts(note: dict | None) -> tuple[int, int] | None:
+    """Frame and item counts the last sync recorded in a board's note."""
+    meta = note["meta"] if note else {}
+    try:
+        return int(meta["frame_count"]), int(meta["item_count"])
+    except (KeyError, ValueError):
+        return None
 
 
-def get_board_items() -> list:
-    """Fetch items from the board."""
-    result = miro_request(f"boards/{MIRO_BOARD_ID}/items?limit=50")
-    if result:
-        return result.get("data", [])
-    return []
+def collection_counts(board_id: str) -> tuple[int, int] | None:
+    """Frame and item counts of a board, or None if either is unknown."""
+    frames = collection_total(board_id, "frames")
+    items = collection_total(board_id, "items") if frames is not None else None
+    if items is None:
+        return None
+    return frames, items
+
 
+def collection_requests(frames: int, items: int) -> int:
+    """Requests to fetch the board and page through its frames and items."""
+    return 1 + max(1, math.ceil(frames / MIRO_PAGE_LIMIT)) + max(1, math.ceil(items / MIRO_PAGE_LIMIT))
 
-def get_board_frames() -> list:
-    """Fetch frames from the board."""
-    result = miro_request(f"boards/{MIRO_BOARD_ID}/frames?limit=50")
-    if result:
-        return result.get("data", [])
-    return []
 
+def plan_sync(output_folder: Path, board_id: str = MIRO_BOARD_ID) -> dict:
+    """
+    Plan a sync from the board's modifiedAt alone (see sync_plan).
 
-def sync_miro(output_folder: Path, force: bool = False) -> bool:
+    A sync always refetches the board, its frames and its items, forced
+    or not; the pages those take come from the counts the last sync
+    recorded, or the collections' totals.
+    """
+    if not get_miro_token():
+        return {"items": [], "requests": 0, "skip": True, "note": "MIRO_ACCESS_TOKEN not set; would write a placeholder"}
+    if requests is None:
+        return {"items": [], "requests": 0, "skip": True, "note": "requests library not installed"}
+
+    note = synced_notes(output_folder, "miro").get(board_id)
+    synced_at = note["synced_at"] if note else None
+    board = get_board(board_id)
+    if board is None:
+        counts = noted_counts(note)
+        return {
+            "items": [(note["title"] if note else board_id, "unknown")],
+            "requests": collection_requests(*counts) if counts else 3,
+            "skip": False,
+            "note": "Board probe failed; changes unknown",
+        }
+
+    state = item_state(parse_timestamp(board.get("modifiedAt")), synced_at)
+    counts = noted_counts(note) or collection_counts(board_id)
+    if counts is None:
+        # Board, then at least one page each of frames and items
+        return {
+            "items": [(board.get("name", board_id), state)],
+            "requests": 3,
+            "skip": False,
+            "note": "Board size unknown; pages not counted",
+        }
+    frames, items = counts
+    return {
+        "items": [(board.get("name", board_id), state)],
+        "requests": collection_requests(frames, items),
+        "skip": False,
+        "note": f"{frames} frame(s) and {items} item(s), {MIRO_PAGE_LIMIT} per page",
+    }
+
+
+def sync_miro(output_folder: Path, force: bool = False, board_id: str = MIRO_BOARD_ID) -> bool:
     """
     Sync Miro board to Obsidian.
 
     Args:
         output_folder: Path to output folder in Obsidian
         force: Force update even if cache is fresh
+        board_id: Miro board to sync
 
     Returns:
         True if successful, False otherwise
     """
+    return run_with_client(sync_miro_async(output_folder, force, board_id))
+
+
+async def sync_miro_async(output_folder: Path, force: bool = False, board_id: str = MIRO_BOARD_ID) -> bool:
+    """Async implementation of sync_miro."""
+    board_url = get_board_url(board_id)
     token = get_miro_token()
     if not token:
         print("   ⚠️  MIRO_ACCESS_TOKEN not set")
@@ -100,23 +277,31 @@ def sync_miro(output_folder: Path, force: bool = False) -> bool:
 
         # Create placeholder file
         output_folder.mkdir(parents=True, exist_ok=True)
-        create_miro_placeholder(output_folder)
+        create_miro_placeholder(output_folder, board_id)
         return True
 
-    if requests is None:
+    if requests is None and httpx is None:
         print("   ❌ requests library not installed")
         print("   Run: pip install requests")
-        create_miro_placeholder(output_folder)
+        create_miro_placeholder(output_folder, board_id)
         return True
 
     print("   Fetching board info...")
 
-    board = get_board()
+    # Board, frames and items are independent; fetch them together
+    board, frames, items = await asyncio.gather(
+        get_board_async(board_id),
+        get_board_frames_async(board_id),
+        get_board_items_async(board_id),
+    )
+    if circuit_open("miro"):
+        print("   ⚠️  Miro is unavailable, keeping the last synced board")
+        return False
     if not board:
         print("   ⚠️  Could not fetch board, creating placeholder")
         output_folder.mkdir(parents=True, exist_ok=True)
-        create_miro_placeholder(output_folder)
-        return True
+        # A failed fetch that kept the last synced content still failed
+        return create_miro_placeholder(output_folder, board_id)
 
     # Get board details
     board_name = board.get("name", "Sharity Board")
@@ -124,27 +309,26 @@ def sync_miro(output_folder: Path, force: bool = False) -> bool:
     created_at = board.get("createdAt", "")
     modified_at = board.get("modifiedAt", "")
 
-    # Get frames (sections of the board)
-    frames = get_board_frames()
-    frames_md = ""
-    if frames:
-        frames_md = "\n## Frames\n\n"
-        for frame in frames:
-            frame_title = frame.get("data", {}).get("title", "Untitled Frame")
-            frames_md += f"- **{frame_title}**\n"
-
-    # Get items summary
-    items = get_board_items()
-    items_summary = ""
-    if items:
-        item_types = {}
-        for item in items:
-            item_type = item.get("type", "unknown")
-            item_types[item_type] = item_types.get(item_type, 0) + 1
-
-        items_summary = "\n## Content Summary\n\n"
-        for item_type, count in sorted(item_types.items()):
-            items_summary += f"- {item_type}: {count}\n"
+    with span("render"):
+        # Frames (sections of the board)
+        frames_md = ""
+        if frames:
+            frames_md = "\n## Frames\n\n"
+            for frame in frames:
+                frame_title = frame.get("data", {}).get("title", "Untitled Frame")
+                frames_md += f"- **{frame_title}**\n"
+
+        # Items summary
+        items_summary = ""
+        if items:
+            item_types = {}
+            for item in items:
+                item_type = item.get("type", "unknown")
+                item_types[item_type] = item_types.get(item_type, 0) + 1
+
+            items_summary = "\n## Content Summary\n\n"
+            for item_type, count in sorted(item_types.items()):
+                items_summary += f"- {item_type}: {count}\n"
 
     # Create markdown content
     now = datetime.now().isoformat(timespec="seconds")
@@ -152,10 +336,12 @@ def sync_miro(output_folder: Path, force: bool = False) -> bool:
 
     md_content = f"""---
 source: miro
-source_url: {MIRO_BOARD_URL}
-source_id: "{MIRO_BOARD_ID}"
+source_url: {board_url}
+source_id: "{board_id}"
 title: "{board_name}"
 synced_at: {now}
+frame_count: {len(frames)}
+item_count: {len(items)}
 tags:
   - sharity
   - miro
@@ -168,7 +354,7 @@ tags:
 
 ## Quick Links
 
-- **[Open in Miro]({MIRO_BOARD_URL})** - View and edit the board
+- **[Open in Miro]({board_url})** - View and edit the board
 - Created: {created_at[:10] if created_at else "Unknown"}
 - Last modified: {modified_at[:10] if modified_at else "Unknown"}
 
@@ -185,27 +371,35 @@ To view or edit:
 
 ---
 _Synced: {now}_
-_Source: [Miro Board]({MIRO_BOARD_URL})_
+_Source: [Miro Board]({board_url})_
 """
 
     file_path = output_folder / "index.md"
-    file_path.write_text(md_content, encoding="utf-8")
+    with span("write"):
+        write_note(file_path, md_content)
     print(f"   ✅ Saved: {file_path.name}")
     print(f"   📁 Synced to: {output_folder}")
 
     return True
 
 
-def create_miro_placeholder(output_folder: Path):
-    """Create a placeholder file when API is not available."""
+def create_miro_placeholder(output_folder: Path, board_id: str = MIRO_BOARD_ID) -> bool:
+    """
+    Create a placeholder file when API is not available, unless a synced one exists.
+
+    Returns:
+        True if the placeholder was written, False if synced content was kept
+    """
     now = datetime.now().isoformat(timespec="seconds")
+    board_url = get_board_url(board_id)
 
     md_content = f"""---
 source: miro
-source_url: {MIRO_BOARD_URL}
-source_id: "{MIRO_BOARD_ID}"
+source_url: {board_url}
+source_id: "{board_id}"
 title: "Sharity Architecture"
 synced_at: {now}
+placeholder: true
 tags:
   - sharity
   - miro
@@ -216,7 +410,7 @@ tags:
 
 ## Quick Links
 
-- **[Open in Miro]({MIRO_BOARD_URL})** - View the architecture diagrams
+- **[Open in Miro]({board_url})** - View the architecture diagrams
 
 ## About
 
@@ -241,12 +435,15 @@ To enable full sync with board metadata:
 
 ---
 _Synced: {now}_
-_Source: [Miro Board]({MIRO_BOARD_URL})_
+_Source: [Miro Board]({board_url})_
 """
 
     file_path = output_folder / "index.md"
-    file_path.write_text(md_content, encoding="utf-8")
-    print(f"   ✅ Created placeholder: {file_path.name}")
+    if write_placeholder(file_path, md_content):
+        print(f"   ✅ Created placeholder: {file_path.name}")
+        return True
+    print(f"   ⚠️  Keeping the last synced {file_path.name} instead of a placeholder")
+    return False
 
 
 if __name__ == "__main__":
@@ -3,21 +3,184 @@
 Notion to Obsidian sync module.
 
 Fetches pages from Notion API and saves them as Markdown files.
+Network I/O runs on asyncio; sync_notion wraps sync_notion_async.
+
+Blocks are projected into compact NotionBlock records as they arrive, so a
+large crawl holds only the fields the renderer uses, not the raw JSON.
+
+Page properties (status, people, dates, relations, ...) are flattened into
+typed values from responses the sync fetches anyway: the root page, and
+the rows of each embedded database, paged from its query. They go into
+the notes' frontmatter and the target's property index (sync_properties).
 """
+import asyncio
 import os
 import re
+import sys
 from datetime import datetime
 from pathlib import Path
+from typing import NamedTuple
 
 try:
     import requests
 except ImportError:
     requests = None
 
+from sync_http import CircuitOpenError, circuit_open, httpx, run_with_client, send, send_async
+from sync_plan import item_state, parse_timestamp, synced_notes
+from sync_properties import frontmatter_lines, load_property_index, property_fields, save_property_index
+from sync_search import write_note, write_placeholder
+from sync_trace import span
+
 # Notion configuration
 NOTION_PAGE_ID = "2e60a5be7bbe80e68b23f1f5f158aaee"  # Sharity Dalat Build Week
 NOTION_API_VERSION = "2022-06-28"
 NOTION_API_BASE = "https://api.notion.com/v1"
+NOTION_PLAN_SEARCH_PAGES = 5  # Search pages of 100 a --plan reads at most
+NOTION_PROBE_SEARCH_PAGES = 2  # Search pages of 100 a change probe reads at most
+
+# Block types whose children blocks_to_markdown renders inline, filled in
+# by block_renderer(). The async fetch prefetches these subtrees, and
+# those of block types without a renderer.
+NESTED_BLOCK_TYPES = set()
+
+# Block type -> handler(block, lines, children) appending the block's
+# Markdown lines; see block_renderer()
+BLOCK_RENDERERS = {}
+
+# Block types whose text is their caption rather than their rich_text
+CAPTIONED_BLOCK_TYPES = {"image", "bookmark", "embed", "video", "audio", "file", "pdf"}
+
+# Rich text annotations rich_text_to_md renders, as RichText.marks bits
+MARK_BOLD = 1
+MARK_ITALIC = 2
+MARK_STRIKETHROUGH = 4
+MARK_CODE = 8
+MARK_EQUATION = 16  # An inline equation rather than an annotation
+MARK_ESCAPE = 32  # Text with characters to escape; set by parse_rich_text
+MARK_SPACE = 64  # Whitespace moved out of a formatted run by parse_rich_text
+VERBATIM_MARKS = MARK_CODE | MARK_EQUATION
+ANNOTATION_MARKS = {
+    "bold": MARK_BOLD,
+    "italic": MARK_ITALIC,
+    "strikethrough": MARK_STRIKETHROUGH,
+    "code": MARK_CODE,
+}
+
+# Emphasis markers, outermost first when several open together
+EMPHASIS_MARKERS = {
+    MARK_BOLD: "**",
+    MARK_ITALIC: "*",
+    MARK_STRIKETHROUGH: "~~",
+}
+EMPHASIS_MASK = MARK_BOLD | MARK_ITALIC | MARK_STRIKETHROUGH
+MARKUP_MASK = EMPHASIS_MASK | VERBATIM_MARKS
+
+# Characters escaped in plain rich text; underscores only at word edges,
+# since intraword ones never start emphasis
+MARKDOWN_ESCAPE_PATTERN = re.compile(r"[\\`*\[\]~$<]|(?<![0-9A-Za-z])_|_(?![0-9A-Za-z])")
+MARKDOWN_SPECIAL_PATTERN = re.compile(r"[\\`*\[\]~$<_]")  # Cheap check before escaping
+
+
+class RichText(NamedTuple):
+    """A run of Notion rich text."""
+
+    text: str
+    marks: int = 0  # MARK_* bits
+    href: str | None = None
+
+
+SPACE_RUNS = {text: RichText(text, MARK_SPACE) for text in (" ", "\n")}
+
+
+class NotionBlock(NamedTuple):
+    """A Notion block, reduced to what blocks_to_markdown renders."""
+
+    id: str
+    type: str
+    has_children: bool = False
+    text: tuple = ()  # RichText runs: rich_text, or the caption of CAPTIONED_BLOCK_TYPES
+    checked: bool = False  # to_do
+    language: str = ""  # code
+    icon: str = ""  # callout emoji
+    url: str = ""  # image, bookmark and other media and links
+    title: str = ""  # child_page, child_database, database_row
+    expression: str = ""  # equation
+
+
+def parse_rich_text(items: list) -> tuple:
+    """
+    Project a Notion rich text array into RichText runs, ready to render.
+
+    Adjacent runs formatted alike are merged, text rich_text_to_md has to
+    escape is flagged with MARK_ESCAPE, and the whitespace at the edges of
+    formatted runs is split off into MARK_SPACE runs, since Markdown wants
+    it outside the markers. Rendering then only works where the formatting
+    changes or the text calls for it.
+    """
+    merged = []
+    for item in items:
+        annotations = item.get("annotations") or {}
+        marks = MARK_EQUATION if item.get("type") == "equation" else 0
+        for name, mark in ANNOTATION_MARKS.items():
+            if annotations.get(name):
+                marks |= mark
+        text = item.get("plain_text", "")
+        href = item.get("href")
+        if merged and merged[-1][1] == marks and merged[-1][2] == href:
+            merged[-1][0] += text
+        else:
+            merged.append([text, marks, href])
+
+    runs = []
+    for text, marks, href in merged:
+        if not marks & VERBATIM_MARKS and MARKDOWN_SPECIAL_PATTERN.search(text):
+            marks |= MARK_ESCAPE
+        if not marks & MARKUP_MASK and not href:
+            runs.append(RichText(text, marks))
+            continue
+        core = text.strip()
+        if len(core) == len(text):
+            runs.append(RichText(text, marks, href))
+        elif not core:
+            runs.append(space_run(text))
+        else:
+            lead = text[:len(text) - len(text.lstrip())]
+            trail = text[len(text.rstrip()):]
+            if lead:
+                runs.append(space_run(lead))
+            runs.append(RichText(core, marks, href))
+            if trail:
+                runs.append(space_run(trail))
+    return tuple(runs)
+
+
+def space_run(text: str) -> RichText:
+    """A MARK_SPACE run; the usual single spaces share one record."""
+    run = SPACE_RUNS.get(text)
+    if run is None:
+        run = RichText(text, MARK_SPACE)
+    return run
+
+
+def parse_block(raw: dict) -> NotionBlock:
+    """Project a block from the API into a NotionBlock; the raw dict can then go."""
+    block_type = raw.get("type", "")
+    content = raw.get(block_type) or {}
+    image = content.get("file") or content.get("external") or {}
+    text_field = "caption" if block_type in CAPTIONED_BLOCK_TYPES else "rich_text"
+    return NotionBlock(
+        id=raw.get("id", ""),
+        type=sys.intern(block_type),
+        has_children=bool(raw.get("has_children")),
+        text=parse_rich_text(content.get(text_field) or ()),
+        checked=bool(content.get("checked")),
+        language=sys.intern(content.get("language") or ""),
+        icon=(content.get("icon") or {}).get("emoji", ""),
+        url=content.get("url") or image.get("url", ""),
+        title=content.get("title", ""),
+        expression=content.get("expression", ""),
+    )
 
 
 def get_notion_token() -> str | None:
@@ -46,10 +209,7 @@ def notion_request(endpoint: str, method: str = "GET", data: dict = None) -> dic
     url = f"{NOTION_API_BASE}/{endpoint}"
 
     try:
-        if method == "GET":
-            response = requests.get(url, headers=headers, timeout=30)
-        else:
-            response = requests.post(url, headers=headers, json=data, timeout=30)
+        response = send("notion", method, url, headers=headers, json=data)
 
         if response.status_code == 200:
             return response.json()
@@ -57,18 +217,219 @@ def notion_request(endpoint: str, method: str = "GET", data: dict = None) -> dic
             print(f"   ❌ Notion API error: {response.status_code}")
             print(f"      {response.text[:200]}")
             return None
+    except CircuitOpenError:
+        # Reported once, when the circuit opened
+        return None
     except requests.RequestException as e:
         print(f"   ❌ Request error: {e}")
         return None
 
 
+async def notion_request_async(endpoint: str, method: str = "GET", data: dict = None) -> dict | None:
+    """Make a request to Notion API on the shared async client."""
+    if httpx is None:
+        # No async client available; run the blocking helper off-loop
+        return await asyncio.to_thread(notion_request, endpoint, method, data)
+
+    token = get_notion_token()
+    if not token:
+        print("   ❌ NOTION_TOKEN not set in environment")
+        print("   Create .env file with NOTION_TOKEN=secret_xxx...")
+        return None
+
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Notion-Version": NOTION_API_VERSION,
+        "Content-Type": "application/json",
+    }
+
+    url = f"{NOTION_API_BASE}/{endpoint}"
+
+    try:
+        response = await send_async("notion", method, url, headers=headers, json=data)
+    except CircuitOpenError:
+        # Reported once, when the circuit opened
+        return None
+    except httpx.HTTPError as e:
+        print(f"   ❌ Request error: {e}")
+        return None
+
+    if response.status_code == 200:
+        return response.json()
+    print(f"   ❌ Notion API error: {response.status_code}")
+    print(f"      {response.text[:200]}")
+    return None
+
+
 def get_page(page_id: str) -> dict | None:
     """Fetch a page from Notion."""
     return notion_request(f"pages/{page_id}")
 
 
+def get_change_marker(page_id: str = NOTION_PAGE_ID, output_folder: Path | None = None) -> str | None:
+    """
+    Get the last_edited_time of the most recently edited page a target
+    syncs: its root page, a page synced into its folder, or a new child
+    page of the root. Edits elsewhere in the workspace don't move it.
+
+    Search is read newest first, usually a single call, and at most
+    NOTION_PROBE_SEARCH_PAGES pages deep; "" if none of the target's
+    pages was edited that recently.
+    """
+    root_id = page_id.replace("-", "")
+    pages = {root_id}
+    if output_folder is not None:
+        pages.update(source_id.replace("-", "") for source_id in synced_notes(output_folder, "notion"))
+
+    cursor = None
+    for _ in range(NOTION_PROBE_SEARCH_PAGES):
+        data = {
+            "filter": {"property": "object", "value": "page"},
+            "sort": {"direction": "descending", "timestamp": "last_edited_time"},
+            "page_size": 100,
+        }
+        if cursor:
+            data["start_cursor"] = cursor
+
+        result = notion_request("search", method="POST", data=data)
+        if result is None:
+            return None
+
+        for page in result.get("results", []):
+            parent_id = ((page.get("parent") or {}).get("page_id") or "").replace("-", "")
+            if page["id"].replace("-", "") in pages or parent_id == root_id:
+                return page.get("last_edited_time", "")
+
+        if not result.get("has_more"):
+            break
+        cursor = result.get("next_cursor")
+
+    return ""
+
+
+def get_edited_pages(since: datetime | None = None, max_pages: int | None = None) -> tuple[list, bool] | None:
+    """
+    List the pages the integration can see that were edited after a time,
+    most recently edited first, paging through search only as far as needed.
+
+    Args:
+        since: Stop at the first page edited at or before this time; None
+            lists every page
+        max_pages: Stop after this many search requests
+
+    Returns:
+        (pages, complete): dicts with id, title, parent_id and
+        last_edited_time, and False if max_pages cut the listing short;
+        None if the search failed
+    """
+    pages = []
+    cursor = None
+    searches = 0
+
+    while max_pages is None or searches < max_pages:
+        searches += 1
+        data = {
+            "filter": {"property": "object", "value": "page"},
+            "sort": {"direction": "descending", "timestamp": "last_edited_time"},
+            "page_size": 100,
+        }
+        if cursor:
+            data["start_cursor"] = cursor
+
+        result = notion_request("search", method="POST", data=data)
+        if result is None:
+            return None
+
+        for page in result.get("results", []):
+            edited = parse_timestamp(page.get("last_edited_time"))
+            if since and edited and edited <= since:
+                return pages, True
+            pages.append({
+                "id": page["id"].replace("-", ""),
+                "title": page_title(page),
+                "parent_id": ((page.get("parent") or {}).get("page_id") or "").replace("-", ""),
+                "last_edited_time": edited,
+            })
+
+        if not result.get("has_more"):
+            return pages, True
+        cursor = result.get("next_cursor")
+
+    return pages, False
+
+
+def page_title(page: dict) -> str:
+    """Get a page's title, whatever its title property is called."""
+    for prop in (page.get("properties") or {}).values():
+        if prop.get("type") == "title":
+            return "".join(t.get("plain_text", "") for t in prop.get("title", [])) or "Untitled"
+    return "Untitled"
+
+
+def property_value(prop: dict):
+    """
+    Flatten a Notion property value into a typed value: text, a number, a
+    bool, an ISO date, or a list of them; None when empty or unsupported.
+    """
+    prop_type = prop.get("type")
+    value = prop.get(prop_type)
+    if value is None:
+        return None
+    if prop_type in ("title", "rich_text"):
+        return "".join(t.get("plain_text", "") for t in value)
+    if prop_type in ("select", "status"):
+        return value.get("name")
+    if prop_type == "multi_select":
+        return [option.get("name", "") for option in value]
+    if prop_type == "date":
+        return value.get("start")
+    if prop_type in ("people", "created_by", "last_edited_by"):
+        people = value if prop_type == "people" else [value]
+        names = [person.get("name") or person.get("id", "").replace("-", "") for person in people]
+        return names if prop_type == "people" else names[0]
+    if prop_type == "relation":
+        return [related.get("id", "").replace("-", "") for related in value]
+    if prop_type == "files":
+        return [f.get("name", "") for f in value]
+    if prop_type in ("formula", "rollup"):
+        inner_type = value.get("type")
+        if inner_type == "array":
+            items = []
+            for item in value.get("array") or ():
+                item_value = property_value(item)
+                items.extend(item_value if isinstance(item_value, list) else [item_value])
+            return [item for item in items if item is not None]
+        inner = value.get(inner_type)
+        return inner.get("start") if inner_type == "date" and inner else inner
+    if prop_type == "unique_id":
+        prefix, number = value.get("prefix"), value.get("number")
+        return f"{prefix}-{number}" if prefix and number is not None else number
+    if prop_type == "verification":
+        return value.get("state")
+    if prop_type in ("number", "checkbox", "url", "email", "phone_number", "created_time", "last_edited_time"):
+        return value
+    return None
+
+
+def page_properties(page: dict) -> dict:
+    """
+    Get a page's properties as typed values, by property name; the title
+    is left out, since notes carry it already.
+
+    A date range adds "<name> end"; relations are page ids.
+    """
+    properties = {}
+    for name, prop in (page.get("properties") or {}).items():
+        if prop.get("type") == "title":
+            continue
+        properties[name] = property_value(prop)
+        if prop.get("type") == "date" and (prop.get("date") or {}).get("end"):
+            properties[f"{name} end"] = prop["date"]["end"]
+    return properties
+
+
 def get_page_blocks(page_id: str) -> list:
-    """Fetch all blocks from a page."""
+    """Fetch all blocks from a page, as NotionBlock records."""
     blocks = []
     cursor = None
 
@@ -81,7 +442,7 @@ def get_page_blocks(page_id: str) -> list:
         if not result:
             break
 
-        blocks.extend(result.get("results", []))
+        blocks.extend(parse_block(block) for block in result.get("results", []))
 
         if result.get("has_more"):
             cursor = result.get("next_cursor")
@@ -91,143 +452,541 @@ def get_page_blocks(page_id: str) -> list:
     return blocks
 
 
-def get_child_pages(page_id: str) -> list:
-    """Get child pages of a page."""
-    blocks = get_page_blocks(page_id)
+async def get_page_async(page_id: str) -> dict | None:
+    """Fetch a page from Notion."""
+    return await notion_request_async(f"pages/{page_id}")
+
+
+async def get_page_blocks_async(page_id: str) -> list | None:
+    """
+    Fetch all blocks from a page, as NotionBlock records.
+
+    Returns:
+        The blocks, or None if a request failed: a partial list would
+        render as a truncated page
+    """
+    blocks = []
+    cursor = None
+
+    # Pages of one block list depend on the previous cursor, so these
+    # stay sequential; concurrency comes from fetching many lists at once
+    while True:
+        endpoint = f"blocks/{page_id}/children?page_size=100"
+        if cursor:
+            endpoint += f"&start_cursor={cursor}"
+
+        result = await notion_request_async(endpoint)
+        if not result:
+            return None
+
+        blocks.extend(parse_block(block) for block in result.get("results", []))
+
+        if result.get("has_more"):
+            cursor = result.get("next_cursor")
+        else:
+            break
+
+    return blocks
+
+
+async def query_database_async(database_id: str) -> list | None:
+    """
+    Fetch all rows of a database, projected as they arrive.
+
+    Returns:
+        List of dicts with id, title, url and fields (see
+        sync_properties.property_fields), or None if a request failed,
+        e.g. for a linked view of a database the integration can't see: a
+        partial list can't be told apart from a smaller database
+    """
+    rows = []
+    cursor = None
+
+    while True:
+        data = {"page_size": 100}
+        if cursor:
+            data["start_cursor"] = cursor
+
+        result = await notion_request_async(f"databases/{database_id}/query", method="POST", data=data)
+        if not result:
+            return None
+
+        for page in result.get("results", []):
+            rows.append({
+                "id": page["id"].replace("-", ""),
+                "title": page_title(page),
+                "url": page.get("url") or f"https://www.notion.so/{page['id'].replace('-', '')}",
+                "fields": property_fields(page_properties(page), "notion"),
+            })
+
+        if result.get("has_more"):
+            cursor = result.get("next_cursor")
+        else:
+            break
+
+    return rows
+
+
+def indexed_database_rows(output_folder: Path) -> dict:
+    """Get the rows the last sync indexed for a target, as database id -> index entries."""
+    index = load_property_index(output_folder) or {}
+    rows = {}
+    for entry in index.get("pages", []):
+        if entry.get("database"):
+            rows.setdefault(entry["database"], []).append(entry)
+    return rows
+
+
+async def attach_database_rows_async(blocks: list, children: dict, previous: dict | None = None) -> tuple[list, bool]:
+    """
+    Query the databases embedded in a block tree, concurrently, and add
+    their rows to `children` as database_row blocks for the renderer.
+
+    Args:
+        previous: Rows indexed by the last sync (see indexed_database_rows),
+            kept for databases whose query fails
+
+    Returns:
+        (entries, complete): property index entries for the rows, and
+        whether every query succeeded
+    """
+    databases = [
+        block
+        for level in (blocks, *children.values())
+        for block in level
+        if block.type == "child_database"
+    ]
+    results = await asyncio.gather(*(query_database_async(database.id) for database in databases))
+
+    entries = []
+    complete = True
+    for database, rows in zip(databases, results):
+        if rows is None:
+            complete = False
+            kept = (previous or {}).get(database.id, [])
+            print(f"   ⚠️  Could not query {database.title or 'a database'}, keeping its {len(kept)} indexed row(s)")
+            children[database.id] = [
+                NotionBlock(id=entry["id"], type="database_row", title=entry["title"], url=entry["url"])
+                for entry in kept
+            ]
+            entries.extend(kept)
+            continue
+        children[database.id] = [
+            NotionBlock(id=row["id"], type="database_row", title=row["title"], url=row["url"])
+            for row in rows
+        ]
+        entries.extend(
+            {
+                "id": row["id"],
+                "title": row["title"],
+                "url": row["url"],
+                "note": None,
+                "parent": database.title or "Database",
+                "database": database.id,
+                "properties": row["fields"],
+            }
+            for row in rows
+        )
+    return entries, complete
+
+
+async def get_block_tree_async(page_id: str) -> tuple[list, dict] | None:
+    """
+    Fetch a page's blocks along with the nested children the renderer
+    needs, expanding each level of the tree concurrently.
+
+    Returns:
+        (blocks, children) where children maps block id -> child blocks,
+        for passing to blocks_to_markdown; None if any block list failed
+        to fetch
+    """
+    blocks = await get_page_blocks_async(page_id)
+    if blocks is None:
+        return None
+    children = {}
+
+    level = blocks
+    while level:
+        nested = [b for b in level if b.has_children and renders_children(b.type)]
+        results = await asyncio.gather(*(get_page_blocks_async(b.id) for b in nested))
+        if any(child_blocks is None for child_blocks in results):
+            return None
+        level = []
+        for block, child_blocks in zip(nested, results):
+            children[block.id] = child_blocks
+            level.extend(child_blocks)
+
+    return blocks, children
+
+
+def child_pages_from_blocks(blocks: list) -> list:
+    """Get the child pages listed in a page's blocks."""
     child_pages = []
 
     for block in blocks:
-        if block.get("type") == "child_page":
+        if block.type == "child_page":
             child_pages.append({
-                "id": block["id"],
-                "title": block["child_page"].get("title", "Untitled"),
+                "id": block.id,
+                "title": block.title or "Untitled",
             })
 
     return child_pages
 
 
-def blocks_to_markdown(blocks: list) -> str:
-    """Convert Notion blocks to Markdown."""
+def get_child_pages(page_id: str) -> list:
+    """Get child pages of a page."""
+    return child_pages_from_blocks(get_page_blocks(page_id))
+
+
+def block_renderer(*block_types: str, nested: bool = False):
+    """
+    Register a function rendering the given block types.
+
+    The function is called as handler(block, lines, children) and appends
+    the block's Markdown lines to `lines`; `children` is passed on to
+    child_markdown(). Set `nested` for block types whose children it
+    renders, so the async fetch prefetches them.
+    """
+
+    def register(handler):
+        for block_type in block_types:
+            BLOCK_RENDERERS[block_type] = handler
+            if nested:
+                NESTED_BLOCK_TYPES.add(block_type)
+            else:
+                NESTED_BLOCK_TYPES.discard(block_type)
+        return handler
+
+    return register
+
+
+def renders_children(block_type: str) -> bool:
+    """Whether blocks_to_markdown renders a block type's children."""
+    return block_type in NESTED_BLOCK_TYPES or block_type not in BLOCK_RENDERERS
+
+
+def blocks_to_markdown(blocks: list, children: dict | None = None) -> str:
+    """
+    Convert Notion blocks to Markdown.
+
+    Args:
+        blocks: NotionBlock records to render
+        children: Prefetched child blocks by block id (see
+            get_block_tree_async); nested blocks are fetched on demand
+            when this is None
+    """
     md_lines = []
+    renderers = BLOCK_RENDERERS
 
     for block in blocks:
-        block_type = block.get("type", "")
-        content = block.get(block_type, {})
-
-        if block_type == "paragraph":
-            text = rich_text_to_md(content.get("rich_text", []))
-            md_lines.append(text)
-            md_lines.append("")
-
-        elif block_type.startswith("heading_"):
-            level = int(block_type[-1])
-            text = rich_text_to_md(content.get("rich_text", []))
-            md_lines.append(f"{'#' * level} {text}")
-            md_lines.append("")
-
-        elif block_type == "bulleted_list_item":
-            text = rich_text_to_md(content.get("rich_text", []))
-            md_lines.append(f"- {text}")
-
-        elif block_type == "numbered_list_item":
-            text = rich_text_to_md(content.get("rich_text", []))
-            md_lines.append(f"1. {text}")
-
-        elif block_type == "to_do":
-            text = rich_text_to_md(content.get("rich_text", []))
-            checked = "x" if content.get("checked") else " "
-            md_lines.append(f"- [{checked}] {text}")
-
-        elif block_type == "toggle":
-            text = rich_text_to_md(content.get("rich_text", []))
-            md_lines.append(f"<details><summary>{text}</summary>")
-            md_lines.append("")
-            # Recursively get children if has_children
-            if block.get("has_children"):
-                child_blocks = get_page_blocks(block["id"])
-                md_lines.append(blocks_to_markdown(child_blocks))
-            md_lines.append("</details>")
-            md_lines.append("")
-
-        elif block_type == "code":
-            language = content.get("language", "")
-            code = rich_text_to_md(content.get("rich_text", []))
-            md_lines.append(f"```{language}")
-            md_lines.append(code)
-            md_lines.append("```")
-            md_lines.append("")
-
-        elif block_type == "quote":
-            text = rich_text_to_md(content.get("rich_text", []))
-            md_lines.append(f"> {text}")
-            md_lines.append("")
-
-        elif block_type == "divider":
-            md_lines.append("---")
-            md_lines.append("")
-
-        elif block_type == "callout":
-            text = rich_text_to_md(content.get("rich_text", []))
-            icon = content.get("icon", {})
-            emoji = icon.get("emoji", "")
-            md_lines.append(f"> {emoji} {text}")
-            md_lines.append("")
-
-        elif block_type == "image":
-            image = content.get("file", {}) or content.get("external", {})
-            url = image.get("url", "")
-            caption = rich_text_to_md(content.get("caption", []))
-            md_lines.append(f"![{caption}]({url})")
-            md_lines.append("")
-
-        elif block_type == "bookmark":
-            url = content.get("url", "")
-            caption = rich_text_to_md(content.get("caption", []))
-            md_lines.append(f"[{caption or url}]({url})")
-            md_lines.append("")
-
-        elif block_type == "child_page":
-            title = content.get("title", "Untitled")
-            md_lines.append(f"- [[{sanitize_filename(title)}|{title}]]")
-
-        elif block_type == "child_database":
-            title = content.get("title", "Database")
-            md_lines.append(f"📊 **Database:** {title}")
-            md_lines.append("")
-
-        elif block_type == "table":
-            # Tables are complex, just note them
-            md_lines.append("_[Table content - see Notion]_")
-            md_lines.append("")
+        renderers.get(block.type, render_other)(block, md_lines, children)
 
     return "\n".join(md_lines)
 
 
-def rich_text_to_md(rich_text: list) -> str:
-    """Convert Notion rich text array to Markdown string."""
-    parts = []
-    for item in rich_text:
-        text = item.get("plain_text", "")
-        annotations = item.get("annotations", {})
+def child_markdown(block: NotionBlock, children: dict | None) -> str:
+    """Render a block's children, from the prefetched map or fetched now."""
+    if not block.has_children:
+        return ""
+    if children is not None:
+        child_blocks = children.get(block.id, [])
+    else:
+        child_blocks = get_page_blocks(block.id)
+    return blocks_to_markdown(child_blocks, children)
 
-        if annotations.get("bold"):
-            text = f"**{text}**"
-        if annotations.get("italic"):
-            text = f"*{text}*"
-        if annotations.get("strikethrough"):
-            text = f"~~{text}~~"
-        if annotations.get("code"):
-            text = f"`{text}`"
 
-        href = item.get("href")
-        if href:
-            text = f"[{text}]({href})"
+def quoted(text: str) -> str:
+    """Prefix every line of a text with a blockquote marker."""
+    return "\n".join(f"> {line}" for line in text.split("\n"))
+
+
+@block_renderer("paragraph")
+def render_paragraph(block: NotionBlock, lines: list, children: dict | None):
+    lines.append(rich_text_to_md(block.text))
+    lines.append("")
+
+
+@block_renderer("heading_1", "heading_2", "heading_3")
+def render_heading(block: NotionBlock, lines: list, children: dict | None):
+    lines.append(f"{'#' * int(block.type[-1])} {rich_text_to_md(block.text)}")
+    lines.append("")
+
+
+@block_renderer("bulleted_list_item")
+def render_bulleted_list_item(block: NotionBlock, lines: list, children: dict | None):
+    lines.append(f"- {rich_text_to_md(block.text)}")
+
+
+@block_renderer("numbered_list_item")
+def render_numbered_list_item(block: NotionBlock, lines: list, children: dict | None):
+    lines.append(f"1. {rich_text_to_md(block.text)}")
+
+
+@block_renderer("to_do")
+def render_to_do(block: NotionBlock, lines: list, children: dict | None):
+    checked = "x" if block.checked else " "
+    lines.append(f"- [{checked}] {rich_text_to_md(block.text)}")
+
+
+@block_renderer("toggle", nested=True)
+def render_toggle(block: NotionBlock, lines: list, children: dict | None):
+    lines.append(f"<details><summary>{rich_text_to_md(block.text)}</summary>")
+    lines.append("")
+    if block.has_children:
+        lines.append(child_markdown(block, children))
+    lines.append("</details>")
+    lines.append("")
+
+
+@block_renderer("code")
+def render_code(block: NotionBlock, lines: list, children: dict | None):
+    # Code is literal: no annotations or escaping, and a fence it can't close
+    code = "".join(run.text for run in block.text)
+    fence = "```"
+    while fence in code:
+        fence += "`"
+    lines.append(f"{fence}{block.language}")
+    lines.append(code)
+    lines.append(fence)
+    lines.append("")
+
+
+@block_renderer("quote")
+def render_quote(block: NotionBlock, lines: list, children: dict | None):
+    lines.append(quoted(rich_text_to_md(block.text)))
+    lines.append("")
+
+
+@block_renderer("divider")
+def render_divider(block: NotionBlock, lines: list, children: dict | None):
+    lines.append("---")
+    lines.append("")
+
+
+@block_renderer("callout")
+def render_callout(block: NotionBlock, lines: list, children: dict | None):
+    lines.append(quoted(f"{block.icon} {rich_text_to_md(block.text)}"))
+    lines.append("")
+
+
+@block_renderer("image")
+def render_image(block: NotionBlock, lines: list, children: dict | None):
+    lines.append(f"![{rich_text_to_md(block.text)}]({block.url})")
+    lines.append("")
+
 
-        parts.append(text)
+@block_renderer("bookmark", "embed", "link_preview", "video", "audio", "file", "pdf")
+def render_link(block: NotionBlock, lines: list, children: dict | None):
+    caption = rich_text_to_md(block.text)
+    lines.append(f"[{caption or block.url}]({block.url})")
+    lines.append("")
 
+
+@block_renderer("child_page")
+def render_child_page(block: NotionBlock, lines: list, children: dict | None):
+    title = block.title or "Untitled"
+    lines.append(f"- [[{sanitize_filename(title)}|{title}]]")
+
+
+@block_renderer("child_database")
+def render_child_database(block: NotionBlock, lines: list, children: dict | None):
+    lines.append(f"📊 **Database:** {block.title or 'Database'}")
+    lines.append("")
+    # Rows come from attach_database_rows_async, not the block's children
+    rows = children.get(block.id) if children else None
+    if rows:
+        lines.append(blocks_to_markdown(rows, children))
+        lines.append("")
+
+
+@block_renderer("database_row")
+def render_database_row(block: NotionBlock, lines: list, children: dict | None):
+    # Not a Notion block type: a database's row, from its query
+    lines.append(f"- [{block.title or 'Untitled'}]({block.url})")
+
+
+@block_renderer("table")
+def render_table(block: NotionBlock, lines: list, children: dict | None):
+    # Tables are complex, just note them
+    lines.append("_[Table content - see Notion]_")
+    lines.append("")
+
+
+@block_renderer("equation")
+def render_equation(block: NotionBlock, lines: list, children: dict | None):
+    lines.append("$$")
+    lines.append(block.expression)
+    lines.append("$$")
+    lines.append("")
+
+
+@block_renderer("column_list", "column", "synced_block", nested=True)
+def render_container(block: NotionBlock, lines: list, children: dict | None):
+    # Layout-only blocks: their content is their children, one after another
+    if block.has_children:
+        lines.append(child_markdown(block, children))
+
+
+def render_other(block: NotionBlock, lines: list, children: dict | None):
+    """
+    Render a block type without a renderer from whatever it carries: its
+    text, a link, its children, or else a note pointing to Notion.
+    """
+    text = rich_text_to_md(block.text)
+    if block.url:
+        lines.append(f"[{text or block.url}]({block.url})")
+        lines.append("")
+    elif text:
+        lines.append(text)
+        lines.append("")
+    if block.has_children:
+        lines.append(child_markdown(block, children))
+    elif not (block.url or text):
+        lines.append(f"_[{block.type.replace('_', ' ').capitalize()} - see Notion]_")
+        lines.append("")
+
+
+def escape_markdown(text: str) -> str:
+    """Escape the characters Markdown would read as formatting."""
+    if MARKDOWN_SPECIAL_PATTERN.search(text) is None:
+        return text
+    return MARKDOWN_ESCAPE_PATTERN.sub(r"\\\g<0>", text)
+
+
+def code_span(text: str) -> str:
+    """Wrap text in a code span its own backticks can't close."""
+    fence = "`"
+    while fence in text:
+        fence += "`"
+    pad = " " if text.startswith("`") or text.endswith("`") else ""
+    return f"{fence}{pad}{text}{pad}{fence}"
+
+
+def emphasis_transitions() -> list:
+    """
+    Precompute the markup between runs for rich_text_to_md.
+
+    Each combination of open marks (innermost last) is a state, kept as
+    its offset in the table: state 0 has nothing open, and a state plus
+    the wanted emphasis marks indexes the transition to them.
+
+    Returns:
+        List of (closing markers, opening markers, state afterwards)
+    """
+    stacks = {()}
+    for _ in EMPHASIS_MARKERS:
+        stacks |= {stack + (mark,) for stack in stacks for mark in EMPHASIS_MARKERS if mark not in stack}
+    offsets = {stack: i * (EMPHASIS_MASK + 1) for i, stack in enumerate(sorted(stacks, key=len))}
+
+    transitions = [None] * (len(offsets) * (EMPHASIS_MASK + 1))
+    for stack, offset in offsets.items():
+        for wanted in range(EMPHASIS_MASK + 1):
+            # Close from the innermost mark out to the outermost one dropped
+            keep = 0
+            while keep < len(stack) and stack[keep] & wanted:
+                keep += 1
+            opening = tuple(mark for mark in EMPHASIS_MARKERS if wanted & mark and mark not in stack[:keep])
+            transitions[offset + wanted] = (
+                "".join(EMPHASIS_MARKERS[mark] for mark in reversed(stack[keep:])),
+                "".join(EMPHASIS_MARKERS[mark] for mark in opening),
+                offsets[stack[:keep] + opening],
+            )
+    return transitions
+
+
+EMPHASIS_TRANSITIONS = emphasis_transitions()
+
+# Wanted marks -> (opening, closing) markers of a span formatted throughout
+EMPHASIS_SPANS = {
+    wanted: (opening, EMPHASIS_TRANSITIONS[state][0])
+    for wanted, (_, opening, state) in enumerate(EMPHASIS_TRANSITIONS[:EMPHASIS_MASK + 1])
+}
+
+
+def rich_text_to_md(rich_text: tuple) -> str:
+    """
+    Convert RichText runs, as parse_rich_text projects them, to a Markdown
+    string in a single pass.
+
+    Emphasis opens and closes only where it changes, so a bold phrase
+    followed by bold italic stays one bold span. Whitespace split off
+    formatted runs goes between the markers; links enclose emphasis, and
+    text is escaped where parse_rich_text flagged it.
+    """
+    # Most arrays are a single run once runs formatted alike are merged,
+    # and most of those are plain text
+    if len(rich_text) == 1:
+        text, marks, href = rich_text[0]
+        if not marks & MARKUP_MASK and not href:
+            return MARKDOWN_ESCAPE_PATTERN.sub(r"\\\g<0>", text) if marks & MARK_ESCAPE else text
+        return formatted_span(text, marks, href)
+
+    parts = []
+    state = 0  # Emphasis open, as an EMPHASIS_TRANSITIONS state
+    link = None  # href of the open link
+    pending = ""  # Whitespace, emitted once the next markers are known
+
+    for text, marks, href in rich_text:
+        if marks & MARK_SPACE:
+            pending += text
+            continue
+
+        if not marks & MARKUP_MASK and not href:
+            # Plain text keeps its whitespace; only open emphasis is closed
+            if state:
+                parts.append(EMPHASIS_TRANSITIONS[state][0])
+                state = 0
+            if link:
+                parts.append(f"]({link})")
+                link = None
+            parts.append(pending)
+            pending = ""
+            parts.append(MARKDOWN_ESCAPE_PATTERN.sub(r"\\\g<0>", text) if marks & MARK_ESCAPE else text)
+            continue
+
+        if href != link:
+            parts.append(EMPHASIS_TRANSITIONS[state][0])
+            if link:
+                parts.append(f"]({link})")
+            state = 0
+            link = None
+        closing, opening, state = EMPHASIS_TRANSITIONS[state | marks & EMPHASIS_MASK]
+        if href and link is None:
+            opening = "[" + opening
+            link = href
+        parts.append(closing + pending + opening if pending else closing + opening)
+        pending = ""
+
+        if marks & VERBATIM_MARKS:
+            parts.append(f"${text}$" if marks & MARK_EQUATION else code_span(text))
+        elif marks & MARK_ESCAPE:
+            parts.append(MARKDOWN_ESCAPE_PATTERN.sub(r"\\\g<0>", text))
+        else:
+            parts.append(text)
+
+    parts.append(EMPHASIS_TRANSITIONS[state][0])
+    if link:
+        parts.append(f"]({link})")
+    parts.append(pending)
     return "".join(parts)
 
 
+def formatted_span(text: str, marks: int, href: str | None) -> str:
+    """Render a lone formatted run: no transitions to work out."""
+    opening, closing = EMPHASIS_SPANS[marks & EMPHASIS_MASK]
+    if marks & MARK_EQUATION:
+        inner = f"${text}$"
+    elif marks & MARK_CODE:
+        inner = code_span(text)
+    elif marks & MARK_ESCAPE:
+        inner = MARKDOWN_ESCAPE_PATTERN.sub(r"\\\g<0>", text)
+    else:
+        inner = text
+    if href:
+        return f"[{opening}{inner}{closing}]({href})"
+    return f"{opening}{inner}{closing}"
+
+
 def sanitize_filename(name: str) -> str:
     """Sanitize a string for use as filename."""
     # Remove or replace invalid characters
@@ -242,8 +1001,15 @@ def save_page_to_obsidian(
     content: str,
     output_folder: Path,
     source_url: str,
+    properties: dict | None = None,
 ) -> Path:
-    """Save a page to Obsidian vault."""
+    """
+    Save a page to Obsidian vault.
+
+    Args:
+        properties: The page's property fields (see
+            sync_properties.property_fields), written as typed frontmatter
+    """
     output_folder.mkdir(parents=True, exist_ok=True)
 
     now = datetime.now().isoformat(timespec="seconds")
@@ -256,7 +1022,7 @@ source_url: {source_url}
 source_id: "{page_id}"
 title: "{title}"
 synced_at: {now}
-tags:
+{frontmatter_lines(properties)}tags:
   - sharity
   - notion
 ---
@@ -270,21 +1036,27 @@ _Synced: {now}_
 _Source: [Notion]({source_url})_
 """
 
-    file_path.write_text(md_content, encoding="utf-8")
+    write_note(file_path, md_content)
     return file_path
 
 
-def create_notion_placeholder(output_folder: Path):
-    """Create a placeholder file when API is not available."""
+def create_notion_placeholder(output_folder: Path, page_id: str = NOTION_PAGE_ID) -> bool:
+    """
+    Create a placeholder file when API is not available, unless a synced one exists.
+
+    Returns:
+        True if the placeholder was written, False if synced content was kept
+    """
     now = datetime.now().isoformat(timespec="seconds")
-    source_url = f"https://www.notion.so/{NOTION_PAGE_ID.replace('-', '')}"
+    source_url = f"https://www.notion.so/{page_id.replace('-', '')}"
 
     md_content = f"""---
 source: notion
 source_url: {source_url}
-source_id: "{NOTION_PAGE_ID}"
+source_id: "{page_id}"
 title: "Sharity Documentation"
 synced_at: {now}
+placeholder: true
 tags:
   - sharity
   - notion
@@ -323,21 +1095,84 @@ _Source: [Notion]({source_url})_
 """
 
     file_path = output_folder / "index.md"
-    file_path.write_text(md_content, encoding="utf-8")
-    print(f"   ✅ Created placeholder: {file_path.name}")
+    if write_placeholder(file_path, md_content):
+        print(f"   ✅ Created placeholder: {file_path.name}")
+        return True
+    print(f"   ⚠️  Keeping the last synced {file_path.name} instead of a placeholder")
+    return False
+
+
+def plan_sync(output_folder: Path, page_id: str = NOTION_PAGE_ID) -> dict:
+    """
+    Plan a sync without fetching any page (see sync_plan).
 
+    The notes already in the folder list the pages a sync refetches; one
+    search, paged only as far back as the oldest of them, tells which were
+    edited since and which child pages are new. The search reads at most
+    NOTION_PLAN_SEARCH_PAGES pages, so a folder synced long ago (or never)
+    doesn't crawl the whole workspace; pages past that are "unknown".
 
-def sync_notion(output_folder: Path, force: bool = False) -> bool:
+    A Notion sync refetches every page whether forced or not, so the
+    planner takes no force argument.
+    """
+    if not get_notion_token():
+        return {"items": [], "requests": 0, "skip": True, "note": "NOTION_TOKEN not set; would write a placeholder"}
+    if requests is None:
+        return {"items": [], "requests": 0, "skip": True, "note": "requests library not installed"}
+
+    root_id = page_id.replace("-", "")
+    notes = {source_id.replace("-", ""): note for source_id, note in synced_notes(output_folder, "notion").items()}
+    synced = [note["synced_at"] for note in notes.values() if note["synced_at"]]
+    found = get_edited_pages(min(synced) if synced else None, NOTION_PLAN_SEARCH_PAGES)
+    searched = found is not None and found[1]
+    edited = {page["id"]: page for page in found[0]} if found else {}
+    if found is None:
+        note = "Notion search failed; edits unknown"
+    elif not searched:
+        note = f"Searched only the {len(edited)} most recently edited pages; older edits and new pages may be missing"
+    else:
+        note = ""
+
+    def state(page_id, synced_at):
+        if page_id in edited:
+            return item_state(edited[page_id]["last_edited_time"], synced_at)
+        if synced_at is None:
+            return "new"
+        return "unchanged" if searched else "unknown"
+
+    root = notes.pop(root_id, None)
+    items = [("Main page", state(root_id, root["synced_at"] if root else None))]
+    items += [(n["title"], state(child_id, n["synced_at"])) for child_id, n in notes.items()]
+    items += [
+        (page["title"], "new")
+        for page_id, page in edited.items()
+        if page["parent_id"] == root_id and page_id not in notes
+    ]
+    if not notes:
+        note = note or "No synced child pages yet; a first sync finds them as it goes"
+
+    # The page itself, then at least one block list per page; nested
+    # blocks and long pages add more
+    return {"items": items, "requests": 1 + len(items), "skip": False, "note": note}
+
+
+def sync_notion(output_folder: Path, force: bool = False, page_id: str = NOTION_PAGE_ID) -> bool:
     """
     Sync Notion pages to Obsidian.
 
     Args:
         output_folder: Path to output folder in Obsidian
         force: Force update even if cache is fresh
+        page_id: Root Notion page to sync
 
     Returns:
         True if successful, False otherwise
     """
+    return run_with_client(sync_notion_async(output_folder, force, page_id))
+
+
+async def sync_notion_async(output_folder: Path, force: bool = False, page_id: str = NOTION_PAGE_ID) -> bool:
+    """Async implementation of sync_notion."""
     token = get_notion_token()
     if not token:
         print("   ⚠️  NOTION_TOKEN not set")
@@ -348,61 +1183,140 @@ def sync_notion(output_folder: Path, force: bool = False) -> bool:
 
         # Create placeholder file
         output_folder.mkdir(parents=True, exist_ok=True)
-        create_notion_placeholder(output_folder)
+        create_notion_placeholder(output_folder, page_id)
         return True
 
-    if requests is None:
+    if requests is None and httpx is None:
         print("   ❌ requests library not installed")
         print("   Run: pip install requests")
         return False
 
     print(f"   Fetching main page...")
 
-    # Fetch main page
-    page = get_page(NOTION_PAGE_ID)
+    # Fetch main page and its block tree together
+    page, tree = await asyncio.gather(
+        get_page_async(page_id),
+        get_block_tree_async(page_id),
+    )
     if not page:
         return False
+    if circuit_open("notion"):
+        print("   ⚠️  Notion is unavailable, keeping the last synced pages")
+        return False
+    if tree is None:
+        # Child pages are listed in these blocks, so nothing can be synced
+        print("   ⚠️  Could not fetch all of the main page's blocks, keeping the last synced pages")
+        return False
+    blocks, children = tree
 
     # Get page title
     title_prop = page.get("properties", {}).get("title", {})
     title_array = title_prop.get("title", [])
     main_title = "".join([t.get("plain_text", "") for t in title_array]) or "Sharity Documentation"
+    main_fields = property_fields(page_properties(page), "notion")
 
-    # Fetch blocks
-    blocks = get_page_blocks(NOTION_PAGE_ID)
-    content = blocks_to_markdown(blocks)
+    # Rows of embedded databases come from their queries; no page is
+    # fetched on its own for its properties
+    previous_rows = indexed_database_rows(output_folder)
+    rows, rows_complete = await attach_database_rows_async(blocks, children, previous_rows)
+
+    with span("render"):
+        content = blocks_to_markdown(blocks, children)
 
     # Save main page as index
-    source_url = f"https://www.notion.so/{NOTION_PAGE_ID.replace('-', '')}"
-    index_path = save_page_to_obsidian(
-        NOTION_PAGE_ID,
-        "index",
-        f"**{main_title}**\n\n{content}",
-        output_folder,
-        source_url,
-    )
+    source_url = f"https://www.notion.so/{page_id.replace('-', '')}"
+    with span("write"):
+        index_path = save_page_to_obsidian(
+            page_id,
+            "index",
+            f"**{main_title}**\n\n{content}",
+            output_folder,
+            source_url,
+            main_fields,
+        )
     print(f"   ✅ Saved: {index_path.name}")
+    indexed = [{
+        "id": page_id.replace("-", ""),
+        "title": main_title,
+        "url": source_url,
+        "note": index_path.name,
+        "parent": None,
+        "properties": main_fields,
+    }]
+
+    # Fetch all child pages concurrently; the semaphore and rate limiter
+    # keep this within Notion's limits
+    child_pages = child_pages_from_blocks(blocks)
+    if child_pages:
+        print(f"   Fetching {len(child_pages)} child page(s)...")
+    trees = await asyncio.gather(*(get_block_tree_async(child["id"]) for child in child_pages))
+    child_rows = await asyncio.gather(
+        *(attach_database_rows_async(*tree, previous_rows) for tree in trees if tree is not None)
+    )
+    if circuit_open("notion"):
+        print("   ⚠️  Notion is unavailable, keeping the last synced child pages")
+        return False
 
-    # Get and sync child pages
-    child_pages = get_child_pages(NOTION_PAGE_ID)
-    for child in child_pages:
-        print(f"   Fetching: {child['title']}...")
-
-        child_blocks = get_page_blocks(child["id"])
-        child_content = blocks_to_markdown(child_blocks)
-
+    complete = True
+    for child, tree in zip(child_pages, trees):
         child_url = f"https://www.notion.so/{child['id'].replace('-', '')}"
-        child_path = save_page_to_obsidian(
-            child["id"],
-            child["title"],
-            child_content,
-            output_folder,
-            child_url,
-        )
+        if tree is None:
+            # Keep the last synced note rather than write a truncated page
+            complete = False
+            kept_path = output_folder / (sanitize_filename(child["title"]) + ".md")
+            print(f"   ⚠️  Could not fetch all blocks of {child['title']}, keeping its last synced note")
+            indexed.append({
+                "id": child["id"].replace("-", ""),
+                "title": child["title"],
+                "url": child_url,
+                "note": kept_path.name if kept_path.exists() else None,
+                "parent": main_title,
+                "properties": {},
+            })
+            continue
+
+        child_blocks, child_children = tree
+        with span("render"):
+            child_content = blocks_to_markdown(child_blocks, child_children)
+
+        with span("write"):
+            child_path = save_page_to_obsidian(
+                child["id"],
+                child["title"],
+                child_content,
+                output_folder,
+                child_url,
+            )
         print(f"   ✅ Saved: {child_path.name}")
+        # Child pages only have a title; pages with properties are database rows
+        indexed.append({
+            "id": child["id"].replace("-", ""),
+            "title": child["title"],
+            "url": child_url,
+            "note": child_path.name,
+            "parent": main_title,
+            "properties": {},
+        })
+
+    for found, queried in ((rows, rows_complete), *child_rows):
+        indexed.extend(found)
+        # Databases that kept their last indexed rows still failed
+        complete = complete and queried
+    if None in trees:
+        # Databases in the pages that kept their last synced note weren't
+        # queried; keep their rows too
+        queried_ids = set(children).union(*(tree[1] for tree in trees if tree is not None))
+        for database_id, kept in previous_rows.items():
+            if database_id not in queried_ids:
+                indexed.extend(kept)
+    with span("write"):
+        save_property_index(output_folder, "notion", indexed)
+    if len(indexed) > 1 + len(child_pages):
+        print(f"   🏷️  Indexed the properties of {len(indexed) - 1 - len(child_pages)} database row(s)")
 
     print(f"   📁 Synced to: {output_folder}")
-    return True
+    # Pages that kept their last synced note still failed
+    return complete
 
 
 if __name__ == "__main__":
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Dry-run planning for the sync.
+
+`sync_docs.py --plan` asks each selected target's source what a sync would
+fetch, using only its cheapest probe (a Notion search delta, a Miro
+board's modifiedAt, a Figma file's version) and what the last sync left on
+disk. It then estimates the requests, bytes and time the sync would take
+from the run history and the current rate limits. Nothing is written.
+
+Each source module provides a planner, plan_sync(output_folder, force,
+...) taking the same target arguments as its sync (and no force if the
+source registers planner_takes_force=False), which returns a dict with:
+    items: (name, state) pairs for the pages, boards or files the sync
+        would fetch; state is "new", "edited", "unchanged" or "unknown"
+    requests: the fewest requests the sync would send; shown as a lower
+        bound unless past runs give a better estimate
+    skip: True if the sync would stop after its own probe
+    note: anything worth knowing, e.g. a missing token
+"""
+import math
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sync_search import split_frontmatter
+
+PLAN_MAX_ITEMS = 15  # Items listed per target; the rest are counted
+
+ITEM_ICONS = {
+    "new": "🆕",
+    "edited": "✏️ ",
+    "unchanged": "💤",
+    "unknown": "❔",
+}
+
+
+def parse_timestamp(value: str | None) -> datetime | None:
+    """Parse an API or synced_at timestamp, in UTC; naive ones are local time."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed.astimezone(timezone.utc)
+
+
+def synced_notes(folder: Path, source: str) -> dict:
+    """
+    Read what the last sync of a folder wrote, from its notes' frontmatter.
+
+    Returns:
+        Map of source_id -> dict with path, title, synced_at (UTC) and the
+        whole frontmatter as meta; placeholders are skipped
+    """
+    notes = {}
+    if not folder.exists():
+        return notes
+    for path in sorted(folder.glob("*.md")):
+        try:
+            meta, _ = split_frontmatter(path.read_text(encoding="utf-8", errors="replace"))
+        except OSError:
+            continue
+        if meta.get("source") != source or not meta.get("source_id") or meta.get("placeholder") == "true":
+            continue
+        notes[meta["source_id"]] = {
+            "path": path,
+            "title": meta.get("title") or path.stem,
+            "synced_at": parse_timestamp(meta.get("synced_at")),
+            "meta": meta,
+        }
+    return notes
+
+
+def item_state(modified_at: datetime | None, synced_at: datetime | None) -> str:
+    """Whether something changed since it was synced, from its timestamps."""
+    if synced_at is None:
+        return "new"
+    if modified_at is None:
+        return "unknown"
+    return "edited" if modified_at > synced_at else "unchanged"
+
+
+def estimate(plan: dict, history: dict | None, rate: float) -> dict:
+    """
+    Estimate what a planned target will cost.
+
+    The planner's request count is a floor; past synced runs of the target
+    (medians from sync_history.target_estimates) usually know better, and
+    are the only source for bytes. Duration is at least what the requests
+    take at the source's rate limit.
+
+    Returns:
+        Dict with requests, bytes (None if unknown) and duration
+    """
+    if plan["cached"]:
+        return {"requests": 0, "bytes": 0, "duration": 0.0}
+    requests = plan["requests"]
+    if plan["skip"] or not history:
+        return {"requests": requests, "bytes": None, "duration": requests / rate}
+    requests = max(requests, round(history["requests"]))
+    return {
+        "requests": requests,
+        "bytes": history["bytes"],
+        "duration": max(requests / rate, history["duration"]),
+    }
+
+
+def format_bytes(size: float | None) -> str:
+    return "?" if size is None else f"{size / 1e6:.1f} MB"
+
+
+def show_plan(plans: list, history: dict, rates: dict, force: bool):
+    """
+    Print what a sync would fetch and what it would cost.
+
+    Args:
+        plans: Per-target plans from sync_docs.plan_target
+        history: Past costs by target, from sync_history.target_estimates
+        rates: Requests per second allowed by source
+        force: Whether the planned sync ignores cache freshness
+    """
+    print(f"\n🗺️  Sync plan{' (--force)' if force else ''}: nothing will be fetched or written\n")
+
+    by_source = {}
+    probes = 0
+    for plan in plans:
+        source = plan["source"]
+        cost = estimate(plan, history.get(plan["target"]), rates[source])
+        probes += plan["probe"]["requests"]
+
+        totals = by_source.setdefault(source, {"targets": 0, "requests": 0, "bytes": 0, "longest": 0.0})
+        totals["targets"] += 1
+        totals["requests"] += cost["requests"]
+        totals["longest"] = max(totals["longest"], cost["duration"])
+        if totals["bytes"] is not None:
+            totals["bytes"] = None if cost["bytes"] is None else totals["bytes"] + cost["bytes"]
+
+        changed = sum(1 for _, state in plan["items"] if state in ("new", "edited"))
+        print(f"{plan['target']} ({source}): {len(plan['items'])} item(s), {changed} new or edited")
+        for name, state in plan["items"][:PLAN_MAX_ITEMS]:
+            print(f"   {ITEM_ICONS.get(state, '❔')} {name}  {state}")
+        if len(plan["items"]) > PLAN_MAX_ITEMS:
+            print(f"   … and {len(plan['items']) - PLAN_MAX_ITEMS} more")
+        if plan["note"]:
+            print(f"   ℹ️  {plan['note']}")
+
+        past = history.get(plan["target"])
+        basis = f"median of {past['runs']} past run(s)" if past and not (plan["cached"] or plan["skip"]) else "probe only"
+        # Without past runs a sync's requests are only known to be at least the planner's floor
+        bound = "≥" if basis == "probe only" and not (plan["cached"] or plan["skip"]) else "~"
+        print(
+            f"   {bound}{cost['requests']} request(s), {format_bytes(cost['bytes'])}, "
+            f"{bound}{cost['duration']:.1f}s at {rates[source]:g}/s ({basis})\n"
+        )
+
+    print(f"{'source':<10}{'targets':>8}{'requests':>10}{'size':>11}{'rate':>8}{'quota':>10}")
+    print("-" * 57)
+    expected = 0.0
+    for source, totals in sorted(by_source.items()):
+        # A source's targets share its rate limiter
+        quota = totals["requests"] / rates[source]
+        expected = max(expected, quota, totals["longest"])
+        print(
+            f"{source:<10}{totals['targets']:>8}{totals['requests']:>10}{format_bytes(totals['bytes']):>11}"
+            f"{rates[source]:>6g}/s{quota:>9.1f}s"
+        )
+    print("-" * 57)
+    print(f"\nExpected duration: ~{math.ceil(expected)}s (sources run side by side)")
+    print(f"Planning used {probes} request(s)")
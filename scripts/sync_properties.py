@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Page properties: typed frontmatter and per-target property indexes.
+
+Sources that know a page's properties (a Notion page's status, assignees,
+dates, relations) write them into its note's frontmatter as typed YAML,
+and into a compact JSON index in the target's folder, so pages can be
+filtered by property (`sync_docs.py --where status=Done`) without opening
+every note. The index also lists pages that have no note of their own,
+such as the rows of a Notion database.
+"""
+import json
+import re
+from datetime import datetime
+from pathlib import Path
+
+PROPERTY_INDEX_NAME = ".sync-properties.json"
+PROPERTY_INDEX_VERSION = 1
+
+# Frontmatter keys the sync writes itself; properties named like these
+# get the source's name as a prefix
+RESERVED_KEYS = {"source", "source_url", "source_id", "title", "synced_at", "placeholder", "tags"}
+
+# Dates and date-times stay bare, so YAML and Obsidian read them as dates
+DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}(T\d{2}:\d{2}(:\d{2}(\.\d+)?)?(Z|[+-]\d{2}:\d{2})?)?")
+
+
+def property_key(name: str) -> str:
+    """Turn a property name into a frontmatter key: "Due date" -> "due_date"."""
+    return re.sub(r"[^0-9a-z]+", "_", name.lower()).strip("_") or "property"
+
+
+def property_fields(properties: dict, source: str) -> dict:
+    """
+    Key a page's properties for frontmatter and the index.
+
+    Args:
+        properties: Property name -> typed value (str, number, bool, list
+            or None)
+        source: Prefix for properties that clash with the sync's own keys
+
+    Returns:
+        Frontmatter key -> value, in the properties' order
+    """
+    fields = {}
+    for name, value in properties.items():
+        key = property_key(name)
+        if key in RESERVED_KEYS:
+            key = f"{source}_{key}"
+        base, n = key, 2
+        while key in fields:
+            key = f"{base}_{n}"
+            n += 1
+        fields[key] = value
+    return fields
+
+
+def yaml_scalar(value) -> str:
+    """Render a value as a YAML scalar of its type."""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    text = str(value)
+    if DATE_PATTERN.fullmatch(text):
+        return text
+    # JSON strings are valid double-quoted YAML
+    return json.dumps(text, ensure_ascii=False)
+
+
+def frontmatter_lines(fields: dict | None) -> str:
+    """
+    Render property fields as frontmatter lines, each ending in a newline.
+
+    Lists become block sequences, like the sync's tags; empty values are
+    left out.
+    """
+    lines = []
+    for key, value in (fields or {}).items():
+        if value is None or value == "":
+            continue
+        if isinstance(value, list):
+            if not value:
+                lines.append(f"{key}: []")
+                continue
+            lines.append(f"{key}:")
+            lines.extend(f"  - {yaml_scalar(item)}" for item in value)
+        else:
+            lines.append(f"{key}: {yaml_scalar(value)}")
+    return "".join(line + "\n" for line in lines)
+
+
+def save_property_index(folder: Path, source: str, pages: list) -> Path:
+    """
+    Write a target's property index, replacing the last one.
+
+    Args:
+        folder: The target's output folder
+        source: Source the pages come from
+        pages: Dicts with id, title, url, note (path relative to the
+            folder, or None if the page has no note), parent (title of the
+            page or database it belongs to), database (id of the database,
+            for its rows) and properties (see property_fields)
+
+    Returns:
+        Path of the index
+    """
+    folder.mkdir(parents=True, exist_ok=True)
+    path = folder / PROPERTY_INDEX_NAME
+    index = {
+        "version": PROPERTY_INDEX_VERSION,
+        "source": source,
+        "updated_at": datetime.now().isoformat(timespec="seconds"),
+        "pages": pages,
+    }
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(json.dumps(index, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+    tmp_path.replace(path)
+    return path
+
+
+def load_property_index(folder: Path) -> dict | None:
+    """Read a target's property index; None if it has none or it's unreadable."""
+    try:
+        index = json.loads((folder / PROPERTY_INDEX_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(index, dict) or index.get("version") != PROPERTY_INDEX_VERSION:
+        return None
+    return index
+
+
+def parse_condition(text: str) -> tuple[str, str, str]:
+    """
+    Parse a --where condition: "key=value", "key!=value", or "key" for
+    pages where the property is set.
+
+    Returns:
+        (key, operator, value), the key normalized like property_key
+    """
+    for operator in ("!=", "="):
+        name, sep, value = text.partition(operator)
+        if sep:
+            return property_key(name), operator, value.strip()
+    return property_key(text), "set", ""
+
+
+def value_matches(value, wanted: str) -> bool:
+    """Whether a property value equals a condition's value; lists match any item."""
+    if isinstance(value, list):
+        return any(value_matches(item, wanted) for item in value)
+    if isinstance(value, bool):
+        return wanted.lower() == ("true" if value else "false")
+    if isinstance(value, (int, float)):
+        try:
+            return value == float(wanted)
+        except ValueError:
+            return False
+    return value is not None and str(value).casefold() == wanted.casefold()
+
+
+def page_matches(page: dict, conditions: list, source: str) -> bool:
+    """Whether an index entry meets all (key, operator, value) conditions."""
+    properties = page.get("properties") or {}
+    for key, operator, wanted in conditions:
+        if key == "title":
+            value = page.get("title")
+        else:
+            value = properties.get(f"{source}_{key}" if key in RESERVED_KEYS else key)
+        if operator == "set":
+            if value is None or value == "" or value == []:
+                return False
+        elif value_matches(value, wanted) != (operator == "="):
+            return False
+    return True
+
+
+def filter_pages(index: dict, conditions: list) -> list:
+    """A property index's entries meeting all conditions, from parse_condition."""
+    return [page for page in index["pages"] if page_matches(page, conditions, index["source"])]
+
+
+def show_where(targets: list, conditions: list):
+    """
+    Print the pages of targets whose properties meet all conditions.
+
+    Targets without a property index (not synced yet, or a source that
+    doesn't write one) are skipped.
+    """
+    parsed = [parse_condition(condition) for condition in conditions]
+    described = " and ".join(conditions)
+    found = 0
+    indexed = 0
+    lines = []
+    for target in targets:
+        index = load_property_index(target["folder"])
+        if index is None:
+            continue
+        indexed += 1
+        matches = filter_pages(index, parsed)
+        found += len(matches)
+        if matches:
+            lines.append(f"{target['name']} ({target['source']}), indexed {index['updated_at']}:")
+        for page in matches:
+            where = page["note"] or page["url"]
+            parent = f"  in {page['parent']}" if page.get("parent") else ""
+            lines.append(f"   - {page['title']}{parent}  {where}")
+
+    print(f"\n🏷️  {found} page(s) where {described}\n")
+    for line in lines:
+        print(line)
+    if not indexed:
+        print("   ⚠️  None of these targets has a property index yet; sync Notion first")
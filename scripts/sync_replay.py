@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+"""
+Record/replay stand-in for the Notion, Miro and Figma APIs.
+
+In record mode, real API responses are captured as JSON fixtures, one file
+per request, with API tokens scrubbed. In replay mode the fixtures are
+served in place of the network, so syncs can be run, regression-tested and
+benchmarked offline and deterministically.
+
+Both modes plug in below the request helpers: sync_http builds its sessions
+and async clients on the transports defined here. Enable with
+SYNC_RECORD_DIR or SYNC_REPLAY_DIR (sync_docs.py --record / --replay).
+Replay is tuned with:
+    SYNC_REPLAY_LATENCY     Mean seconds per response, jittered ±50%
+    SYNC_REPLAY_429_RATE    Fraction of requests answered with a 429
+    SYNC_REPLAY_PAGE_SIZE   Split recorded list responses into pages this long
+    SYNC_REPLAY_SEED        Seed for the latency jitter and 429 injection
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+try:
+    import requests
+    from requests.adapters import BaseAdapter, HTTPAdapter
+    from requests.structures import CaseInsensitiveDict
+except ImportError:
+    requests = None
+    BaseAdapter = HTTPAdapter = object
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# Tokens to scrub from recordings, and to stand in for when replaying
+TOKEN_ENV_VARS = ("NOTION_TOKEN", "MIRO_ACCESS_TOKEN", "FIGMA_ACCESS_TOKEN")
+REPLAY_TOKEN = "replay"
+REDACTED = "<redacted>"
+
+# Response headers worth keeping; the rest describe the original transfer
+FIXTURE_HEADERS = ("content-type", "retry-after")
+
+# Hosts that rate-limit, and so get injected 429s; file downloads from
+# CDNs are replayed as recorded
+API_HOSTS = ("api.notion.com", "api.miro.com", "api.figma.com")
+REPLAY_RETRY_AFTER = 0.05  # Seconds injected 429s ask clients to wait
+REPLAY_CURSOR_PREFIX = "replay"
+
+# How each API pages its lists: the request's cursor parameter, where the
+# items sit in the response (* = the first list found there), and where the
+# response points at the next page. Figma only pages team libraries.
+PAGINATION = {
+    "api.notion.com": {
+        "param": "start_cursor",
+        "items": "results",
+        "next": "next_cursor",
+        "more": "has_more",
+    },
+    "api.miro.com": {
+        "param": "cursor",
+        "items": "data",
+        "next": "cursor",
+    },
+    "api.figma.com": {
+        "param": "after",
+        "items": "meta.*",
+        "next": "meta.cursor.after",
+        "paths": ("/v1/teams/",),
+    },
+}
+
+
+def get_path(data, path: str):
+    """Look up a dotted path in nested dicts; * picks the first list."""
+    for key in path.split("."):
+        if not isinstance(data, dict):
+            return None
+        if key == "*":
+            data = next((value for value in data.values() if isinstance(value, list)), None)
+        else:
+            data = data.get(key)
+    return data
+
+
+def set_path(data: dict, path: str, value):
+    """Set a dotted path in nested dicts, creating levels; None deletes it."""
+    *parents, last = path.split(".")
+    for key in parents:
+        if key == "*":
+            key = next((k for k, v in data.items() if isinstance(v, list)), key)
+        data = data.setdefault(key, {})
+    if last == "*":
+        last = next((k for k, v in data.items() if isinstance(v, list)), last)
+    if value is None:
+        data.pop(last, None)
+    else:
+        data[last] = value
+
+
+def canonical_body(body) -> str:
+    """Normalise a request body so equivalent bodies share a fixture."""
+    if not body:
+        return ""
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", "replace")
+    try:
+        return json.dumps(json.loads(body), sort_keys=True)
+    except ValueError:
+        return body
+
+
+def canonical_url(url: str) -> str:
+    """Sort a URL's query so parameter order doesn't change its fixture."""
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, query, ""))
+
+
+def request_key(method: str, url: str, body) -> str:
+    """Stable id of a request: method, canonical URL and body."""
+    text = f"{method.upper()} {canonical_url(url)}\n{canonical_body(body)}"
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:20]
+
+
+def scrub(text: str) -> str:
+    """Replace any API token found in the text."""
+    for name in TOKEN_ENV_VARS:
+        token = os.environ.get(name)
+        if token and token != REPLAY_TOKEN:
+            text = text.replace(token, REDACTED)
+    return text
+
+
+class FixtureStore:
+    """Fixtures on disk, recorded from or replayed in place of the APIs."""
+
+    def __init__(
+        self,
+        mode: str,
+        folder: Path,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        page_size: int = 0,
+        seed: int = 0,
+    ):
+        self.mode = mode
+        self.folder = Path(folder)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.page_size = page_size
+        self.seed = seed
+        self.seen = {}
+        self.lock = threading.Lock()
+
+    def path(self, method: str, url: str, body) -> Path:
+        """Fixture file of a request, grouped by host."""
+        host = urlsplit(url).netloc or "local"
+        return self.folder / host / f"{request_key(method, url, body)}.json"
+
+    def record(self, method: str, url: str, body, status: int, headers, content: bytes):
+        """Save a response as the fixture of its request."""
+        fixture = {
+            "method": method.upper(),
+            "url": canonical_url(url),
+            "body": canonical_body(body) or None,
+            "status": status,
+            "headers": {k.lower(): v for k, v in headers.items() if k.lower() in FIXTURE_HEADERS},
+        }
+        try:
+            fixture["json"] = json.loads(content) if content else None
+        except ValueError:
+            fixture["base64"] = base64.b64encode(content).decode("ascii")
+
+        path = self.path(method, url, body)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(scrub(json.dumps(fixture, indent=2, ensure_ascii=False)), encoding="utf-8")
+        tmp_path.replace(path)
+
+    def load(self, method: str, url: str, body) -> dict | None:
+        """Load the fixture of a request, if one was recorded."""
+        path = self.path(method, url, body)
+        if not path.exists():
+            return None
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    def draw(self, method: str, url: str, body) -> random.Random:
+        """
+        Random source for one request.
+
+        Seeded by the request and how often it has been seen, so injected
+        errors and latencies don't depend on the order concurrent requests
+        happen to arrive in.
+        """
+        key = request_key(method, url, body)
+        with self.lock:
+            count = self.seen.get(key, 0)
+            self.seen[key] = count + 1
+        return random.Random(f"{self.seed}:{key}:{count}")
+
+    def delay(self, rng: random.Random) -> float:
+        """Simulated latency for a response."""
+        return self.latency * rng.uniform(0.5, 1.5) if self.latency else 0.0
+
+    def respond(self, method: str, url: str, body, rng: random.Random) -> tuple[int, dict, bytes]:
+        """
+        Build the replayed response to a request.
+
+        Returns:
+            Status code, headers and body
+        """
+        parts = urlsplit(url)
+        if self.error_rate and parts.netloc in API_HOSTS and rng.random() < self.error_rate:
+            payload = {"message": "Rate limited (injected by replay)"}
+            headers = {"content-type": "application/json", "retry-after": str(REPLAY_RETRY_AFTER)}
+            return 429, headers, json.dumps(payload).encode("utf-8")
+
+        spec = PAGINATION.get(parts.netloc)
+        if spec and not parts.path.startswith(spec.get("paths", ("/",))):
+            spec = None
+
+        # Follow-up pages of a split response carry a synthetic cursor that
+        # names the offset and the cursor the recorded request was sent with
+        offset = 0
+        if spec:
+            cursor = request_cursor(url, body, spec["param"])
+            if cursor and cursor.startswith(f"{REPLAY_CURSOR_PREFIX}-"):
+                _, offset, original = cursor.split("-", 2)
+                offset = int(offset)
+                url, body = with_cursor(url, body, spec["param"], original or None)
+
+        fixture = self.load(method, url, body)
+        if fixture is None:
+            payload = {"message": f"No recorded fixture for {method.upper()} {canonical_url(url)}"}
+            return 404, {"content-type": "application/json"}, json.dumps(payload).encode("utf-8")
+
+        headers = dict(fixture.get("headers") or {})
+        if "base64" in fixture:
+            return fixture["status"], headers, base64.b64decode(fixture["base64"])
+
+        data = fixture.get("json")
+        if spec and self.page_size and fixture["status"] == 200:
+            data = paginate(data, spec, offset, self.page_size, request_cursor(url, body, spec["param"]))
+        headers.setdefault("content-type", "application/json")
+        return fixture["status"], headers, json.dumps(data).encode("utf-8")
+
+
+def request_cursor(url: str, body, param: str) -> str | None:
+    """Get the pagination cursor a request was sent with."""
+    for key, value in parse_qsl(urlsplit(url).query):
+        if key == param:
+            return value
+    if body:
+        try:
+            return json.loads(body).get(param)
+        except (ValueError, AttributeError):
+            return None
+    return None
+
+
+def with_cursor(url: str, body, param: str, cursor: str | None) -> tuple[str, bytes | None]:
+    """Rewrite a request's pagination cursor, removing it if None."""
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != param]
+    if cursor and not body:
+        query.append((param, cursor))
+    url = urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ""))
+
+    if body:
+        data = json.loads(body)
+        data.pop(param, None)
+        if cursor:
+            data[param] = cursor
+        body = json.dumps(data).encode("utf-8")
+    return url, body
+
+
+def paginate(data, spec: dict, offset: int, page_size: int, original: str | None):
+    """
+    Serve one page of a recorded list response.
+
+    Pages before the last point at the next with a synthetic cursor; the
+    last keeps the recording's own cursor, so recorded pages still chain.
+    """
+    items = get_path(data, spec["items"])
+    if not isinstance(items, list):
+        return data
+
+    data = json.loads(json.dumps(data))
+    set_path(data, spec["items"], items[offset:offset + page_size])
+    if offset + page_size < len(items):
+        set_path(data, spec["next"], f"{REPLAY_CURSOR_PREFIX}-{offset + page_size}-{original or ''}")
+        if "more" in spec:
+            data[spec["more"]] = True
+    return data
+
+
+class ReplayAdapter(BaseAdapter):
+    """requests transport adapter serving fixtures."""
+
+    def __init__(self, store: FixtureStore):
+        super().__init__()
+        self.store = store
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        rng = self.store.draw(request.method, request.url, request.body)
+        time.sleep(self.store.delay(rng))
+        status, headers, content = self.store.respond(request.method, request.url, request.body, rng)
+
+        response = requests.Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(headers)
+        response._content = content
+        response._content_consumed = True
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class RecordingAdapter(HTTPAdapter):
+    """requests transport adapter saving every response as a fixture."""
+
+    def __init__(self, store: FixtureStore, **kwargs):
+        super().__init__(**kwargs)
+        self.store = store
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        self.store.record(
+            request.method, request.url, request.body,
+            response.status_code, response.headers, response.content,
+        )
+        return response
+
+
+def replay_transport(store: FixtureStore):
+    """httpx async transport serving fixtures."""
+
+    async def handler(request):
+        body = request.content
+        rng = store.draw(request.method, str(request.url), body)
+        await asyncio.sleep(store.delay(rng))
+        status, headers, content = store.respond(request.method, str(request.url), body, rng)
+        return httpx.Response(status, headers=headers, content=content)
+
+    return httpx.MockTransport(handler)
+
+
+def recording_transport(store: FixtureStore):
+    """httpx async transport saving every response as a fixture."""
+    network = httpx.AsyncHTTPTransport()
+
+    async def handler(request):
+        response = await network.handle_async_request(request)
+        content = await response.aread()
+        await response.aclose()
+        store.record(request.method, str(request.url), request.content, response.status_code, response.headers, content)
+        headers = {k: v for k, v in response.headers.items() if k.lower() in FIXTURE_HEADERS}
+        return httpx.Response(response.status_code, headers=headers, content=content)
+
+    return httpx.MockTransport(handler)
+
+
+_store: FixtureStore | None = None
+_configured = False
+
+
+def configure(
+    record_dir: Path | None = None,
+    replay_dir: Path | None = None,
+    latency: float | None = None,
+    error_rate: float | None = None,
+    page_size: int | None = None,
+    seed: int | None = None,
+) -> FixtureStore | None:
+    """
+    Switch recording or replaying on, falling back to the SYNC_* variables.
+
+    Call before the first request; sessions and clients already built keep
+    their transports. Replaying fills in stand-in API tokens where none are
+    set, since the fixtures don't need them.
+
+    Returns:
+        The fixture store in use, or None to use the network
+
+    Raises:
+        ValueError: If both recording and replaying are asked for
+    """
+    global _store, _configured
+    record_dir = record_dir or os.environ.get("SYNC_RECORD_DIR")
+    replay_dir = replay_dir or os.environ.get("SYNC_REPLAY_DIR")
+    if record_dir and replay_dir:
+        raise ValueError("cannot record and replay at the same time")
+
+    _configured = True
+    _store = None
+    if record_dir:
+        _store = FixtureStore("record", Path(record_dir).expanduser())
+    elif replay_dir:
+        _store = FixtureStore(
+            "replay",
+            Path(replay_dir).expanduser(),
+            latency=float(os.environ.get("SYNC_REPLAY_LATENCY", 0)) if latency is None else latency,
+            error_rate=float(os.environ.get("SYNC_REPLAY_429_RATE", 0)) if error_rate is None else error_rate,
+            page_size=int(os.environ.get("SYNC_REPLAY_PAGE_SIZE", 0)) if page_size is None else page_size,
+            seed=int(os.environ.get("SYNC_REPLAY_SEED", 0)) if seed is None else seed,
+        )
+        for name in TOKEN_ENV_VARS:
+            os.environ.setdefault(name, REPLAY_TOKEN)
+    return _store
+
+
+def get_store() -> FixtureStore | None:
+    """Get the active fixture store, configuring from the environment once."""
+    if not _configured:
+        configure()
+    return _store
+
+
+def get_adapter(**pool_kwargs):
+    """
+    Get the requests adapter for sessions, or None for the network.
+
+    Args:
+        pool_kwargs: Connection pool settings for a recording adapter
+    """
+    store = get_store()
+    if store is None or requests is None:
+        return None
+    if store.mode == "replay":
+        return ReplayAdapter(store)
+    return RecordingAdapter(store, **pool_kwargs)
+
+
+def get_async_transport():
+    """Get the httpx transport for async clients, or None for the network."""
+    store = get_store()
+    if store is None or httpx is None:
+        return None
+    if store.mode == "replay":
+        return replay_transport(store)
+    return recording_transport(store)
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Full-text search over the synced vault.
+
+The sync modules write their notes through write_note(), which keeps a
+SQLite FTS5 index of the vault up to date as they go: a note is only
+re-indexed when its content changed (sync timestamps aside), and notes the
+sync removes are dropped. There is no separate re-index pass; a new index
+picks up the notes already in the vault once, when it is created.
+
+The index lives next to the run history, outside the vault: a WAL
+database and its side files don't belong in a folder iCloud syncs.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from sync_history import VOLATILE_PREFIXES
+
+SEARCH_INDEX_NAME = ".sync-search.db"
+SEARCH_LIMIT = 20
+SNIPPET_TOKENS = 16
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    source TEXT NOT NULL,
+    source_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    updated TEXT NOT NULL,
+    digest TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+    title, body, tokenize='porter unicode61 remove_diacritics 2'
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+_index = None
+
+
+class SearchIndex:
+    """A vault's search index; writes may come from several threads."""
+
+    def __init__(self, vault_folder: Path, path: Path):
+        self.vault_folder = vault_folder
+        self.path = path
+        vault_folder.mkdir(parents=True, exist_ok=True)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.lock = threading.Lock()
+        self.conn.executescript(SCHEMA)
+
+        # Paths are relative to the vault; an index of another vault starts over
+        vault = str(vault_folder.resolve())
+        with self.conn:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'vault'").fetchone()
+            if row and row[0] != vault:
+                self.conn.execute("DELETE FROM notes_fts")
+                self.conn.execute("DELETE FROM notes")
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('vault', ?)", (vault,))
+
+    def key(self, file_path: Path) -> str | None:
+        """A note's path relative to the vault, or None if it lies outside."""
+        try:
+            return file_path.resolve().relative_to(self.vault_folder.resolve()).as_posix()
+        except ValueError:
+            return None
+
+    def update(self, file_path: Path, content: str) -> bool:
+        """
+        Index a note, unless it is unchanged since it was last indexed.
+
+        Returns:
+            True if the index changed
+        """
+        key = self.key(file_path)
+        if key is None:
+            return False
+        meta, body = split_frontmatter(content)
+        digest = note_digest(content)
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT id, digest FROM notes WHERE path = ?", (key,)).fetchone()
+            if row and row[1] == digest:
+                return False
+            if row:
+                self.conn.execute("DELETE FROM notes_fts WHERE rowid = ?", (row[0],))
+                self.conn.execute("DELETE FROM notes WHERE id = ?", (row[0],))
+            title = meta.get("title") or file_path.stem
+            cursor = self.conn.execute(
+                "INSERT INTO notes (path, source, source_id, title, updated, digest) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    meta.get("source", ""),
+                    meta.get("source_id", ""),
+                    title,
+                    meta.get("synced_at", ""),
+                    digest,
+                ),
+            )
+            self.conn.execute("INSERT INTO notes_fts (rowid, title, body) VALUES (?, ?, ?)", (cursor.lastrowid, title, body))
+        return True
+
+    def remove(self, file_path: Path) -> bool:
+        """Drop a note from the index; True if it was indexed."""
+        key = self.key(file_path)
+        if key is None:
+            return False
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT id FROM notes WHERE path = ?", (key,)).fetchone()
+            if not row:
+                return False
+            self.conn.execute("DELETE FROM notes_fts WHERE rowid = ?", row)
+            self.conn.execute("DELETE FROM notes WHERE id = ?", row)
+        return True
+
+    def prune(self, folder: Path) -> int:
+        """
+        Drop indexed notes under a folder that are no longer on disk.
+
+        Returns:
+            Number of notes dropped
+        """
+        prefix = self.key(folder)
+        if prefix is None:
+            return 0
+        with self.lock:
+            paths = [
+                row[0] for row in self.conn.execute(
+                    "SELECT path FROM notes WHERE path LIKE ? ESCAPE '\\'",
+                    (escape_like(prefix.rstrip("/") + "/") + "%" if prefix != "." else "%",),
+                )
+            ]
+        return sum(1 for path in paths if not (self.vault_folder / path).exists() and self.remove(self.vault_folder / path))
+
+    def is_empty(self) -> bool:
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM notes LIMIT 1").fetchone() is None
+
+    def add_folder(self, folder: Path) -> int:
+        """
+        Index the notes already in a folder; unchanged ones are skipped.
+
+        Returns:
+            Number of notes (re)indexed
+        """
+        return sum(
+            1
+            for path in sorted(folder.rglob("*.md"))
+            if not any(part.startswith(".") for part in path.relative_to(folder).parts)
+            and self.update(path, path.read_text(encoding="utf-8", errors="replace"))
+        )
+
+    def search(self, query: str, limit: int = SEARCH_LIMIT) -> list:
+        """
+        Rank notes matching a query; titles weigh more than bodies.
+
+        The query uses FTS5 syntax (phrases, prefix*, OR, NOT); if it does
+        not parse, its words are searched for literally instead.
+
+        Returns:
+            List of dicts with path, title, source, source_id, updated and
+            snippet, best match first
+        """
+        sql = (
+            "SELECT notes.path, notes.title, notes.source, notes.source_id, notes.updated, "
+            f"snippet(notes_fts, 1, '«', '»', '…', {SNIPPET_TOKENS}) AS snippet "
+            "FROM notes_fts JOIN notes ON notes.id = notes_fts.rowid "
+            "WHERE notes_fts MATCH ? ORDER BY bm25(notes_fts, 5.0, 1.0) LIMIT ?"
+        )
+        with self.lock:
+            try:
+                rows = self.conn.execute(sql, (query, limit)).fetchall()
+            except sqlite3.OperationalError:
+                literal = " ".join('"' + word.replace('"', '""') + '"' for word in query.split())
+                rows = self.conn.execute(sql, (literal, limit)).fetchall() if literal else []
+        columns = ("path", "title", "source", "source_id", "updated", "snippet")
+        return [dict(zip(columns, row)) for row in rows]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def split_frontmatter(content: str) -> tuple[dict, str]:
+    """Split a note into its frontmatter's top-level scalars and its body."""
+    if not content.startswith("---\n"):
+        return {}, content
+    end = content.find("\n---\n", 4)
+    if end == -1:
+        return {}, content
+    meta = {}
+    for line in content[4:end].splitlines():
+        key, sep, value = line.partition(":")
+        if sep and key and not key.startswith(" ") and value.strip():
+            meta[key] = value.strip().strip('"')
+    body = content[end + 5:]
+    return meta, "\n".join(line for line in body.splitlines() if not line.startswith(VOLATILE_PREFIXES))
+
+
+def note_digest(content: str) -> str:
+    """Digest of a note, ignoring its sync timestamps."""
+    lines = content.splitlines()
+    return hashlib.sha1("\n".join(line for line in lines if not line.startswith(VOLATILE_PREFIXES)).encode("utf-8")).hexdigest()
+
+
+def escape_like(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def open_index(vault_folder: Path, path: Path) -> SearchIndex:
+    """
+    Open a vault's index at path and keep it updated from write_note().
+
+    A new index first picks up the notes already in the vault. An index
+    left inside the vault by older versions is deleted.
+    """
+    global _index
+    close_index()
+    _index = SearchIndex(vault_folder, path)
+    legacy = vault_folder / SEARCH_INDEX_NAME
+    if legacy != path:
+        for suffix in ("", "-wal", "-shm"):
+            legacy.with_name(legacy.name + suffix).unlink(missing_ok=True)
+    if _index.is_empty():
+        _index.add_folder(vault_folder)
+    return _index
+
+
+def close_index():
+    """Stop updating the index."""
+    global _index
+    if _index is not None:
+        _index.close()
+        _index = None
+
+
+def write_note(file_path: Path, content: str):
+    """Write a markdown note and update the search index, if one is open."""
+    file_path.write_text(content, encoding="utf-8")
+    index = _index
+    if index is not None:
+        index.update(file_path, content)
+
+
+def index_note(file_path: Path, content: str):
+    """Update the search index, if one is open, for a note written some other way."""
+    index = _index
+    if index is not None:
+        index.update(file_path, content)
+
+
+def write_placeholder(file_path: Path, content: str) -> bool:
+    """
+    Write a placeholder note, unless a synced note is already in its place.
+
+    Placeholders carry `placeholder: true` in their frontmatter; anything
+    else at the path is the last good content and is kept.
+
+    Returns:
+        True if the placeholder was written
+    """
+    if file_path.exists():
+        meta, _ = split_frontmatter(file_path.read_text(encoding="utf-8", errors="replace"))
+        if meta.get("placeholder") != "true":
+            return False
+    write_note(file_path, content)
+    return True
+
+
+def remove_note(file_path: Path):
+    """Delete a markdown note and drop it from the search index, if one is open."""
+    file_path.unlink(missing_ok=True)
+    index = _index
+    if index is not None:
+        index.remove(file_path)
+
+
+def prune(folder: Path) -> int:
+    """Drop notes under a folder that are gone from disk, if an index is open."""
+    index = _index
+    return index.prune(folder) if index is not None else 0
+
+
+def show_search(vault_folder: Path, path: Path, query: str, limit: int = SEARCH_LIMIT):
+    """Print ranked matches for a query, with snippets, from the index at path."""
+    index = open_index(vault_folder, path)
+    try:
+        started = time.perf_counter()
+        results = index.search(query, limit)
+        elapsed = (time.perf_counter() - started) * 1000
+    finally:
+        close_index()
+
+    print(f"\n🔎 {len(results)} result(s) for \"{query}\" ({elapsed:.1f} ms)\n")
+    for rank, result in enumerate(results, 1):
+        print(f"{rank:>3}. {result['title']}  [{result['source'] or 'note'}]  {result['path']}")
+        snippet = " ".join(result["snippet"].split())
+        if snippet:
+            print(f"     {snippet}")
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Single-file vault snapshots.
+
+A snapshot holds the output of one or more targets (notes, assets and the
+caches' manifests) in one compressed file, so a vault can be bootstrapped
+or brought up to date with a single transfer instead of thousands of
+small-file syncs through iCloud.
+
+The file is an append-only log of records after a short magic header:
+
+    kind (1 byte) | payload length (8 bytes, big-endian) | SHA-256 (32 bytes) | payload
+
+Blob records hold one file's content, zlib-compressed ("Z") or stored as
+is when that doesn't help ("R"), and are addressed by the digest of the
+uncompressed content, so identical files are stored once. A manifest
+record ("M", compressed JSON) maps each target's files to their digests;
+the last complete manifest is the snapshot's state. Exporting again
+appends only the blobs the file doesn't have yet and a new manifest, and
+rewrites the file once most of it is no longer referenced. A torn append
+is ignored on read and cut off on the next export.
+"""
+import hashlib
+import json
+import os
+import shutil
+import struct
+import zlib
+from datetime import datetime
+from pathlib import Path, PurePosixPath
+
+import sync_search
+
+SNAPSHOT_MAGIC = b"SHARITY-SNAPSHOT\x01\n"
+SNAPSHOT_COMPRESSION_LEVEL = 6
+SNAPSHOT_MAX_GARBAGE = 0.5  # Share of unreferenced bytes that triggers a rewrite
+SNAPSHOT_MIN_SAVING = 0.9  # Store blobs raw unless compression gets them below this
+
+# Left out of snapshots: raw API payload caches are large and re-fetchable,
+# and temp files are half-written
+SNAPSHOT_EXCLUDE_SUFFIXES = (".json.gz", ".tmp")
+
+RECORD_HEADER = struct.Struct(">cQ32s")
+KIND_COMPRESSED = b"Z"
+KIND_RAW = b"R"
+KIND_MANIFEST = b"M"
+
+
+def snapshot_files(folder: Path) -> list:
+    """List the files of a target's folder that go into a snapshot, sorted."""
+    if not folder.exists():
+        return []
+    return sorted(
+        path for path in folder.rglob("*")
+        if path.is_file() and not path.name.endswith(SNAPSHOT_EXCLUDE_SUFFIXES)
+    )
+
+
+def read_records(path: Path) -> tuple[dict, dict | None, int]:
+    """
+    Scan a snapshot's records.
+
+    Returns:
+        (blobs, manifest, end): blobs maps hex digest -> (kind, offset,
+        length) of its payload; manifest is the last complete one (None if
+        there is none); end is where the last complete record ends
+
+    Raises:
+        ValueError: If the file is not a snapshot
+    """
+    blobs = {}
+    manifest = None
+    with open(path, "rb") as f:
+        if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a vault snapshot")
+        end = f.tell()
+        size = os.fstat(f.fileno()).st_size
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                break
+            kind, length, digest = RECORD_HEADER.unpack(header)
+            offset = f.tell()
+            if offset + length > size:
+                break  # Torn append
+            if kind == KIND_MANIFEST:
+                payload = f.read(length)
+                if hashlib.sha256(payload).digest() != digest:
+                    break
+                manifest = json.loads(zlib.decompress(payload))
+            else:
+                blobs[digest.hex()] = (kind, offset, length)
+                f.seek(length, os.SEEK_CUR)
+            end = f.tell()
+    return blobs, manifest, end
+
+
+def read_blob(f, digest: str, entry: tuple) -> bytes:
+    """Read and verify a blob's content from an open snapshot."""
+    kind, offset, length = entry
+    f.seek(offset)
+    payload = f.read(length)
+    content = zlib.decompress(payload) if kind == KIND_COMPRESSED else payload
+    if hashlib.sha256(content).hexdigest() != digest:
+        raise ValueError(f"blob {digest[:12]} is corrupt")
+    return content
+
+
+def write_record(f, kind: bytes, payload: bytes, digest: bytes):
+    f.write(RECORD_HEADER.pack(kind, len(payload), digest))
+    f.write(payload)
+
+
+def safe_relative(relative: str) -> PurePosixPath:
+    """
+    Check a path read from a snapshot's manifest before joining it to a
+    local folder.
+
+    Raises:
+        ValueError: If the path is empty, absolute or climbs out with ".."
+    """
+    path = PurePosixPath(relative)
+    if not path.parts or path.is_absolute() or ".." in path.parts or "\\" in relative:
+        raise ValueError(f"unsafe path in snapshot: {relative!r}")
+    return path
+
+
+def inside(path: Path, folder: Path) -> Path:
+    """
+    Resolve a path, following symlinks, and check it stays inside a folder.
+
+    Raises:
+        ValueError: If it lands outside the folder
+    """
+    resolved = path.resolve()
+    if not resolved.is_relative_to(folder.resolve()):
+        raise ValueError(f"{path} is outside {folder}")
+    return resolved
+
+
+def blob_record(content: bytes) -> tuple[bytes, bytes]:
+    """Compress a blob if that pays off; returns (kind, payload)."""
+    compressed = zlib.compress(content, SNAPSHOT_COMPRESSION_LEVEL)
+    if len(compressed) < len(content) * SNAPSHOT_MIN_SAVING:
+        return KIND_COMPRESSED, compressed
+    return KIND_RAW, content
+
+
+def export_snapshot(path: Path, vault_folder: Path, targets: list) -> dict:
+    """
+    Write targets' output folders to a snapshot, appending to an existing one.
+
+    Targets already in the snapshot but not exported now are kept, so
+    snapshots can be built up a source at a time.
+
+    Returns:
+        Dict with files, blobs_added, bytes_added, size and rewritten
+    """
+    existing, manifest, end = {}, None, 0
+    if path.exists():
+        existing, manifest, end = read_records(path)
+    entries = {t["name"]: t for t in (manifest or {}).get("targets", [])}
+
+    # New blobs are spooled as they are hashed, so each file is read once,
+    # then copied into the snapshot once it's known whether to rewrite it
+    path.parent.mkdir(parents=True, exist_ok=True)
+    spool_path = path.with_name(path.name + ".spool.tmp")
+    try:
+        with open(spool_path, "w+b") as spool:
+            added, files = spool_targets(spool, path, vault_folder, targets, existing, entries)
+            return write_snapshot(path, spool, existing, entries, end) | {"files": files, "blobs_added": added}
+    finally:
+        spool_path.unlink(missing_ok=True)
+
+
+def spool_targets(spool, path: Path, vault_folder: Path, targets: list, existing: dict, entries: dict) -> tuple[int, int]:
+    """
+    List targets' files into manifest entries, writing the blobs the
+    snapshot doesn't have yet to a spool file.
+
+    Returns:
+        (blobs, files): blobs spooled and files listed
+    """
+    spooled = set()
+    files = 0
+    for target in targets:
+        folder = target["folder"]
+        listed = {}
+        for file_path in snapshot_files(folder):
+            if file_path.resolve() == path.resolve():
+                continue
+            content = file_path.read_bytes()
+            digest = hashlib.sha256(content).hexdigest()
+            stat = file_path.stat()
+            listed[file_path.relative_to(folder).as_posix()] = [digest, len(content), stat.st_mtime_ns]
+            if digest not in existing and digest not in spooled:
+                kind, payload = blob_record(content)
+                write_record(spool, kind, payload, bytes.fromhex(digest))
+                spooled.add(digest)
+            files += 1
+        try:
+            relative = folder.relative_to(vault_folder).as_posix()
+        except ValueError:
+            relative = folder.name
+        entries[target["name"]] = {"name": target["name"], "source": target["source"], "folder": relative, "files": listed}
+    return len(spooled), files
+
+
+def write_snapshot(path: Path, spool, existing: dict, entries: dict, end: int) -> dict:
+    """
+    Append the spooled blobs and a new manifest to a snapshot, or rewrite
+    it without unreferenced blobs once they are most of it.
+
+    Returns:
+        Dict with bytes_added, size and rewritten
+    """
+    manifest = {
+        "version": 1,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "targets": sorted(entries.values(), key=lambda e: e["name"]),
+    }
+    # Dropped blobs and earlier manifests are garbage
+    live = {digest for entry in entries.values() for digest, _, _ in entry["files"].values()}
+    live_bytes = sum(RECORD_HEADER.size + length for digest, (_, _, length) in existing.items() if digest in live)
+    garbage = end - len(SNAPSHOT_MAGIC) - live_bytes
+    rewrite = not path.exists() or garbage > SNAPSHOT_MAX_GARBAGE * end
+
+    added = spool.tell()
+    spool.seek(0)
+    if rewrite:
+        # Copy the blobs still referenced, then add the new ones
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as out:
+            out.write(SNAPSHOT_MAGIC)
+            if existing:
+                with open(path, "rb") as old:
+                    for digest, (kind, offset, length) in existing.items():
+                        if digest in live:
+                            old.seek(offset)
+                            write_record(out, kind, old.read(length), bytes.fromhex(digest))
+            shutil.copyfileobj(spool, out)
+            append_manifest(out, manifest)
+            out.flush()
+            os.fsync(out.fileno())
+        tmp_path.replace(path)
+    else:
+        with open(path, "r+b") as out:
+            # Cut off a torn append before adding to the log
+            out.truncate(end)
+            out.seek(end)
+            shutil.copyfileobj(spool, out)
+            append_manifest(out, manifest)
+            out.flush()
+            os.fsync(out.fileno())
+
+    return {
+        "bytes_added": added,
+        "size": path.stat().st_size,
+        "rewritten": rewrite and bool(existing),
+    }
+
+
+def append_manifest(out, manifest: dict):
+    payload = zlib.compress(json.dumps(manifest, separators=(",", ":")).encode("utf-8"), SNAPSHOT_COMPRESSION_LEVEL)
+    write_record(out, KIND_MANIFEST, payload, hashlib.sha256(payload).digest())
+
+
+def file_matches(path: Path, digest: str, size: int, mtime_ns: int) -> bool:
+    """Whether a local file already has a snapshot entry's content."""
+    try:
+        stat = path.stat()
+    except OSError:
+        return False
+    if stat.st_size != size:
+        return False
+    if stat.st_mtime_ns == mtime_ns:
+        return True
+    return hashlib.sha256(path.read_bytes()).hexdigest() == digest
+
+
+def import_snapshot(path: Path, vault_folder: Path, targets: list, sources: set) -> dict:
+    """
+    Unpack a snapshot's targets into the vault, writing only files that differ.
+
+    A snapshot target lands in the folder of the configured target with
+    its name, or else at its folder relative to the vault. Files are
+    written atomically with the snapshot's mtimes, and notes are indexed
+    for search. Local files the snapshot doesn't have are kept. Paths
+    from the snapshot must stay inside their target's folder.
+
+    Args:
+        sources: Only import targets of these sources
+
+    Returns:
+        Dict with targets, files, written, unchanged and bytes written
+
+    Raises:
+        ValueError: If the snapshot is damaged or a path in it would land
+            outside its folder (or, for unconfigured targets, the vault)
+    """
+    blobs, manifest, _ = read_records(path)
+    if manifest is None:
+        raise ValueError(f"{path} has no complete manifest")
+    folders = {t["name"]: t["folder"] for t in targets}
+
+    stats = {"targets": 0, "files": 0, "written": 0, "unchanged": 0, "bytes": 0}
+    with open(path, "rb") as f:
+        for entry in manifest["targets"]:
+            if entry["source"] not in sources:
+                continue
+            folder = folders.get(entry["name"])
+            if folder is None:
+                folder = vault_folder / safe_relative(entry["folder"])
+                inside(folder, vault_folder)
+            stats["targets"] += 1
+            for relative, (digest, size, mtime_ns) in entry["files"].items():
+                stats["files"] += 1
+                file_path = inside(folder / safe_relative(relative), folder)
+                if file_matches(file_path, digest, size, mtime_ns):
+                    stats["unchanged"] += 1
+                    continue
+                if digest not in blobs:
+                    raise ValueError(f"{relative}: blob {digest[:12]} is missing")
+                content = read_blob(f, digest, blobs[digest])
+
+                file_path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = file_path.with_name(file_path.name + ".tmp")
+                tmp_path.write_bytes(content)
+                os.utime(tmp_path, ns=(mtime_ns, mtime_ns))
+                tmp_path.replace(file_path)
+                if file_path.suffix == ".md":
+                    sync_search.index_note(file_path, content.decode("utf-8", errors="replace"))
+
+                stats["written"] += 1
+                stats["bytes"] += size
+    return stats
+
+
+def show_snapshot_export(path: Path, vault_folder: Path, targets: list):
+    """Export targets to a snapshot and print what was added."""
+    stats = export_snapshot(path, vault_folder, targets)
+    print(f"\n📦 Snapshot of {len(targets)} target(s), {stats['files']} file(s)")
+    print(f"   {stats['blobs_added']} new blob(s), {stats['bytes_added'] / 1e6:.2f} MB appended")
+    if stats["rewritten"]:
+        print("   Rewrote the snapshot without unreferenced blobs")
+    print(f"   ✅ Saved: {path} ({stats['size'] / 1e6:.2f} MB)")
+
+
+def show_snapshot_import(path: Path, vault_folder: Path, targets: list, sources: set, search_path: Path):
+    """Import a snapshot into the vault, updating the search index at search_path, and print what changed."""
+    sync_search.open_index(vault_folder, search_path)
+    try:
+        stats = import_snapshot(path, vault_folder, targets, sources)
+    finally:
+        sync_search.close_index()
+    print(f"\n📦 Imported {stats['targets']} target(s) from {path}")
+    print(
+        f"   ✅ {stats['written']} file(s) written ({stats['bytes'] / 1e6:.2f} MB), "
+        f"{stats['unchanged']} of {stats['files']} already up to date"
+    )
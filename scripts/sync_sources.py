@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Registry of the sources the sync can mirror.
+
+Each source declares its name, CLI flag, default folder and where its sync
+entry point and change probe live. Its module, and with it the HTTP stack,
+is only imported once a run selects the source, so --status, --history,
+--search and --where start without them.
+
+To add a source, write a module with an async sync entry point
+(folder, force=..., <id_param>=...) -> bool, a change probe and a --plan
+planner, then register it below; sync_docs.py picks up its flag and
+targets from here.
+"""
+import importlib
+from typing import NamedTuple
+
+
+class Source(NamedTuple):
+    """A source the sync can mirror."""
+
+    name: str  # As used in configs, results and the --<name> flag
+    module: str  # Imported on first use
+    flag: str  # Short CLI flag
+    label: str
+    icon: str
+    folder: str  # Default output folder, relative to the vault
+    id_param: str  # Keyword the entry point takes a target's id as
+    entry_point: str  # Async sync function in the module
+    probe: str = "get_change_marker"  # Cheapest way to tell the source changed
+    probe_takes_id: bool = True  # False if the probe covers the whole source
+    probe_takes_folder: bool = False  # True if the probe reads what the last sync wrote
+    planner: str = "plan_sync"  # Dry-run planner for --plan (see sync_plan)
+    planner_takes_force: bool = True  # False if the sync fetches the same either way
+    options: tuple = ()  # Extra target options passed through from the config
+
+
+SOURCES = {}
+
+
+def register_source(source: Source) -> Source:
+    """Make a source available to configs and the CLI."""
+    SOURCES[source.name] = source
+    return source
+
+
+# Notion's probe searches the workspace by last_edited_time for the pages
+# a target syncs; Miro's reads a board's modifiedAt, Figma's a file's version
+register_source(Source(
+    name="notion", module="sync_notion", flag="-n", label="Notion", icon="📝",
+    folder="Notion", id_param="page_id", entry_point="sync_notion_async",
+    probe_takes_folder=True, planner_takes_force=False,
+))
+register_source(Source(
+    name="miro", module="sync_miro", flag="-m", label="Miro", icon="🎨",
+    folder="Architecture", id_param="board_id", entry_point="sync_miro_async",
+    planner_takes_force=False,
+))
+register_source(Source(
+    name="figma", module="sync_figma", flag="-f", label="Figma", icon="🎨",
+    folder="Design", id_param="file_key", entry_point="sync_figma_async",
+    options=("node_id", "node_ids"),
+))
+
+
+def load_source(name: str):
+    """Import a source's module, if it isn't already."""
+    return importlib.import_module(SOURCES[name].module)
+
+
+def sync_function(name: str):
+    """Get a source's async sync entry point, importing its module."""
+    return getattr(load_source(name), SOURCES[name].entry_point)
+
+
+def change_probe(name: str):
+    """Get a source's change probe, importing its module."""
+    return getattr(load_source(name), SOURCES[name].probe)
+
+
+def planner(name: str):
+    """Get a source's dry-run planner, importing its module."""
+    return getattr(load_source(name), SOURCES[name].planner)
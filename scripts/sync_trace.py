@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Lightweight tracing for the sync pipeline.
+
+Records spans for API requests (endpoint, status, bytes, latency, retries)
+and for stages such as rendering, indexing and writing, each attributed to
+the target being synced. Tracing is off until enable() is called; until
+then span() hands back a shared no-op context manager and requests are not
+recorded. Enabled without spans, only per-target request totals are kept,
+for the run history.
+
+Traces are written in the Chrome trace event format, so they open in
+Perfetto or chrome://tracing as well as being easy to post-process.
+"""
+import contextlib
+import contextvars
+import json
+import re
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+TRACE_SLOWEST_ENDPOINTS = 10
+
+# Path segments that identify a page, block, board or file rather than an
+# endpoint: anything longish with a digit in it
+ID_SEGMENT_PATTERN = re.compile(r"^(?=.*\d)[\w=.:-]{6,}$")
+
+# Target being synced: (name, source). Tasks and to_thread calls inherit it.
+_current_target = contextvars.ContextVar("sync_trace_target", default=None)
+
+_tracer = None
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class Tracer:
+    """Collects spans and per-target request totals from threads and tasks."""
+
+    def __init__(self, keep_spans: bool = True):
+        self.started = time.perf_counter()
+        self.keep_spans = keep_spans
+        self.spans = []
+        self.totals = {}
+        self.lock = threading.Lock()
+
+    def add(self, span: dict):
+        with self.lock:
+            if span["kind"] == "request":
+                totals = self.totals.setdefault(span["target"], new_totals())
+                totals["requests"] += 1
+                totals["bytes"] += span["bytes"]
+                totals["retries"] += span["retries"]
+                if span["error"] or not span["status"] or span["status"] >= 400:
+                    totals["errors"] += 1
+            if self.keep_spans:
+                self.spans.append(span)
+
+
+def new_totals() -> dict:
+    """Empty request totals for a target."""
+    return {"requests": 0, "bytes": 0, "retries": 0, "errors": 0}
+
+
+def enable(keep_spans: bool = True) -> Tracer:
+    """
+    Start tracing, dropping anything recorded before.
+
+    Args:
+        keep_spans: Record every span; otherwise only keep request totals
+    """
+    global _tracer
+    _tracer = Tracer(keep_spans)
+    return _tracer
+
+
+def disable():
+    """Stop recording spans."""
+    global _tracer
+    _tracer = None
+
+
+def take_totals(target_name: str) -> dict:
+    """Get and reset a target's request totals."""
+    if _tracer is None:
+        return new_totals()
+    with _tracer.lock:
+        return _tracer.totals.pop(target_name, None) or new_totals()
+
+
+def get_spans() -> list:
+    """Get the spans recorded so far."""
+    if _tracer is None:
+        return []
+    with _tracer.lock:
+        return list(_tracer.spans)
+
+
+def active() -> bool:
+    """Whether spans are being recorded."""
+    return _tracer is not None
+
+
+def endpoint_template(url: str) -> str:
+    """Collapse ids in a URL's path, so requests group by endpoint."""
+    path = urlsplit(url).path
+    return "/".join("{id}" if ID_SEGMENT_PATTERN.match(segment) else segment for segment in path.split("/"))
+
+
+def _attribution(source: str | None) -> dict:
+    target = _current_target.get()
+    return {
+        "target": target[0] if target else None,
+        "source": source or (target[1] if target else None),
+    }
+
+
+@contextlib.contextmanager
+def _recorded(kind: str, name: str, source: str | None):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        tracer = _tracer
+        if tracer is not None:
+            tracer.add({
+                "kind": kind,
+                "name": name,
+                **_attribution(source),
+                "start": started - tracer.started,
+                "duration": time.perf_counter() - started,
+            })
+
+
+def span(stage: str, source: str | None = None):
+    """
+    Time a stage of a sync, e.g. `with span("render"): ...`.
+
+    The source defaults to that of the target being synced.
+    """
+    if _tracer is None or not _tracer.keep_spans:
+        return _NULL_SPAN
+    return _recorded("stage", stage, source)
+
+
+@contextlib.contextmanager
+def _target_scope(name: str, source: str):
+    token = _current_target.set((name, source))
+    try:
+        with _recorded("target", name, source):
+            yield
+    finally:
+        _current_target.reset(token)
+
+
+def target(name: str, source: str):
+    """Attribute everything inside to a target, and time it as a whole."""
+    if _tracer is None:
+        return _NULL_SPAN
+    return _target_scope(name, source)
+
+
+def record_request(
+    source: str,
+    method: str,
+    url: str,
+    started: float,
+    waited: float,
+    status: int | None,
+    size: int,
+    retries: int,
+    error: str | None = None,
+):
+    """
+    Record an API request that started at `started` (perf_counter).
+
+    `waited` is the part of its duration spent on rate limits, concurrency
+    slots and 429 backoff rather than on the network. Callers check
+    active() first, so the timestamps aren't taken when tracing is off.
+    """
+    tracer = _tracer
+    if tracer is None:
+        return
+    tracer.add({
+        "kind": "request",
+        "name": f"{method} {endpoint_template(url)}",
+        **_attribution(source),
+        "start": started - tracer.started,
+        "duration": time.perf_counter() - started,
+        "wait": waited,
+        "url": url,
+        "status": status,
+        "bytes": size,
+        "retries": retries,
+        "error": error,
+    })
+
+
+def summarize(spans: list) -> dict:
+    """
+    Aggregate spans into a per-source breakdown and the slowest endpoints.
+
+    Returns:
+        Dict with sources (source -> wall time, request count, time and
+        time waiting, bytes, retries, errors and time per stage) and
+        endpoints (the endpoints with most total request time, slowest
+        first)
+    """
+    sources = {}
+    endpoints = {}
+    for s in spans:
+        entry = sources.setdefault(s["source"] or "other", {
+            "wall_time": 0.0, "requests": 0, "request_time": 0.0, "wait_time": 0.0,
+            "bytes": 0, "retries": 0, "errors": 0, "stages": {},
+        })
+        if s["kind"] == "target":
+            entry["wall_time"] += s["duration"]
+        elif s["kind"] == "stage":
+            entry["stages"][s["name"]] = entry["stages"].get(s["name"], 0.0) + s["duration"]
+        else:
+            entry["requests"] += 1
+            entry["request_time"] += s["duration"]
+            entry["wait_time"] += s["wait"]
+            entry["bytes"] += s["bytes"]
+            entry["retries"] += s["retries"]
+            if s["error"] or not s["status"] or s["status"] >= 400:
+                entry["errors"] += 1
+
+            endpoint = endpoints.setdefault((s["source"], s["name"]), {
+                "source": s["source"], "endpoint": s["name"],
+                "count": 0, "total": 0.0, "wait": 0.0, "max": 0.0, "bytes": 0,
+            })
+            endpoint["count"] += 1
+            endpoint["total"] += s["duration"]
+            endpoint["wait"] += s["wait"]
+            endpoint["max"] = max(endpoint["max"], s["duration"])
+            endpoint["bytes"] += s["bytes"]
+
+    slowest = sorted(endpoints.values(), key=lambda e: e["total"], reverse=True)
+    for endpoint in slowest:
+        endpoint["mean"] = endpoint["total"] / endpoint["count"]
+    return {"sources": sources, "endpoints": slowest[:TRACE_SLOWEST_ENDPOINTS]}
+
+
+def print_report(summary: dict):
+    """Print the per-source breakdown and the slowest endpoints."""
+    print("\n📊 Sync profile\n")
+    print(
+        f"{'source':<10}{'wall':>9}{'requests':>10}{'req time':>10}{'waiting':>10}"
+        f"{'MB':>8}{'retries':>9}{'errors':>8}"
+    )
+    print("-" * 74)
+    for source, entry in sorted(summary["sources"].items()):
+        print(
+            f"{source:<10}{entry['wall_time']:>8.2f}s{entry['requests']:>10}"
+            f"{entry['request_time']:>9.2f}s{entry['wait_time']:>9.2f}s{entry['bytes'] / 1e6:>8.2f}"
+            f"{entry['retries']:>9}{entry['errors']:>8}"
+        )
+        for stage, seconds in sorted(entry["stages"].items(), key=lambda item: -item[1]):
+            print(f"  {stage:<16}{seconds:>8.2f}s")
+
+    if summary["endpoints"]:
+        print("\nSlowest endpoints (total request time; requests overlap):\n")
+        for e in summary["endpoints"]:
+            print(
+                f"  {e['total']:>7.2f}s  {e['count']:>5}×  mean {e['mean'] * 1000:>6.0f}ms  "
+                f"max {e['max'] * 1000:>6.0f}ms  waiting {e['wait']:>6.2f}s  {e['source']} {e['endpoint']}"
+            )
+
+
+def write_trace(path: Path, spans: list, summary: dict):
+    """Write spans as a Chrome trace, with the summary alongside."""
+    threads = {}
+    events = []
+    for s in spans:
+        tid = threads.setdefault(s["target"] or s["source"] or "other", len(threads) + 1)
+        args = {k: v for k, v in s.items() if k not in ("name", "start", "duration") and v is not None}
+        events.append({
+            "name": s["name"],
+            "cat": s["kind"],
+            "ph": "X",
+            "ts": round(s["start"] * 1e6),
+            "dur": round(s["duration"] * 1e6),
+            "pid": 1,
+            "tid": tid,
+            "args": args,
+        })
+    for name, tid in threads.items():
+        events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": name}})
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"traceEvents": events, "otherData": summary}, indent=1), encoding="utf-8")
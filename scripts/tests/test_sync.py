@@ -0,0 +1,1270 @@
+"""
+Regression tests for the sync scripts.
+
+Run from the repo root with: python -m pytest scripts/tests
+"""
+import asyncio
+import hashlib
+import json
+import os
+import subprocess
+import sys
+from collections import Counter
+from pathlib import Path
+
+import httpx
+import pytest
+
+# The sync modules import each other as top-level scripts
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import sync_bench
+import sync_config
+import sync_docs
+import sync_figma
+import sync_history
+import sync_http
+import sync_miro
+import sync_notion
+import sync_properties
+import sync_replay
+import sync_search
+import sync_snapshot
+
+
+@pytest.fixture(autouse=True)
+def figma_cache_root(monkeypatch, tmp_path):
+    """Keep Figma payload caches out of the repo root."""
+    root = tmp_path / "figma-cache"
+    monkeypatch.setattr(sync_figma, "FIGMA_CACHE_ROOT", root)
+    return root
+
+
+def write_snapshot_file(path: Path, targets: list, blobs: dict):
+    """Write a snapshot by hand: blobs maps content -> digest, targets are manifest entries."""
+    with open(path, "wb") as f:
+        f.write(sync_snapshot.SNAPSHOT_MAGIC)
+        for content in blobs:
+            kind, payload = sync_snapshot.blob_record(content)
+            sync_snapshot.write_record(f, kind, payload, hashlib.sha256(content).digest())
+        sync_snapshot.append_manifest(f, {"version": 1, "created_at": "", "targets": targets})
+
+
+def snapshot_entry(name: str, folder: str, files: dict) -> dict:
+    return {
+        "name": name,
+        "source": "notion",
+        "folder": folder,
+        "files": {relative: [hashlib.sha256(content).hexdigest(), len(content), 0] for relative, content in files.items()},
+    }
+
+
+# --- Snapshots ---------------------------------------------------------------
+
+
+def test_snapshot_round_trip(tmp_path):
+    vault = tmp_path / "vault"
+    (vault / "Notion" / "sub").mkdir(parents=True)
+    (vault / "Notion" / "index.md").write_text("# Index\n")
+    (vault / "Notion" / "sub" / "a.md").write_text("# A\n")
+    (vault / "Notion" / "same.md").write_text("# A\n")
+    targets = [{"name": "Notion", "source": "notion", "folder": vault / "Notion"}]
+
+    snapshot = tmp_path / "vault.snap"
+    stats = sync_snapshot.export_snapshot(snapshot, vault, targets)
+    assert stats["files"] == 3
+    assert stats["blobs_added"] == 2  # Identical files are stored once
+
+    again = sync_snapshot.export_snapshot(snapshot, vault, targets)
+    assert again["blobs_added"] == 0
+
+    restored = tmp_path / "restored"
+    result = sync_snapshot.import_snapshot(snapshot, restored, [], {"notion"})
+    assert result["written"] == 3
+    assert (restored / "Notion" / "sub" / "a.md").read_text() == "# A\n"
+
+
+@pytest.mark.parametrize("relative", ["../../escaped.md", "/tmp/escaped.md", "sub/../../escaped.md", ""])
+def test_snapshot_import_rejects_paths_outside_the_target(tmp_path, relative):
+    vault = tmp_path / "vault"
+    snapshot = tmp_path / "bad.snap"
+    content = b"escaped"
+    write_snapshot_file(snapshot, [snapshot_entry("Notion", "Notion", {relative: content})], {content: None})
+
+    with pytest.raises(ValueError):
+        sync_snapshot.import_snapshot(snapshot, vault, [], {"notion"})
+    assert not (tmp_path / "escaped.md").exists()
+
+
+@pytest.mark.parametrize("folder", ["..", "../outside", "/tmp"])
+def test_snapshot_import_rejects_folders_outside_the_vault(tmp_path, folder):
+    vault = tmp_path / "vault"
+    snapshot = tmp_path / "bad.snap"
+    content = b"escaped"
+    write_snapshot_file(snapshot, [snapshot_entry("Other", folder, {"escaped.md": content})], {content: None})
+
+    with pytest.raises(ValueError):
+        sync_snapshot.import_snapshot(snapshot, vault, [], {"notion"})
+    assert not (tmp_path / "escaped.md").exists()
+    assert not (tmp_path / "outside").exists()
+
+
+def test_snapshot_import_rejects_symlinks_out_of_the_target(tmp_path):
+    vault = tmp_path / "vault"
+    outside = tmp_path / "outside"
+    outside.mkdir()
+    (vault / "Notion").mkdir(parents=True)
+    (vault / "Notion" / "link").symlink_to(outside, target_is_directory=True)
+    snapshot = tmp_path / "bad.snap"
+    content = b"escaped"
+    write_snapshot_file(snapshot, [snapshot_entry("Notion", "Notion", {"link/escaped.md": content})], {content: None})
+
+    with pytest.raises(ValueError):
+        sync_snapshot.import_snapshot(snapshot, vault, [], {"notion"})
+    assert not (outside / "escaped.md").exists()
+
+
+# --- Notion rich text ----------------------------------------------------------
+
+
+def run(text: str, href: str | None = None, kind: str = "text", **annotations) -> dict:
+    """A rich text item as the Notion API returns it."""
+    return {"type": kind, "plain_text": text, "href": href, "annotations": annotations}
+
+
+def to_md(*items) -> str:
+    return sync_notion.rich_text_to_md(sync_notion.parse_rich_text(list(items)))
+
+
+@pytest.mark.parametrize("items, expected", [
+    ([], ""),
+    ([run("plain text")], "plain text"),
+    # Whitespace goes outside the markers, or they wouldn't count as emphasis
+    ([run("bold ", bold=True), run("text")], "**bold** text"),
+    ([run("  hi  ", italic=True)], "  *hi*  "),
+    ([run("a"), run(" ", bold=True), run("b")], "a b"),
+    # Emphasis opens and closes only where it changes
+    ([run("a", bold=True), run("b", bold=True)], "**ab**"),
+    ([run("a ", bold=True), run("b", bold=True, italic=True), run(" c")], "**a *b*** c"),
+    ([run("x", bold=True), run("y", italic=True)], "**x***y*"),
+    # Characters that would start formatting are escaped; intraword underscores aren't
+    ([run("1 * 2 [x] <b> ~y~ $5")], r"1 \* 2 \[x\] \<b> \~y\~ \$5"),
+    ([run("snake_case _x_")], r"snake_case \_x\_"),
+    ([run("a*b", bold=True), run(" c_")], r"**a\*b** c\_"),
+    # Code spans are literal and fenced longer than any backticks inside
+    ([run("a*b", code=True)], "`a*b`"),
+    ([run("a`b", code=True)], "``a`b``"),
+    ([run("`x", code=True)], "`` `x ``"),
+    ([run("x^2", kind="equation"), run(" done")], "$x^2$ done"),
+    # Links enclose emphasis
+    ([run("see "), run("docs", href="https://x.test", bold=True), run(".")], "see [**docs**](https://x.test)."),
+    ([run("a", href="https://x.test"), run("b", href="https://x.test", bold=True)], "[a**b**](https://x.test)"),
+    ([run("a", href="https://x.test"), run("b", href="https://y.test")], "[a](https://x.test)[b](https://y.test)"),
+])
+def test_rich_text_to_md(items, expected):
+    assert to_md(*items) == expected
+
+
+def test_parse_rich_text_merges_and_flags_runs():
+    runs = sync_notion.parse_rich_text([run("a "), run("b_"), run(" c ", bold=True)])
+    assert [run.text for run in runs] == ["a b_", " ", "c", " "]
+    assert runs[0].marks & sync_notion.MARK_ESCAPE
+    assert runs[1].marks == sync_notion.MARK_SPACE
+    assert runs[2].marks == sync_notion.MARK_BOLD
+
+
+# --- Figma catalog -------------------------------------------------------------
+
+
+FIGMA_FILE = {
+    "name": "Test file",
+    "version": "42",
+    "lastModified": "2026-01-01T00:00:00Z",
+    "document": {"id": "0:0", "type": "DOCUMENT", "children": [{"id": "1:1", "name": "Page", "type": "CANVAS", "children": []}]},
+}
+
+
+def fake_figma(monkeypatch, failing=()):
+    """Serve FIGMA_FILE and a one-component library; kinds in failing fail."""
+    component = {"key": "c1", "node_id": "1:2", "name": "Button", "description": "", "updated_at": ""}
+
+    async def request(endpoint):
+        kind = endpoint.rsplit("/", 1)[-1]
+        if kind in sync_figma.FIGMA_CATALOG_KINDS:
+            if kind in failing:
+                return None
+            return {"meta": {kind: [component] if kind == "components" else []}}
+        if "/nodes?" in endpoint:
+            page = FIGMA_FILE["document"]["children"][0]
+            return {**FIGMA_FILE, "nodes": {page["id"]: {"document": page, "components": {}}}}
+        return FIGMA_FILE
+
+    monkeypatch.setenv("FIGMA_ACCESS_TOKEN", "figd_test")
+    monkeypatch.delenv("FIGMA_TEAM_ID", raising=False)
+    monkeypatch.setattr(sync_figma, "FIGMA_EXPORT_THUMBNAILS", False)
+    monkeypatch.setattr(sync_figma, "figma_request_async", request)
+
+
+def test_figma_catalog_marks_failed_kinds(monkeypatch):
+    fake_figma(monkeypatch, failing={"styles"})
+    catalog = asyncio.run(sync_figma.fetch_catalog_async("key"))
+    assert catalog["styles"] is None
+    assert len(catalog["components"]) == 1
+    assert not sync_figma.catalog_complete(catalog)
+
+
+def test_figma_partial_catalog_is_not_cached(monkeypatch, tmp_path):
+    catalog_path = tmp_path / "Components.md"
+    fake_figma(monkeypatch, failing={"styles"})
+    assert asyncio.run(sync_figma.sync_figma_async(tmp_path, file_key="key"))
+    assert not sync_figma.cached_payload_path(tmp_path, "42", "catalog", "key").exists()
+    assert not catalog_path.exists()
+
+    # The next forced sync of the same version fetches the catalog again
+    fake_figma(monkeypatch)
+    assert asyncio.run(sync_figma.sync_figma_async(tmp_path, force=True, file_key="key"))
+    assert sync_figma.load_cached_payload(tmp_path, "42", "catalog", "key")["styles"] == []
+    assert "Button" in catalog_path.read_text()
+
+
+def test_figma_force_rerenders_the_cached_version_offline(monkeypatch, tmp_path, figma_cache_root):
+    vault = tmp_path / "vault"
+    fake_figma(monkeypatch)
+    assert asyncio.run(sync_figma.sync_figma_async(vault, file_key="key"))
+    assert not (vault / sync_figma.FIGMA_CACHE_DIRNAME).exists()
+    assert sync_figma.cached_payload_path(vault, "42", "file", "key").is_relative_to(figma_cache_root)
+
+    async def unreachable(endpoint):
+        return None
+
+    monkeypatch.setattr(sync_figma, "figma_request_async", unreachable)
+    (vault / "index.md").unlink()
+    assert asyncio.run(sync_figma.sync_figma_async(vault, force=True, file_key="key"))
+    index = (vault / "index.md").read_text()
+    assert "placeholder" not in index.lower()
+    assert "[[Pages/Page|Page]]" in index
+    assert "Button" in (vault / "Components.md").read_text()
+
+    # Without --force a failed probe still fails, and keeps what is there
+    assert not asyncio.run(sync_figma.sync_figma_async(vault, file_key="key"))
+    assert "placeholder" not in (vault / "index.md").read_text().lower()
+
+
+def test_figma_empty_catalog_removes_the_last_one(monkeypatch, tmp_path):
+    fake_figma(monkeypatch)
+    asyncio.run(sync_figma.sync_figma_async(tmp_path, file_key="key"))
+    assert (tmp_path / "Components.md").exists()
+
+    async def empty(endpoint):
+        kind = endpoint.rsplit("/", 1)[-1]
+        return {"meta": {kind: []}} if kind in sync_figma.FIGMA_CATALOG_KINDS else {**FIGMA_FILE, "version": "43"}
+
+    monkeypatch.setattr(sync_figma, "figma_request_async", empty)
+    assert asyncio.run(sync_figma.sync_figma_async(tmp_path, file_key="key"))
+    assert not (tmp_path / "Components.md").exists()
+
+
+# --- Circuit breaker -----------------------------------------------------------
+
+
+def open_breaker(source: str) -> sync_http.CircuitBreaker:
+    """A fresh breaker for source, opened and past its cooldown."""
+    breaker = sync_http.CircuitBreaker(source)
+    for _ in range(sync_http.CIRCUIT_FAILURES):
+        breaker.record(500)
+    assert breaker.is_open()
+    breaker.opened -= sync_http.CIRCUIT_COOLDOWN
+    return breaker
+
+
+def test_circuit_breaker_transitions():
+    breaker = sync_http.CircuitBreaker("test")
+    assert breaker.check() is False
+    for _ in range(sync_http.CIRCUIT_FAILURES - 1):
+        breaker.record(503)
+    breaker.record(None, "ConnectError")
+    assert breaker.is_open()
+    with pytest.raises(sync_http.CircuitOpenError):
+        breaker.check()
+
+    # After the cooldown one trial goes through at a time
+    breaker.opened -= sync_http.CIRCUIT_COOLDOWN
+    assert breaker.check() is True
+    with pytest.raises(sync_http.CircuitOpenError):
+        breaker.check()
+
+    # A failed trial opens the circuit for another cooldown
+    breaker.record(401)
+    with pytest.raises(sync_http.CircuitOpenError):
+        breaker.check()
+
+    # A successful one closes it
+    breaker.opened -= sync_http.CIRCUIT_COOLDOWN
+    assert breaker.check() is True
+    breaker.record(200)
+    assert not breaker.is_open()
+    assert breaker.failures == 0
+    assert breaker.check() is False
+
+
+def serve(monkeypatch, source: str, handler) -> sync_http.CircuitBreaker:
+    """Route source's async requests to handler, with an open breaker past its cooldown."""
+    breaker = open_breaker(source)
+    monkeypatch.setitem(sync_http._circuit_breakers, source, breaker)
+    monkeypatch.setattr(sync_http.sync_replay, "get_async_transport", lambda: httpx.MockTransport(handler))
+    return breaker
+
+
+def send(source: str, timeout: float | None = None):
+    async def main():
+        try:
+            return await asyncio.wait_for(sync_http.send_async(source, "GET", "https://api.test/x"), timeout)
+        finally:
+            await sync_http.close_async_client()
+
+    return asyncio.run(main())
+
+
+def test_circuit_trial_ends_on_a_non_http_error(monkeypatch):
+    def handler(request):
+        raise RuntimeError("bug in a transport")
+
+    breaker = serve(monkeypatch, "test-error", handler)
+    with pytest.raises(RuntimeError):
+        send("test-error")
+    assert breaker.trial is False
+    assert breaker.check() is True
+
+
+def test_circuit_trial_ends_when_cancelled(monkeypatch):
+    async def handler(request):
+        await asyncio.sleep(10)
+
+    breaker = serve(monkeypatch, "test-cancel", handler)
+    with pytest.raises(asyncio.TimeoutError):
+        send("test-cancel", timeout=0.05)
+    assert breaker.trial is False
+
+    # The next trial goes through and closes the circuit
+    ok = httpx.MockTransport(lambda request: httpx.Response(200))
+    monkeypatch.setattr(sync_http.sync_replay, "get_async_transport", lambda: ok)
+    assert send("test-cancel").status_code == 200
+    assert not breaker.is_open()
+
+
+# --- Record and replay ---------------------------------------------------------
+
+
+def test_replay_round_trip_scrubs_tokens_pages_and_injects_429s(monkeypatch, tmp_path):
+    monkeypatch.setenv("NOTION_TOKEN", "secret_abc123")
+    url = "https://api.notion.com/v1/databases/db/query"
+    body = json.dumps({"page_size": 100, "filter": {"and": []}}).encode()
+    rows = [{"id": f"row-{i}", "echo": "Bearer secret_abc123"} for i in range(5)]
+    recorded = {"results": rows, "has_more": False, "next_cursor": None}
+
+    recorder = sync_replay.FixtureStore("record", tmp_path)
+    recorder.record("POST", url, body, 200, {"Content-Type": "application/json", "X-Request-Id": "1"},
+                    json.dumps(recorded).encode())
+    fixture_text = next(tmp_path.rglob("*.json")).read_text()
+    assert "secret_abc123" not in fixture_text
+    assert sync_replay.REDACTED in fixture_text
+    assert "x-request-id" not in fixture_text
+
+    async def query(store, cursor=None):
+        data = {"filter": {"and": []}, "page_size": 100}  # Key order doesn't matter
+        if cursor:
+            data["start_cursor"] = cursor
+        async with httpx.AsyncClient(transport=sync_replay.replay_transport(store)) as client:
+            return await client.post(url, json=data)
+
+    # Recorded lists are split into pages that chain by cursor
+    store = sync_replay.FixtureStore("replay", tmp_path, page_size=2)
+    pages, cursor = [], None
+    while True:
+        page = asyncio.run(query(store, cursor)).json()
+        pages.append([row["id"] for row in page["results"]])
+        if not page["has_more"]:
+            break
+        cursor = page["next_cursor"]
+    assert pages == [["row-0", "row-1"], ["row-2", "row-3"], ["row-4"]]
+
+    # Injected 429s ask to retry shortly, the same way for the same seed
+    store = sync_replay.FixtureStore("replay", tmp_path, error_rate=1.0)
+    response = asyncio.run(query(store))
+    assert response.status_code == 429
+    assert float(response.headers["retry-after"]) == sync_replay.REPLAY_RETRY_AFTER
+
+    def statuses(seed):
+        store = sync_replay.FixtureStore("replay", tmp_path, error_rate=0.5, seed=seed)
+        return [store.respond("POST", url, body, store.draw("POST", url, body))[0] for _ in range(20)]
+
+    assert statuses(7) == statuses(7)
+    assert set(statuses(7)) == {200, 429}
+
+    # Unrecorded requests are a 404, not a trip to the network
+    store = sync_replay.FixtureStore("replay", tmp_path)
+
+    async def unrecorded():
+        async with httpx.AsyncClient(transport=sync_replay.replay_transport(store)) as client:
+            return await client.get("https://api.notion.com/v1/pages/missing")
+
+    assert asyncio.run(unrecorded()).status_code == 404
+
+
+# --- Benchmarks ----------------------------------------------------------------
+
+
+@pytest.mark.parametrize("name", list(sync_bench.BENCH_SCENARIOS))
+def test_bench_scenarios_run_offline(name):
+    result = sync_bench.run_scenario(name, scale=0.02, latency=0.0, seed=0, keep_rate_limits=False)
+    assert result["ok"], result.get("error")
+    assert result["params"] == sync_bench.scaled(sync_bench.BENCH_SCENARIOS[name], 0.02)
+    assert result["wall_time"] > 0
+    assert result["peak_rss_mb"] > 0
+    if name in ("notion", "figma", "miro"):
+        assert result["requests"] > 0
+        assert result["files"] > 0
+
+
+def test_bench_compares_with_runs_of_the_same_settings():
+    settings = {"scale": 1.0, "latency": 0.0, "seed": 0, "keep_rate_limits": False}
+    runs = [
+        {"commit": "old", "settings": settings},
+        {"commit": "scaled", "settings": {**settings, "scale": 0.1}},
+        {"commit": "new", "settings": settings},
+    ]
+    run = {"settings": settings}
+    assert sync_bench.find_baseline(runs, run, None)["commit"] == "new"
+    assert sync_bench.find_baseline(runs, run, "old")["commit"] == "old"
+    assert sync_bench.find_baseline(runs, run, "scaled") is None
+
+
+# --- Run history ---------------------------------------------------------------
+
+
+def target_result(target: str, duration: float, requests: int = 10, status: str = "synced") -> dict:
+    return {
+        "target": target, "source": "notion", "status": status, "duration": duration, "requests": requests,
+        "bytes": 0, "retries": 0, "errors": 0, "pages_changed": 0, "files_written": 0,
+    }
+
+
+def test_history_flags_runs_slower_than_the_recent_median(tmp_path):
+    path = tmp_path / "history.db"
+    started = sync_history.datetime(2026, 1, 1)
+
+    def record(*results):
+        run_id = sync_history.record_run(path, started, 1.0, "run", False, list(results))
+        return sync_history.latest_regressions(path, run_id, threshold=0.5)
+
+    # Too few runs to judge yet, however slow
+    for _ in range(sync_history.HISTORY_MIN_RUNS - 1):
+        assert record(target_result("Docs", 10.0)) == []
+    assert record(target_result("Docs", 100.0)) == []
+
+    # The window's median is now 10s: +50% is fine, more is a regression
+    assert record(target_result("Docs", 15.0)) == []
+    assert record(target_result("Docs", 16.0, requests=40), target_result("Board", 99.0)) == [
+        ("Docs", "duration 16.0s vs median 10.0s (+60%)"),
+        ("Docs", "requests 40 vs median 10 (+300%)"),
+    ]
+
+    # Cached and failed runs are neither flagged nor part of the median
+    for status in ("cached", "failed") * 2:
+        assert record(target_result("Docs", 500.0, status=status)) == []
+    assert record(target_result("Docs", 20.0)) == [("Docs", "duration 20.0s vs median 10.0s (+100%)")]
+
+    estimate = sync_history.target_estimates(path)["Docs"]
+    assert estimate == {"runs": 8, "duration": 10.0, "requests": 10, "bytes": 0}
+
+
+# --- Profiling -----------------------------------------------------------------
+
+
+def test_profile_writes_a_chrome_trace(tmp_path):
+    params = sync_bench.scaled(sync_bench.BENCH_SCENARIOS["notion"], 0.02)
+    sync_bench.generate_fixtures("notion", params, tmp_path / "fixtures", seed=0)
+    config = tmp_path / "targets.json"
+    config.write_text(json.dumps({
+        "vault_folder": str(tmp_path / "vault"),
+        "rate_limits": {"notion": 1000},
+        "history": {"path": str(tmp_path / "history.db")},
+        "targets": [{"name": "Docs", "source": "notion", "id": sync_bench.BENCH_NOTION_PAGE_ID, "folder": "Notion"}],
+    }))
+    trace_path = tmp_path / "trace.json"
+    script = Path(sync_docs.__file__)
+    completed = subprocess.run(
+        [sys.executable, str(script), "--config", str(config), "--replay", str(tmp_path / "fixtures"),
+         "--all", "--force", "--profile", str(trace_path)],
+        capture_output=True, text=True, timeout=120,
+    )
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+    assert "Sync profile" in completed.stdout
+
+    trace = json.loads(trace_path.read_text())
+    spans = [event for event in trace["traceEvents"] if event["ph"] == "X"]
+    threads = {event["tid"]: event["args"]["name"] for event in trace["traceEvents"] if event["ph"] == "M"}
+    assert threads == {1: "Docs"}
+    assert all(isinstance(event["ts"], int) and event["dur"] >= 0 and event["tid"] == 1 for event in spans)
+
+    by_kind = {}
+    for event in spans:
+        by_kind.setdefault(event["cat"], []).append(event)
+    (target,) = by_kind["target"]
+    requests = by_kind["request"]
+    assert {"render", "write"} <= {event["name"] for event in by_kind["stage"]}
+    assert {event["name"] for event in requests} == {"GET /v1/pages/{id}", "GET /v1/blocks/{id}/children"}
+    assert all(event["args"]["status"] == 200 and event["args"]["source"] == "notion" for event in requests)
+    # Requests happen inside the target's span
+    assert all(target["ts"] <= event["ts"] <= target["ts"] + target["dur"] for event in requests)
+    assert trace["otherData"]["sources"]["notion"]["requests"] == len(requests)
+
+
+# --- Lazy source imports -------------------------------------------------------
+
+
+HEAVY_MODULES = ("requests", "httpx", "sync_http", "sync_notion", "sync_miro", "sync_figma")
+
+IMPORT_PROBE = """
+import contextlib, io, json, sys
+sys.path.insert(0, sys.argv[1])
+if sys.argv[2] == "--load":
+    import sync_sources
+    sync_sources.sync_function(sys.argv[3])
+else:
+    import sync_docs
+    sys.argv = ["sync_docs.py", *sys.argv[2:]]
+    with contextlib.redirect_stdout(io.StringIO()):
+        sync_docs.main()
+print(json.dumps(sorted(name for name in sys.modules if name in %r)))
+""" % (HEAVY_MODULES,)
+
+
+def imported_modules(*args) -> list:
+    """Heavy modules imported by a fresh interpreter running sync_docs with args."""
+    scripts = str(Path(sync_docs.__file__).parent)
+    completed = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE, scripts, *args], capture_output=True, text=True, timeout=60,
+    )
+    assert completed.returncode == 0, completed.stderr
+    return json.loads(completed.stdout.splitlines()[-1])
+
+
+@pytest.mark.parametrize("command", [["--status"], ["--history"], ["--where", "status=Done"], ["--search", "x"]])
+def test_read_only_commands_skip_the_sources_and_http_stack(tmp_path, command):
+    config = tmp_path / "targets.json"
+    config.write_text(json.dumps({"vault_folder": str(tmp_path / "vault"), "history": {"path": str(tmp_path / "h.db")}}))
+    assert imported_modules("--config", str(config), *command) == []
+
+
+def test_selecting_a_source_imports_only_its_module():
+    modules = imported_modules("--load", "miro")
+    assert "sync_miro" in modules
+    assert "sync_notion" not in modules and "sync_figma" not in modules
+
+
+# --- Scheduling and config -----------------------------------------------------
+
+
+def test_run_targets_shares_slots_fairly_between_sources(monkeypatch):
+    targets = [{"name": f"notion-{i}", "source": "notion"} for i in range(6)]
+    targets += [{"name": "miro", "source": "miro"}, {"name": "figma", "source": "figma"}]
+    started = []
+    running = Counter()
+    peak = Counter()
+
+    async def sync_target(target, force):
+        started.append(target["source"])
+        running[target["source"]] += 1
+        peak["all"] = max(peak["all"], sum(running.values()))
+        peak[target["source"]] = max(peak[target["source"]], running[target["source"]])
+        await asyncio.sleep(0.01)
+        running[target["source"]] -= 1
+        return {"name": target["name"]}
+
+    monkeypatch.setattr(sync_docs, "sync_target", sync_target)
+    results = asyncio.run(sync_docs.run_targets(targets, force=False, max_workers=3))
+    assert sorted(result["name"] for result in results) == sorted(target["name"] for target in targets)
+    # Every source gets a slot in the first wave, and the many Notion
+    # targets only fill idle slots once the others are done
+    assert sorted(started[:3]) == ["figma", "miro", "notion"]
+    assert peak["all"] == 3
+    assert peak["notion"] == 3
+
+
+def test_config_validation(tmp_path):
+    def load(**raw):
+        path = tmp_path / "targets.json"
+        path.write_text(json.dumps({"vault_folder": str(tmp_path / "vault"), **raw}))
+        return sync_config.load_config(path)
+
+    config = load(targets=[
+        {"source": "notion", "folder": "Notion", "id": "abc"},
+        {"name": "Board", "source": "miro", "folder": "Miro", "cache_days": 2, "frames_only": True},
+    ])
+    first, second = config["targets"]
+    assert first["name"] == "notion:abc"
+    assert first["folder"] == tmp_path / "vault" / "Notion"
+    assert first["cache_days"] == sync_config.DEFAULT_CACHE_DAYS
+    assert (second["cache_days"], second["frames_only"], second["id"]) == (2, True, None)
+    assert [target["source"] for target in load()["targets"]] == list(sync_config.SOURCES)
+
+    for raw, error in (
+        ({"targets": [{"source": "jira", "folder": "Jira"}]}, "source must be one of"),
+        ({"targets": [{"source": "miro"}]}, "folder is required"),
+        ({"targets": [{"source": "miro", "folder": "A"}, {"source": "miro", "folder": "B"}]}, "duplicate name"),
+        ({"max_workers": 0}, "max_workers"),
+        ({"rate_limits": {"jira": 1}}, "unknown source"),
+        ({"watch": {"min_interval": 60, "max_interval": 30}}, "min_interval"),
+        ({"history": {"regression_threshold": 0}}, "regression_threshold"),
+        ({"search": {"path": str(tmp_path / "vault" / "search.db")}}, "outside the vault"),
+    ):
+        with pytest.raises(ValueError, match=error):
+            load(**raw)
+
+
+# --- Notion pages --------------------------------------------------------------
+
+
+def notion_block(block_id: str, kind: str, has_children: bool = False, **content) -> dict:
+    return {"id": block_id, "type": kind, "has_children": has_children, kind: content}
+
+
+def test_notion_blocks_are_projected_into_records_that_render():
+    raw = {
+        "main": [
+            notion_block("h", "heading_2", rich_text=[run("Plan")]),
+            notion_block("t", "to_do", checked=True, rich_text=[run("ship "), run("it", bold=True)]),
+            notion_block("c", "code", language="python", rich_text=[run("print('*')")]),
+            notion_block("co", "callout", icon={"type": "emoji", "emoji": "💡"}, rich_text=[run("Tip")]),
+            notion_block("i", "image", type="file", file={"url": "https://x.test/a.png", "expiry_time": "soon"},
+                         caption=[run("Shot")]),
+            notion_block("tg", "toggle", has_children=True, rich_text=[run("More")]),
+            notion_block("p", "child_page", title="Child"),
+        ],
+        "tg": [notion_block("n", "paragraph", rich_text=[run("Nested")], color="default")],
+    }
+    blocks = {block_id: [sync_notion.parse_block(block) for block in level] for block_id, level in raw.items()}
+
+    to_do, image, toggle = blocks["main"][1], blocks["main"][4], blocks["main"][5]
+    assert to_do == sync_notion.NotionBlock(
+        id="t", type="to_do", checked=True,
+        text=(sync_notion.RichText("ship "), sync_notion.RichText("it", sync_notion.MARK_BOLD)),
+    )
+    assert (image.url, image.text) == ("https://x.test/a.png", (sync_notion.RichText("Shot"),))
+    assert toggle.has_children and not to_do.has_children
+    assert blocks["main"][2].language == "python"
+    assert blocks["main"][3].icon == "💡"
+    assert blocks["main"][6].title == "Child"
+
+    assert sync_notion.blocks_to_markdown(blocks["main"], blocks) == (
+        "## Plan\n\n"
+        "- [x] ship **it**\n"
+        "```python\nprint('*')\n```\n\n"
+        "> 💡 Tip\n\n"
+        "![Shot](https://x.test/a.png)\n\n"
+        "<details><summary>More</summary>\n\nNested\n\n</details>\n\n"
+        "- [[Child|Child]]"
+    )
+
+
+def test_notion_keeps_a_page_whose_blocks_failed_to_fetch(monkeypatch, tmp_path):
+    responses = {
+        "pages/main": {"id": "main", "properties": {"title": {"type": "title", "title": [run("Main")]}}},
+        "blocks/main/children": [notion_block("child", "child_page", title="Child")],
+        "blocks/child/children": [notion_block("toggle", "toggle", has_children=True, rich_text=[run("More")])],
+        # The toggle's children fail to fetch
+    }
+
+    async def request(endpoint, method="GET", data=None):
+        found = responses.get(endpoint.split("?")[0])
+        return {"results": found, "has_more": False} if isinstance(found, list) else found
+
+    monkeypatch.setenv("NOTION_TOKEN", "secret_test")
+    monkeypatch.setattr(sync_notion, "notion_request_async", request)
+    (tmp_path / "Child.md").write_text("last synced\n")
+
+    assert asyncio.run(sync_notion.sync_notion_async(tmp_path, page_id="main")) is False
+    assert (tmp_path / "Child.md").read_text() == "last synced\n"
+    assert "[[Child|Child]]" in (tmp_path / "index.md").read_text()
+
+
+# --- Page properties -----------------------------------------------------------
+
+
+DATABASE_ROW = {
+    "id": "row-1",
+    "url": "https://www.notion.so/row1",
+    "properties": {
+        "Name": {"type": "title", "title": [run("Fix login")]},
+        "Due date": {"type": "date", "date": {"start": "2026-03-01", "end": "2026-03-05T10:00:00.000+02:00"}},
+        "Tags": {"type": "multi_select", "multi_select": [{"name": "auth"}, {"name": "2026"}]},
+        "Blocked by": {"type": "relation", "relation": [{"id": "aa-bb"}, {"id": "cc-dd"}]},
+        "Source": {"type": "select", "select": {"name": "Support"}},
+        "Estimate": {"type": "number", "number": 3},
+        "Done": {"type": "checkbox", "checkbox": False},
+        "Owner": {"type": "people", "people": []},
+    },
+}
+
+
+def test_notion_properties_become_typed_frontmatter():
+    fields = sync_properties.property_fields(sync_notion.page_properties(DATABASE_ROW), "notion")
+    assert fields == {
+        "due_date": "2026-03-01",
+        "due_date_end": "2026-03-05T10:00:00.000+02:00",
+        "notion_tags": ["auth", "2026"],
+        "blocked_by": ["aabb", "ccdd"],
+        "notion_source": "Support",
+        "estimate": 3,
+        "done": False,
+        "owner": [],
+    }
+    assert sync_properties.frontmatter_lines(fields).splitlines() == [
+        "due_date: 2026-03-01",
+        "due_date_end: 2026-03-05T10:00:00.000+02:00",
+        "notion_tags:",
+        '  - "auth"',
+        '  - "2026"',
+        "blocked_by:",
+        '  - "aabb"',
+        '  - "ccdd"',
+        'notion_source: "Support"',
+        "estimate: 3",
+        "done: false",
+        "owner: []",
+    ]
+
+
+def test_property_index_round_trip(tmp_path):
+    fields = sync_properties.property_fields(sync_notion.page_properties(DATABASE_ROW), "notion")
+    pages = [
+        {"id": "row1", "title": "Fix login", "url": "", "note": None, "parent": "Tasks", "properties": fields},
+        {"id": "page", "title": "Notes", "url": "", "note": "Notes.md", "parent": None, "properties": {}},
+    ]
+    sync_properties.save_property_index(tmp_path, "notion", pages)
+    index = sync_properties.load_property_index(tmp_path)
+    assert index["source"] == "notion"
+    assert index["pages"] == pages
+
+    def where(*conditions):
+        parsed = [sync_properties.parse_condition(condition) for condition in conditions]
+        return [page["id"] for page in sync_properties.filter_pages(index, parsed)]
+
+    assert where("Tags=AUTH", "due date=2026-03-01") == ["row1"]
+    assert where("source=support") == ["row1"]
+    assert where("done=false", "estimate=3") == ["row1"]
+    assert where("Blocked by") == ["row1"]
+    assert where("tags!=auth") == ["page"]
+
+    # An index from another format version is ignored, not misread
+    index_path = tmp_path / sync_properties.PROPERTY_INDEX_NAME
+    index_path.write_text(json.dumps({**index, "version": sync_properties.PROPERTY_INDEX_VERSION + 1}))
+    assert sync_properties.load_property_index(tmp_path) is None
+
+
+def test_notion_failed_database_query_keeps_its_indexed_rows(monkeypatch, tmp_path):
+    responses = {
+        "pages/main": {"id": "main", "properties": {"title": {"type": "title", "title": [run("Main")]}}},
+        "blocks/main/children": [notion_block("db", "child_database", title="Tasks")],
+        "databases/db/query": [DATABASE_ROW],
+    }
+
+    async def request(endpoint, method="GET", data=None):
+        found = responses.get(endpoint.split("?")[0])
+        return {"results": found, "has_more": False} if isinstance(found, list) else found
+
+    monkeypatch.setenv("NOTION_TOKEN", "secret_test")
+    monkeypatch.setattr(sync_notion, "notion_request_async", request)
+    assert asyncio.run(sync_notion.sync_notion_async(tmp_path, page_id="main"))
+    synced = sync_properties.load_property_index(tmp_path)["pages"]
+    assert [page["id"] for page in synced] == ["main", "row1"]
+
+    # A failed query is not an empty database
+    del responses["databases/db/query"]
+    assert asyncio.run(sync_notion.sync_notion_async(tmp_path, page_id="main")) is False
+    assert sync_properties.load_property_index(tmp_path)["pages"][1:] == synced[1:]
+    assert "Fix login" in (tmp_path / "index.md").read_text()
+
+    # An empty database is
+    responses["databases/db/query"] = []
+    assert asyncio.run(sync_notion.sync_notion_async(tmp_path, page_id="main"))
+    assert [page["id"] for page in sync_properties.load_property_index(tmp_path)["pages"]] == ["main"]
+
+
+# --- Hedging -------------------------------------------------------------------
+
+
+def hedge(monkeypatch, source: str, credit: float, tokens: float) -> tuple[sync_http.HedgeBudget, list]:
+    """Send one slow request on source with a 1ms hedge delay; returns its budget and the requests sent."""
+    sent = []
+
+    async def handler(request):
+        sent.append(request)
+        await asyncio.sleep(0.05)
+        return httpx.Response(200)
+
+    budget = sync_http.HedgeBudget()
+    budget.credit = credit
+    limiter = sync_http.RateLimiter(0.001)
+    limiter.tokens = tokens
+    monkeypatch.setitem(sync_http._hedge_budgets, source, budget)
+    monkeypatch.setitem(sync_http._rate_limiters, source, limiter)
+    monkeypatch.setattr(sync_http.sync_replay, "get_async_transport", lambda: httpx.MockTransport(handler))
+
+    async def main():
+        try:
+            return await sync_http.hedged_request(source, "GET", "https://api.test/x", 0.001)
+        finally:
+            await sync_http.close_async_client()
+
+    assert asyncio.run(main()).status_code == 200
+    return budget, sent
+
+
+def test_hedge_spends_budget_when_sent(monkeypatch):
+    budget, sent = hedge(monkeypatch, "test-hedge", credit=1, tokens=1)
+    assert len(sent) == 2
+    assert budget.credit == 0
+
+
+def test_hedge_without_a_rate_limit_token_keeps_its_budget(monkeypatch):
+    budget, sent = hedge(monkeypatch, "test-hedge", credit=1, tokens=0)
+    assert len(sent) == 1
+    assert budget.credit == 1
+
+
+def test_hedge_without_budget_keeps_the_rate_limit_token(monkeypatch):
+    budget, sent = hedge(monkeypatch, "test-hedge", credit=0.5, tokens=1)
+    assert len(sent) == 1
+    assert sync_http._rate_limiters["test-hedge"].tokens >= 1
+
+
+def test_hedge_budget_accrues_up_to_its_burst():
+    budget = sync_http.HedgeBudget()
+    for _ in range(round(1 / sync_http.HEDGE_BUDGET) + 1):
+        budget.earn()
+    assert budget.spend()
+    assert not budget.spend()
+    for _ in range(1000):
+        budget.earn()
+    assert budget.credit == sync_http.HEDGE_BURST
+    budget.refund()
+    assert budget.credit == sync_http.HEDGE_BURST
+
+
+def slow_endpoint(monkeypatch, source: str, credit: float, responses: list) -> tuple[sync_http.EndpointLatency, list]:
+    """
+    Route source to an endpoint that times out any request on an adaptive
+    timeout, then answers with the given statuses; returns its latency
+    tracker, primed with fast samples, and the timeouts requests were sent with.
+    """
+    timeouts = []
+
+    def handler(request):
+        timeouts.append(request.extensions["timeout"]["read"])
+        if timeouts[-1] < sync_http.REQUEST_TIMEOUT:
+            raise httpx.ReadTimeout("slow", request=request)
+        return httpx.Response(responses.pop(0), headers={"Retry-After": "0"})
+
+    budget = sync_http.HedgeBudget()
+    budget.credit = credit
+    monkeypatch.setattr(sync_http, "MIN_TIMEOUT", 0.01)
+    monkeypatch.setitem(sync_http._hedge_budgets, source, budget)
+    monkeypatch.setitem(sync_http._rate_limiters, source, sync_http.RateLimiter(1000))
+    monkeypatch.setitem(sync_http._circuit_breakers, source, sync_http.CircuitBreaker(source))
+    monkeypatch.setattr(sync_http.sync_replay, "get_async_transport", lambda: httpx.MockTransport(handler))
+    latency = sync_http.get_latency(source, "https://api.test/x")
+    for _ in range(sync_http.LATENCY_MIN_SAMPLES):
+        latency.add(0.001)
+    return latency, timeouts
+
+
+def test_timeouts_widen_the_adaptive_timeout(monkeypatch):
+    latency, timeouts = slow_endpoint(monkeypatch, "test-timeout", credit=0, responses=[])
+    for _ in range(3):
+        with pytest.raises(httpx.ReadTimeout):
+            send("test-timeout")
+    # Without a hedge budget nothing was re-sent, and each timeout counted
+    assert len(timeouts) == 3
+    assert timeouts[0] < timeouts[1] < timeouts[2] < latency.timeout()
+
+
+def test_timeout_resend_is_hedged_and_keeps_the_429_retries(monkeypatch):
+    responses = [429] * sync_http.RATE_LIMIT_RETRIES + [200]
+    latency, timeouts = slow_endpoint(monkeypatch, "test-timeout", credit=1, responses=responses)
+    assert send("test-timeout").status_code == 200
+    assert timeouts[0] < sync_http.REQUEST_TIMEOUT
+    assert timeouts[1:] == [sync_http.REQUEST_TIMEOUT] * (sync_http.RATE_LIMIT_RETRIES + 1)
+    assert sync_http._hedge_budgets["test-timeout"].credit < 1
+
+
+# --- Planning ------------------------------------------------------------------
+
+
+def test_notion_plan_caps_its_search(monkeypatch, tmp_path):
+    searches = []
+
+    def request(endpoint, method="GET", data=None):
+        searches.append(data)
+        n = len(searches)
+        page = {
+            "id": f"page-{n}",
+            "last_edited_time": "2026-01-01T00:00:00Z",
+            "parent": {"page_id": "root"},
+            "properties": {"title": {"type": "title", "title": [run(f"Page {n}")]}},
+        }
+        return {"results": [page], "has_more": True, "next_cursor": f"cursor-{n}"}
+
+    monkeypatch.setenv("NOTION_TOKEN", "secret_test")
+    monkeypatch.setattr(sync_notion, "notion_request", request)
+    plan = sync_notion.plan_sync(tmp_path, page_id="root")
+
+    # A workspace that never ends is read only as far as the cap
+    assert len(searches) == sync_notion.NOTION_PLAN_SEARCH_PAGES
+    assert searches[-1]["start_cursor"] == f"cursor-{sync_notion.NOTION_PLAN_SEARCH_PAGES - 1}"
+    assert plan["items"][0] == ("Main page", "new")
+    assert len(plan["items"]) == 1 + sync_notion.NOTION_PLAN_SEARCH_PAGES
+    assert "may be missing" in plan["note"]
+
+
+def test_figma_plan_counts_from_the_cache_when_the_probe_fails(monkeypatch, tmp_path):
+    fake_figma(monkeypatch)
+    monkeypatch.setattr(sync_figma, "get_file_meta", lambda file_key: None)
+    catalog_requests = len(sync_figma.FIGMA_CATALOG_KINDS)
+
+    # Nothing synced: the probe, the file and the catalog
+    plan = sync_figma.plan_sync(tmp_path, file_key="key", node_ids=[])
+    assert plan["requests"] == 2 + catalog_requests
+    assert "nothing synced yet" in plan["note"]
+
+    # A node scope is fetched in batches instead
+    node_ids = [f"1:{i}" for i in range(sync_figma.FIGMA_NODES_MAX_IDS_CHARS // 4)]
+    batches = len(sync_figma.batch_node_ids(node_ids))
+    assert batches > 1
+    plan = sync_figma.plan_sync(tmp_path, file_key="key", node_ids=node_ids)
+    assert plan["requests"] == 1 + batches
+    assert len(plan["items"]) == 1 + len(node_ids)
+
+    # With the synced version cached only the probe is left
+    assert asyncio.run(sync_figma.sync_figma_async(tmp_path, file_key="key", node_ids=[]))
+    plan = sync_figma.plan_sync(tmp_path, file_key="key", node_ids=[])
+    assert plan["requests"] == 1
+    assert "version 42" in plan["note"]
+
+
+def test_miro_plan_counts_pages_from_the_board_size(monkeypatch, tmp_path):
+    limit = sync_miro.MIRO_PAGE_LIMIT
+    totals = {"frames": 3, "items": 2 * limit + 1}
+    probes = []
+
+    def request(endpoint):
+        if endpoint.endswith("?limit=1"):
+            collection = endpoint.split("/")[-1].split("?")[0]
+            probes.append(collection)
+            return {"data": [], "total": totals[collection]}
+        return {"id": "board", "name": "Board", "modifiedAt": "2026-01-01T00:00:00Z"}
+
+    monkeypatch.setenv("MIRO_ACCESS_TOKEN", "test")
+    monkeypatch.setattr(sync_miro, "miro_request", request)
+
+    # Nothing synced: the totals come from the API
+    plan = sync_miro.plan_sync(tmp_path, board_id="board")
+    assert plan["requests"] == 1 + 1 + 3
+    assert probes == ["frames", "items"]
+
+    # Synced: the note's counts, without probing
+    (tmp_path / "index.md").write_text(
+        '---\nsource: miro\nsource_id: "board"\ntitle: "Board"\nframe_count: 0\nitem_count: 120\n---\n'
+    )
+    probes.clear()
+    plan = sync_miro.plan_sync(tmp_path, board_id="board")
+    assert plan["requests"] == 1 + 1 + 3
+    assert probes == []
+
+    monkeypatch.setattr(sync_miro, "get_board", lambda board_id: None)
+    assert sync_miro.plan_sync(tmp_path, board_id="board")["requests"] == 5
+
+
+# --- Change probes -------------------------------------------------------------
+
+
+def search_result(page_id: str, parent_id: str, edited: str) -> dict:
+    return {"id": page_id, "parent": {"type": "page_id", "page_id": parent_id}, "last_edited_time": edited}
+
+
+def test_notion_probe_only_sees_its_targets_pages(monkeypatch, tmp_path):
+    results = [
+        search_result("elsewhere", "other-root", "2026-01-03T00:00:00.000Z"),
+        search_result("synced-page", "moved-under-another-page", "2026-01-02T00:00:00.000Z"),
+        search_result("new-child", "root", "2026-01-01T00:00:00.000Z"),
+    ]
+    monkeypatch.setattr(sync_notion, "notion_request", lambda *args, **kwargs: {"results": results, "has_more": False})
+
+    # Edits outside the target don't move its marker
+    assert sync_notion.get_change_marker("root") == "2026-01-01T00:00:00.000Z"
+    assert sync_notion.get_change_marker("other-root") == "2026-01-03T00:00:00.000Z"
+    assert sync_notion.get_change_marker("quiet-root") == ""
+
+    # Pages synced into the target's folder count wherever they live now
+    (tmp_path / "Page.md").write_text('---\nsource: notion\nsource_id: "synced-page"\ntitle: "Page"\n---\n')
+    assert sync_notion.get_change_marker("root", tmp_path) == "2026-01-02T00:00:00.000Z"
+
+
+def test_figma_switching_modes_removes_the_other_modes_notes(monkeypatch, tmp_path):
+    fake_figma(monkeypatch)
+    assert asyncio.run(sync_figma.sync_figma_async(tmp_path, file_key="key"))
+    assert (tmp_path / "Components.md").exists()
+    assert any((tmp_path / sync_figma.FIGMA_PAGES_DIRNAME).glob("*.md"))
+
+    assert asyncio.run(sync_figma.sync_figma_async(tmp_path, file_key="key", node_ids=["1-1"]))
+    assert (tmp_path / sync_figma.FIGMA_NODES_DIRNAME / "Page.md").exists()
+    assert not (tmp_path / "Components.md").exists()
+    assert not (tmp_path / sync_figma.FIGMA_PAGES_DIRNAME).exists()
+
+    # A leftover global setting doesn't scope targets that don't ask for it
+    monkeypatch.setenv("FIGMA_NODE_IDS", "1-1")
+    assert asyncio.run(sync_figma.sync_figma_async(tmp_path, file_key="key"))
+    assert not (tmp_path / sync_figma.FIGMA_NODES_DIRNAME).exists()
+    assert (tmp_path / "Components.md").exists()
+
+
+def test_figma_node_notes_with_clashing_names_all_survive(monkeypatch, tmp_path):
+    nodes = {
+        "1:1": {"id": "1:1", "name": "index", "type": "FRAME"},
+        "2:1": {"id": "2:1", "name": "Frame 1", "type": "FRAME"},
+        "3:1": {"id": "3:1", "name": "frame 1", "type": "FRAME"},
+    }
+    fake_figma(monkeypatch)
+
+    async def request(endpoint):
+        if "/nodes?" in endpoint:
+            return {**FIGMA_FILE, "nodes": {node_id: {"document": node} for node_id, node in nodes.items()}}
+        return FIGMA_FILE
+
+    monkeypatch.setattr(sync_figma, "figma_request_async", request)
+    assert asyncio.run(sync_figma.sync_figma_async(tmp_path, file_key="key", node_ids=list(nodes)))
+    notes = {path.relative_to(tmp_path).as_posix() for path in tmp_path.rglob("*.md")}
+    assert notes == {"index.md", "Nodes/index.md", "Nodes/Frame 1 (2-1).md", "Nodes/frame 1 (3-1).md"}
+    assert "[[Nodes/Frame 1 (2-1)|Frame 1]]" in (tmp_path / "index.md").read_text()
+    assert 'source_id: "3:1"' in (tmp_path / "Nodes/frame 1 (3-1).md").read_text()
+
+    # Dropping a node from the scope removes just its note
+    assert asyncio.run(sync_figma.sync_figma_async(tmp_path, file_key="key", node_ids=["1:1", "2:1"]))
+    notes = {path.relative_to(tmp_path).as_posix() for path in tmp_path.rglob("*.md")}
+    assert notes == {"index.md", "Nodes/index.md", "Nodes/Frame 1.md"}
+
+
+# --- Figma node index ----------------------------------------------------------
+
+
+def recursive_node_index(document: dict, types: set | None = None, max_depth: int | None = None) -> dict:
+    """The recursive walk build_node_index replaced, for comparison."""
+    index = {}
+
+    def walk(node, parent_id, page_id, depth):
+        if node["type"] == "CANVAS":
+            page_id = node["id"]
+        if types is None or node["type"] in types:
+            index[node["id"]] = sync_figma.IndexedNode(node["type"], node["name"], parent_id, page_id, depth)
+            parent_id = node["id"]
+        if max_depth is None or depth < max_depth:
+            for child in node.get("children", []):
+                walk(child, parent_id, page_id, depth + 1)
+
+    for page in document["children"]:
+        walk(page, None, None, 0)
+    return index
+
+
+def test_node_index_matches_a_recursive_walk():
+    kinds = ["FRAME", "GROUP", "SECTION", "INSTANCE", "TEXT"]
+    counter = iter(range(10_000))
+
+    def subtree(depth: int) -> dict:
+        n = next(counter)
+        node = {"id": f"{n}:1", "name": f"Node {n}", "type": kinds[n % len(kinds)]}
+        if depth < 4:
+            node["children"] = [subtree(depth + 1) for _ in range(n % 4)]
+        return node
+
+    pages = [{"id": f"p{i}", "name": f"Page {i}", "type": "CANVAS", "children": [subtree(1) for _ in range(3)]}
+             for i in range(3)]
+    document = {"id": "0:0", "type": "DOCUMENT", "children": pages}
+    for types, max_depth in ((None, None), ({"CANVAS", "FRAME", "SECTION"}, None), (None, 2)):
+        index = sync_figma.build_node_index(document, types=types, max_depth=max_depth)
+        expected = recursive_node_index(document, types=types, max_depth=max_depth)
+        assert index == expected
+        assert list(index) == list(expected)
+
+
+def test_node_index_handles_trees_deeper_than_the_recursion_limit():
+    depth = sys.getrecursionlimit() * 2
+    page = {"id": "1:1", "name": "Page", "type": "CANVAS", "children": []}
+    node = page
+    for n in range(depth):
+        child = {"id": f"{n}:2", "name": "Group", "type": "GROUP", "children": []}
+        node["children"].append(child)
+        node = child
+    node["children"].append({"id": "9:9", "name": "Leaf", "type": "FRAME"})
+
+    index = sync_figma.build_node_index({"children": [page]})
+    assert len(index) == depth + 2
+    assert index["9:9"].depth == depth + 1
+    assert index["9:9"].page_id == "1:1"
+
+    # Filtered, the leaf hangs off the page directly
+    assert sync_figma.build_node_index({"children": [page]}, types={"CANVAS", "FRAME"})["9:9"].parent_id == "1:1"
+
+
+# --- Figma thumbnails ----------------------------------------------------------
+
+
+SECTIONED_DOCUMENT = {"id": "0:0", "type": "DOCUMENT", "children": [{
+    "id": "1:1", "name": "Page", "type": "CANVAS", "children": [
+        {"id": "2:1", "name": "Loose", "type": "FRAME", "children": []},
+        {"id": "2:2", "name": "Flows", "type": "SECTION", "children": [
+            {"id": "3:1", "name": "Inner", "type": "SECTION", "children": [
+                {"id": "4:1", "name": "Checkout", "type": "FRAME", "children": [
+                    {"id": "5:1", "name": "Nested", "type": "FRAME", "children": []},
+                ]},
+            ]},
+        ]},
+        {"id": "2:3", "name": "Grouped", "type": "GROUP", "children": [
+            {"id": "3:2", "name": "In group", "type": "FRAME", "children": []},
+        ]},
+    ],
+}]}
+
+
+def test_figma_frames_in_sections_are_top_level():
+    index = sync_figma.build_node_index(SECTIONED_DOCUMENT, types=sync_figma.FIGMA_INDEX_TYPES)
+    [page] = sync_figma.pages_from_index(index)
+    assert [frame["id"] for frame in page["frames"]] == ["2:1", "4:1"]
+    assert sync_figma.extract_pages_and_frames(SECTIONED_DOCUMENT) == [page]
+    assert set(sync_figma.frame_digests(SECTIONED_DOCUMENT, ["2:1", "4:1"])) == {"2:1", "4:1"}
+
+
+def test_figma_thumbnails_export_only_changed_frames(monkeypatch, tmp_path):
+    exported = []
+
+    async def images(node_ids, file_key):
+        exported.extend(node_ids)
+        return {node_id: f"https://images.test/{node_id}" for node_id in node_ids}
+
+    async def download(url, path):
+        path.write_bytes(b"png")
+        return True
+
+    monkeypatch.setattr(sync_figma, "get_images_async", images)
+    monkeypatch.setattr(sync_figma, "download_file_async", download)
+    frames = ["2:1", "4:1"]
+    manifest = sync_figma.get_cache_dir(tmp_path) / sync_figma.FIGMA_THUMBNAILS_FILENAME
+
+    def export(digests, version):
+        exported.clear()
+        asyncio.run(sync_figma.export_thumbnails_async(tmp_path, digests, frames, version, "key"))
+        return list(exported)
+
+    assert export({"2:1": "a", "4:1": "b"}, "1") == frames
+    written = manifest.stat().st_mtime_ns
+
+    # A new version with the same subtrees exports nothing and leaves the manifest be
+    assert export({"2:1": "a", "4:1": "b"}, "2") == []
+    assert manifest.stat().st_mtime_ns == written
+
+    # The same version can't hide a changed frame
+    assert export({"2:1": "a", "4:1": "c"}, "1") == ["4:1"]
+
+
+# --- Figma cache and changelog -------------------------------------------------
+
+
+def test_figma_prune_keeps_versions_with_dashes(monkeypatch, tmp_path):
+    nodes = sync_figma.nodes_payload_kind(["1:2"])
+    for age, version in enumerate(["7-b", "7-a", "1"]):
+        for kind in ("file", "catalog", nodes):
+            sync_figma.save_cached_payload(tmp_path, version, kind, {}, "key")
+            path = sync_figma.cached_payload_path(tmp_path, version, kind, "key")
+            os.utime(path, (1000 - age, 1000 - age))
+
+    sync_figma.prune_cached_payloads(tmp_path, keep=2, file_key="key")
+    remaining = {path.name for path in sync_figma.get_cache_dir(tmp_path).glob("*.json.gz")}
+    assert remaining == {
+        sync_figma.cached_payload_path(tmp_path, version, kind, "key").name
+        for version in ("7-b", "7-a")
+        for kind in ("file", "catalog", nodes)
+    }
+
+
+def figma_document(*frames_and_groups) -> dict:
+    return {"id": "0:0", "type": "DOCUMENT", "children": [
+        {"id": "1:1", "name": "Page", "type": "CANVAS", "children": list(frames_and_groups)},
+    ]}
+
+
+def structural_diff(old: dict, new: dict) -> dict:
+    def index(document):
+        full = sync_figma.build_node_index(document, types=sync_figma.FIGMA_INDEX_TYPES)
+        return sync_figma.filter_node_index(full, sync_figma.FIGMA_STRUCTURAL_TYPES)
+
+    return sync_figma.diff_structure(index(old), index(new))
+
+
+def test_figma_grouping_a_frame_is_not_a_move():
+    frame = {"id": "2:1", "name": "Card", "type": "FRAME", "children": []}
+    grouped = figma_document({"id": "3:1", "name": "Group", "type": "GROUP", "children": [frame]})
+    diff = structural_diff(figma_document(frame), grouped)
+    assert diff["moved"] == []
+    assert diff["added"] == diff["removed"] == []
+
+    # Moving it into a section is
+    sectioned = figma_document({"id": "4:1", "name": "Section", "type": "SECTION", "children": [frame]})
+    diff = structural_diff(grouped, sectioned)
+    [(node_id, old_node, new_node)] = diff["moved"]
+    assert (node_id, old_node.parent_id, new_node.parent_id) == ("2:1", "1:1", "4:1")
+
+
+# --- Search index --------------------------------------------------------------
+
+
+def test_search_index_lives_next_to_the_history(tmp_path):
+    vault = tmp_path / "vault"
+    config_path = tmp_path / "sync_targets.json"
+    history = {"path": str(tmp_path / "state" / "history.db")}
+    config_path.write_text(json.dumps({"vault_folder": str(vault), "history": history}))
+    config = sync_config.load_config(config_path)
+    assert config["search"]["path"] == tmp_path / "state" / sync_search.SEARCH_INDEX_NAME
+
+    config_path.write_text(json.dumps({"vault_folder": str(vault), "search": {"path": str(vault / "search.db")}}))
+    with pytest.raises(ValueError):
+        sync_config.load_config(config_path)
+
+
+def test_search_index_outside_the_vault(tmp_path):
+    vault = tmp_path / "vault"
+    (vault / "Notion").mkdir(parents=True)
+    (vault / "Notion" / "a.md").write_text('---\ntitle: "Alpha"\n---\nfirst note\n')
+    legacy = vault / sync_search.SEARCH_INDEX_NAME
+    legacy.write_bytes(b"")
+    path = tmp_path / "state" / sync_search.SEARCH_INDEX_NAME
+
+    index = sync_search.open_index(vault, path)
+    try:
+        assert [result["path"] for result in index.search("first")] == ["Notion/a.md"]
+    finally:
+        sync_search.close_index()
+    assert path.exists()
+    assert not legacy.exists()
+    assert not list(vault.glob(".sync-search*"))
+
+    # The same index file opened for another vault forgets the first one's notes
+    other = tmp_path / "other"
+    (other / "b.md").parent.mkdir(parents=True)
+    (other / "b.md").write_text("second note\n")
+    index = sync_search.open_index(other, path)
+    try:
+        assert index.search("first") == []
+        assert [result["path"] for result in index.search("second")] == ["b.md"]
+    finally:
+        sync_search.close_index()